@@ -0,0 +1,124 @@
+"""
+JWT authentication that caches the authenticated user. SimpleJWT loads the user
+from the database on every request, which is a query on every call to every
+endpoint. Here the user is cached for `AUTH_USER_CACHE_TIMEOUT` seconds under
+the user's ID and the token's `jti`, so a token only loads its user once.
+
+Every user has a generation in the cache that is part of the keys. Changing a
+user replaces the generation (see signals.py), which orphans all of its cached
+entries at once. A generation that was evicted is replaced by a new one rather
+than starting over, so old entries can never come back.
+"""
+
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from kronathens.instrumentation import timed
+from kronathens.stats import CacheStats
+
+stats = CacheStats("auth-user")
+
+def _generation_key(user_id):
+    return f"auth-user-generation:{user_id}"
+
+def _generation(user_id):
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+
+    if generation is None:
+        # Another request may get there first, in which case its one is used
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+
+    return generation
+
+async def _ageneration(user_id):
+    key = _generation_key(user_id)
+    generation = await cache.aget(key)
+
+    if generation is None:
+        await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        generation = await cache.aget(key)
+
+    return generation
+
+def invalidate_user(user_id):
+    """
+    Drops every cached entry of the user.
+    """
+    cache.set(_generation_key(user_id), uuid.uuid4().hex, timeout=None)
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates like `JWTAuthentication` but takes the user from the cache
+    when the same token was seen recently. Views that must see the user as it
+    is in the database, e.g. to update it, should use `JWTAuthentication`.
+    """
+    def authenticate(self, request):
+        with timed("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        token_id = validated_token.get(api_settings.JTI_CLAIM)
+
+        if not timeout or user_id is None or token_id is None:
+            return super().get_user(validated_token)
+
+        key = f"auth-user:{user_id}:{_generation(user_id)}:{token_id}"
+        user = cache.get(key)
+        stats.record(user is not None)
+
+        if user is None:
+            # Inactive and deleted users are rejected here and never cached
+            user = super().get_user(validated_token)
+            cache.set(key, user, timeout=timeout)
+
+        return user
+
+    async def aget_user(self, validated_token):
+        """
+        Same as `get_user` for async views.
+        """
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        token_id = validated_token.get(api_settings.JTI_CLAIM)
+
+        if not timeout or user_id is None or token_id is None:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        key = f"auth-user:{user_id}:{await _ageneration(user_id)}:{token_id}"
+        user = await cache.aget(key)
+        stats.record(user is not None)
+
+        if user is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            await cache.aset(key, user, timeout=timeout)
+
+        return user
+
+async def aauthenticate(request):
+    """
+    Authenticates a plain Django request for the async views, which DRF does
+    not run. Returns the user and the validated token, or None if the request
+    carries no token. Raises `AuthenticationFailed` if the token is invalid.
+    """
+    authentication = CachedJWTAuthentication()
+
+    with timed("auth"):
+        header = authentication.get_header(request)
+        raw_token = None if header is None \
+            else authentication.get_raw_token(header)
+
+        if raw_token is None:
+            return None
+
+        validated_token = authentication.get_validated_token(raw_token)
+
+        return await authentication.aget_user(validated_token), validated_token
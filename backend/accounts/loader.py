@@ -1,17 +1,697 @@
 """
-Anything related to resetting the database for the accounts application. This 
-is for testing purposes. 
+Anything related to resetting the database for the accounts application and to
+benchmarking the API against it. This is for testing purposes.
+
+`BulkLoader` inserts users, groups and checklists in batches, for imports and
+for `generate`, which makes up a synthetic dataset. The same scale and seed al-
+ways give the same rows, so benchmarks run on different commits see the same
+data. `drive` sends requests to one route from several threads at once and
+measures how long each one took, through `load`, which any benchmark that puts
+a server under load goes through so that all of them report the same statis-
+tics. See the `bulk_load`, `benchmark_endpoints` and `benchmark_serializers`
+commands, which put these together.
 """
 
+import http.client
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.urls import reverse
+from rest_framework_simplejwt.settings import api_settings
+
+from checklists.models import Workspace, Item, Subitem
+from checklists.ordering import key_between, keys_after
+from checklists.search import suspended_index
+from checklists.tracking import rebuild_progress
+from collaboration.models import Group, Contributor
+
 from .models import User
+from .tokens import MembershipRefreshToken
 
 def set_all_passwords():
     """
     Sets all passwords to "password" when initializing the database. This func-
-    tion must be called through the Django shell.
+    tion must be called through the Django shell. The password is hashed once
+    and every user gets the same hash.
+    """
+    User.objects.update(password=make_password("password"))
+
+# Number of rows to generate. Everything but `users` is per parent, e.g. `items`
+# is the number of items in each workspace.
+Scale = namedtuple("Scale", ["users", "groups", "members", "workspaces",
+                             "items", "subitems"])
+
+SCALES = {
+    "small": Scale(users=20, groups=5, members=4, workspaces=2, items=5,
+                   subitems=5),
+    "medium": Scale(users=500, groups=100, members=8, workspaces=4, items=10,
+                    subitems=10),
+    "large": Scale(users=2000, groups=400, members=10, workspaces=5, items=20,
+                   subitems=20),
+    "huge": Scale(users=50000, groups=10000, members=10, workspaces=5,
+                  items=10, subitems=10),
+}
+
+# Text of the generated rows is made of these so that searches find something
+WORDS = ["alpha", "budget", "campaign", "deploy", "draft", "estimate", "exam",
+         "feedback", "groceries", "hiring", "invoice", "launch", "meeting",
+         "migration", "notes", "onboarding", "packing", "plan", "release",
+         "report", "research", "review", "roadmap", "schedule", "shopping",
+         "sprint", "survey", "travel", "update", "venue", "wedding", "workout"]
+
+# Order that the models have to be inserted in for the foreign keys to resolve
+MODELS = ["user", "group", "contributor", "workspace", "item", "subitem"]
+
+# Rows are inserted this many at a time
+BATCH_SIZE = 5000
+
+def _text(rng, words):
+    return " ".join(rng.choices(WORDS, k=words))
+
+def generate(scale, seed=0):
+    """
+    Yields the records of a synthetic dataset at the given scale, in the form
+    that `BulkLoader` takes. The first user is a superuser named `user0` who
+    contributes to every group and created every other one.
+    """
+    rng = random.Random(seed)
+    users = max(scale.users, 1)
+    workspace_id = item_id = 0
+
+    for number in range(users):
+        yield {"model": "user", "id": number, "username": f"user{number}",
+               "email": f"user{number}@example.com",
+               "first_name": rng.choice(WORDS).title(),
+               "last_name": rng.choice(WORDS).title(),
+               "is_superuser": number == 0}
+
+    for number in range(scale.groups):
+        creator = 0 if number % 2 == 0 else rng.randrange(users)
+        members = {0, creator} | set(rng.sample(range(users),
+                                                min(scale.members, users)))
+
+        yield {"model": "group", "id": number, "creator": creator,
+               "name": _text(rng, 2)[:32], "description": _text(rng, 8)}
+
+        for user in sorted(members):
+            yield {"model": "contributor", "group": number, "user": user}
+
+        for _ in range(scale.workspaces):
+            yield {"model": "workspace", "id": workspace_id, "group": number,
+                   "name": _text(rng, 3), "description": _text(rng, 12)}
+
+            for _ in range(scale.items):
+                yield {"model": "item", "id": item_id,
+                       "workspace": workspace_id, "heading": _text(rng, 4)}
+
+                for _ in range(scale.subitems):
+                    yield {"model": "subitem", "item": item_id,
+                           "content": _text(rng, 10),
+                           "weight": rng.randint(1, 5),
+                           "completion_status": rng.random() < 0.3}
+
+                item_id += 1
+
+            workspace_id += 1
+
+class BulkLoader:
+    """
+    Inserts records through `bulk_create` in batches. A record is a dict with
+    the `model` it is a row of, its fields and, for rows that others refer to,
+    an `id` of the records' own. Foreign keys hold those IDs and are mapped to
+    the ones the database gave out, so parents have to come before their chil-
+    dren. Users can also be referred to by the username of one that is already
+    in the database.
+
+        {"model": "user", "id": 1, "username": "ann", "email": "a@b.c",
+         "password": "secret"}
+        {"model": "group", "id": 1, "creator": 1, "name": "Home"}
+        {"model": "contributor", "group": 1, "user": "bob"}
+        {"model": "workspace", "id": 1, "group": 1, "name": "Chores"}
+        {"model": "item", "id": 1, "workspace": 1, "heading": "Kitchen"}
+        {"model": "subitem", "item": 1, "content": "Dishes", "weight": 2}
+
+    Users without a `password` or `password_hash` get the default password,
+    which is only hashed once. Other passwords are hashed in `processes` worker
+    processes if given. Items and subitems are placed in the order they come
+    in. The progress counters are rebuilt by `finish`, which must be called at
+    the end. Loads should run in `checklists.search.suspended_index`.
+    """
+    def __init__(self, password="password", batch_size=BATCH_SIZE,
+                 processes=None, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.default_hash = make_password(password)
+        self.pool = ProcessPoolExecutor(processes, initializer=django.setup) \
+            if processes else None
+        self.pending = {model: [] for model in MODELS}
+        self.ids = {model: {} for model in MODELS}
+        self.counts = Counter()
+        self.positions = {}
+        self.started = Workspace.objects.aggregate(last=Max("id"))["last"] or 0
+
+    def add(self, record):
+        model = record.get("model")
+
+        if model not in self.pending:
+            raise ValueError(f"Unknown model {model!r}, expected one of "
+                             f"{', '.join(MODELS)}.")
+
+        self.pending[model].append(record)
+
+        if len(self.pending[model]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserts every pending record, parents first.
+        """
+        with transaction.atomic():
+            for model in MODELS:
+                records, self.pending[model] = self.pending[model], []
+
+                if records:
+                    getattr(self, f"_insert_{model}")(records)
+                    self.counts[model] += len(records)
+
+        if self.progress is not None:
+            self.progress(self.counts)
+
+    def finish(self):
+        """
+        Inserts what is left and fills in the progress counters of the new
+        workspaces.
+        """
+        self.flush()
+
+        if self.pool is not None:
+            self.pool.shutdown()
+
+        with transaction.atomic():
+            rebuild_progress(Workspace.objects.filter(id__gt=self.started))
+
+    def _resolve(self, model, records, field):
+        """
+        Maps the `field` of the records to database IDs.
+        """
+        ids = self.ids[model]
+        # Users that aren't in the records are looked up by their username
+        names = {record[field] for record in records
+                 if isinstance(record[field], str)
+                 and record[field] not in ids}
+
+        if names:
+            ids.update(User.objects.filter(username__in=names)
+                                   .values_list("username", "id"))
+
+        try:
+            return [ids[record[field]] for record in records]
+        except KeyError as error:
+            raise ValueError(f"{model} {error.args[0]!r} was not loaded before "
+                             f"the {records[0]['model']} referring to it.")
+
+    def _insert_rows(self, model, fields, rows):
+        """
+        Inserts rows that nothing refers to. Most of the rows are these, so they
+        skip building model instances and getting their IDs back.
+        """
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(model._meta.get_field(field).column)
+                            for field in fields)
+        values = ", ".join(["%s"] * len(fields))
+
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {quote(model._meta.db_table)} "
+                               f"({columns}) VALUES ({values})", rows)
+
+    def _remember(self, model, records, objects):
+        ids = self.ids[model]
+
+        for record, instance in zip(records, objects):
+            if "id" in record:
+                ids[record["id"]] = instance.id
+
+    def _position(self, parent, record):
+        """
+        Gives the record a key after the last one given under its parent.
+        """
+        if "position" in record:
+            key = record["position"]
+        else:
+            key = key_between(self.positions.get(parent), None)
+
+        self.positions[parent] = key
+        return key
+
+    def _hashes(self, records):
+        passwords = [record.get("password") for record in records]
+        plain = sorted({password for password in passwords if password})
+
+        if self.pool is not None:
+            hashed = self.pool.map(make_password, plain,
+                                   chunksize=max(len(plain) // 64, 1))
+        else:
+            hashed = map(make_password, plain)
+
+        hashes = dict(zip(plain, hashed))
+
+        return [record.get("password_hash") or hashes.get(password)
+                or self.default_hash
+                for record, password in zip(records, passwords)]
+
+    def _insert_user(self, records):
+        fields = ["username", "email", "first_name", "last_name", "is_active",
+                  "is_superuser", "date_joined"]
+        users = User.objects.bulk_create([
+            User(password=hashed, **{field: record[field] for field in fields
+                                     if field in record})
+            for record, hashed in zip(records, self._hashes(records))
+        ])
+        self._remember("user", records, users)
+
+    def _insert_group(self, records):
+        groups = Group.objects.bulk_create([
+            Group(creator_id=creator, name=record["name"],
+                  description=record.get("description"))
+            for record, creator in zip(records, self._resolve(
+                "user", records, "creator"))
+        ])
+        self._remember("group", records, groups)
+
+    def _insert_contributor(self, records):
+        self._insert_rows(Contributor, ["group", "user"], zip(
+            self._resolve("group", records, "group"),
+            self._resolve("user", records, "user")))
+
+    def _insert_workspace(self, records):
+        workspaces = Workspace.objects.bulk_create([
+            Workspace(group_id=group, name=record["name"],
+                      description=record.get("description"))
+            for record, group in zip(records, self._resolve(
+                "group", records, "group"))
+        ])
+        self._remember("workspace", records, workspaces)
+
+    def _insert_item(self, records):
+        items = Item.objects.bulk_create([
+            Item(workspace_id=workspace, heading=record.get("heading", ""),
+                 position=self._position(("workspace", workspace), record))
+            for record, workspace in zip(records, self._resolve(
+                "workspace", records, "workspace"))
+        ])
+        self._remember("item", records, items)
+
+    def _insert_subitem(self, records):
+        self._insert_rows(Subitem, ["item", "content", "position", "weight",
+                                    "completion_status", "version"], [
+            (item, record.get("content", ""),
+             self._position(("item", item), record), record.get("weight", 1),
+             record.get("completion_status", False), 1)
+            for record, item in zip(records, self._resolve(
+                "item", records, "item"))
+        ])
+
+class Dataset:
+    """
+    IDs of the rows that `user` can reach, for the requests to refer to.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.groups = list(Contributor.objects.filter(user=user).order_by("id")
+                                      .values_list("group_id", flat=True))
+        self.owned = list(Group.objects.filter(creator=user).order_by("id")
+                                       .values_list("id", flat=True))
+        # Changes are asked for since the revision the log starts at
+        self.revisions = dict(
+            Workspace.objects.filter(group__in=self.groups).order_by("id")
+                             .values_list("id", "compacted_revision"))
+        self.workspaces = list(self.revisions)
+        self.items = {}
+        self.subitems = {}
+        self.spares = {}
+
+        for item_id, workspace_id in Item.objects.filter(
+                workspace__group__in=self.groups).order_by("id") \
+                .values_list("id", "workspace_id"):
+            self.items.setdefault(workspace_id, []).append(item_id)
+
+        for subitem_id, item_id in Subitem.objects.filter(
+                item__workspace__group__in=self.groups).order_by("id") \
+                .values_list("id", "item_id"):
+            self.subitems.setdefault(item_id, []).append(subitem_id)
+
+def seed(scale, seed=0, password="password"):
+    """
+    Fills the database with the records of `generate`. Returns the `Dataset`
+    of `user0`.
+    """
+    with suspended_index():
+        loader = BulkLoader(password)
+
+        for record in generate(scale, seed):
+            loader.add(record)
+
+        loader.finish()
+
+    return Dataset(User.objects.get(id=loader.ids["user"][0]))
+
+@contextmanager
+def throwaway_database():
+    """
+    Switches over to a new test database for the benchmarks and drops it at
+    the end, so the one in the settings is never touched.
+    """
+    directory = tempfile.mkdtemp()
+    test_settings = connection.settings_dict["TEST"]
+    old_name = connection.settings_dict["NAME"]
+
+    # SQLite would make an in-memory database that the threads serving the
+    # requests couldn't share
+    if connection.vendor == "sqlite" and not test_settings["NAME"]:
+        test_settings["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False)
+
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+def _spare_workspace(dataset, rng, items=0, subitems=0):
+    """
+    Creates a workspace of `items` items with `subitems` subitems each that
+    only a deleting route will touch.
+    """
+    workspace = Workspace.objects.create(group_id=rng.choice(dataset.groups),
+                                         name=_text(rng, 3))
+    created = Item.objects.bulk_create([
+        Item(workspace=workspace, heading=_text(rng, 4), position=position,
+             total_weight=subitems, subitem_count=subitems)
+        for position in keys_after(None, items)
+    ])
+    Subitem.objects.bulk_create([
+        Subitem(item=item, content=_text(rng, 10), position=position)
+        for item in created for position in keys_after(None, subitems)
+    ])
+    Workspace.objects.filter(id=workspace.id).update(
+        total_weight=items * subitems, subitem_count=items * subitems)
+
+    return workspace, created
+
+def _spare_workspaces(dataset, rng, count):
+    return [_spare_workspace(dataset, rng)[0].id for _ in range(count)]
+
+def _spare_items(dataset, rng, count):
+    spares = []
+
+    while len(spares) < count:
+        spares += [item.id for item in _spare_workspace(
+            dataset, rng, items=min(count - len(spares), 10), subitems=2)[1]]
+
+    return spares
+
+def _spare_subitems(dataset, rng, count):
+    spares = []
+
+    while len(spares) < count:
+        _, (item,) = _spare_workspace(dataset, rng, items=1,
+                                      subitems=min(count - len(spares), 10))
+        spares += Subitem.objects.filter(item=item) \
+                                 .values_list("id", flat=True)
+
+    return spares
+
+def _spare_groups(dataset, rng, count, joined=True):
+    groups = Group.objects.bulk_create([
+        Group(creator=dataset.user, name=_text(rng, 2)[:32])
+        for _ in range(count)
+    ])
+    Contributor.objects.bulk_create([
+        Contributor(group=group, user=dataset.user)
+        for position, group in enumerate(groups)
+        if joined or position % 2
+    ])
+
+    return [group.id for group in groups]
+
+# Routes that use up their targets get fresh ones made for every request
+SPARES = {
+    "checklists:workspace-delete": _spare_workspaces,
+    "checklists:item-delete": _spare_items,
+    "checklists:subitem-delete": _spare_subitems,
+    "collaboration:group-delete": _spare_groups,
+    # Half of the toggles join their group and the other half leave it
+    "collaboration:group-join-toggle":
+        lambda dataset, rng, count: _spare_groups(dataset, rng, count,
+                                                  joined=False),
+}
+
+def prepare(dataset, name, count, seed=0):
     """
-    users = User.objects.all()
-    
-    for user in users:
-        user.set_password("password")
-        user.save()
+    Makes `count` targets for the route if it needs them.
+    """
+    if name in SPARES:
+        rng = random.Random(f"{seed}:{name}")
+        dataset.spares[name] = SPARES[name](dataset, rng, count)
+        rng.shuffle(dataset.spares[name])
+
+def _workspace(dataset, rng):
+    return rng.choice(dataset.workspaces)
+
+def _item(dataset, rng):
+    return rng.choice(dataset.items[_workspace(dataset, rng)])
+
+def _subitem(dataset, rng):
+    return rng.choice(dataset.subitems[_item(dataset, rng)])
+
+def _move_item(dataset, rng):
+    siblings = dataset.items[_workspace(dataset, rng)]
+    item, after = rng.sample(siblings, 2) if len(siblings) > 1 \
+        else (siblings[0], None)
+
+    return [item], {"after": after}
+
+def _move_subitem(dataset, rng):
+    siblings = dataset.subitems[_item(dataset, rng)]
+    subitem, after = rng.sample(siblings, 2) if len(siblings) > 1 \
+        else (siblings[0], None)
+
+    return [subitem], {"after": after}
+
+def _changes(dataset, rng):
+    workspace = _workspace(dataset, rng)
+    return [workspace], {"since": dataset.revisions[workspace]}
+
+def _batch(dataset, rng):
+    workspace = _workspace(dataset, rng)
+    items = dataset.items[workspace]
+    subitems = [subitem for item in items for subitem in dataset.subitems[item]]
+
+    return [workspace], {
+        "create": [{"item": rng.choice(items), "content": _text(rng, 6)}
+                   for _ in range(2)],
+        "update": [{"id": subitem, "completion_status": rng.random() < 0.5}
+                   for subitem in rng.sample(subitems, min(len(subitems), 5))],
+    }
+
+# What to send to each route: the URL arguments and the JSON body, if any
+Route = namedtuple("Route", ["name", "method", "build"])
+
+ROUTES = [
+    Route("checklists:workspace-all", "GET",
+          lambda d, rng: ([rng.choice(d.groups)], None)),
+    Route("checklists:workspace-create", "POST",
+          lambda d, rng: ([rng.choice(d.groups)],
+                          {"name": _text(rng, 3),
+                           "description": _text(rng, 12)})),
+    Route("checklists:workspace-update", "PATCH",
+          lambda d, rng: ([_workspace(d, rng)], {"name": _text(rng, 3)})),
+    Route("checklists:item-all", "GET",
+          lambda d, rng: ([_workspace(d, rng)], None)),
+    Route("checklists:item-create", "POST",
+          lambda d, rng: ([_workspace(d, rng)], {"heading": _text(rng, 4)})),
+    Route("checklists:item-update", "PATCH",
+          lambda d, rng: ([_item(d, rng)], {"heading": _text(rng, 4)})),
+    Route("checklists:item-move", "POST", _move_item),
+    Route("checklists:subitem-all", "GET",
+          lambda d, rng: ([_item(d, rng)], None)),
+    Route("checklists:subitem-create", "POST",
+          lambda d, rng: ([_item(d, rng)], {"content": _text(rng, 10),
+                                            "weight": rng.randint(1, 5)})),
+    Route("checklists:subitem-update", "PATCH",
+          lambda d, rng: ([_subitem(d, rng)],
+                          {"completion_status": rng.random() < 0.5})),
+    Route("checklists:subitem-batch", "POST", _batch),
+    Route("checklists:subitem-move", "POST", _move_subitem),
+    Route("checklists:aggregate", "GET",
+          lambda d, rng: ([_workspace(d, rng)], None)),
+    Route("checklists:changes", "GET", _changes),
+    Route("checklists:aggregate-cache-stats", "GET", lambda d, rng: ([], None)),
+    Route("checklists:search", "GET",
+          lambda d, rng: ([], {"q": rng.choice(WORDS)})),
+    Route("collaboration:group-all", "GET", lambda d, rng: ([], None)),
+    Route("collaboration:group-get", "GET",
+          lambda d, rng: ([rng.choice(d.owned)], None)),
+    Route("collaboration:group-create", "POST",
+          lambda d, rng: ([], {"name": _text(rng, 2)[:32],
+                               "description": _text(rng, 8)})),
+    Route("collaboration:group-update", "PATCH",
+          lambda d, rng: ([rng.choice(d.owned)],
+                          {"description": _text(rng, 8)})),
+    # The deleting routes go last so that they don't change what the others see
+    Route("checklists:workspace-delete", "DELETE",
+          lambda d, rng: ([d.spares["checklists:workspace-delete"].pop()],
+                          None)),
+    Route("checklists:item-delete", "DELETE",
+          lambda d, rng: ([d.spares["checklists:item-delete"].pop()], None)),
+    Route("checklists:subitem-delete", "DELETE",
+          lambda d, rng: ([d.spares["checklists:subitem-delete"].pop()],
+                          None)),
+    Route("collaboration:group-join-toggle", "POST",
+          lambda d, rng: ([d.spares["collaboration:group-join-toggle"].pop()],
+                          {})),
+    Route("collaboration:group-delete", "DELETE",
+          lambda d, rng: ([d.spares["collaboration:group-delete"].pop()],
+                          None)),
+]
+
+def _request(route, dataset, rng):
+    """
+    Builds the path and the body of a request to the route. The body of a GET
+    request goes into the query string.
+    """
+    args, body = route.build(dataset, rng)
+    path = reverse(route.name, args=args)
+
+    if route.method == "GET":
+        return path + ("?" + urlencode(body) if body else ""), None
+
+    return path, None if body is None else json.dumps(body)
+
+def percentile(latencies, fraction):
+    """
+    Gets the latency that `fraction` of the sorted latencies are below, in mi-
+    lliseconds.
+    """
+    if not latencies:
+        return None
+
+    position = min(int(len(latencies) * fraction), len(latencies) - 1)
+    return round(latencies[position] * 1000, 2)
+
+def load(connect, requests, concurrency, duration=None):
+    """
+    Sends requests from `concurrency` threads, each on a connection from `con-
+    nect()` that is kept alive. `requests(number)` is a generator of the `(me-
+    thod, path, body, headers)` that thread `number` sends one after the other,
+    until it runs out or `duration` seconds have passed. Returns the through-
+    put, latency percentiles and status codes of the requests.
+    """
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    deadline = None if duration is None else time.perf_counter() + duration
+
+    def worker(number):
+        connection = connect()
+        done, seen = [], Counter()
+        sent = requests(number)
+
+        for method, path, body, headers in sent:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+            started = time.perf_counter()
+
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                seen["failed"] += 1
+                connection.close()
+                continue
+
+            if response.status < 400:
+                done.append(time.perf_counter() - started)
+
+            seen[str(response.status)] += 1
+
+            if response.will_close:
+                connection.close()
+
+        sent.close()
+        connection.close()
+
+        with lock:
+            latencies.extend(done)
+            statuses.update(seen)
+
+    threads = [threading.Thread(target=worker, args=(number,))
+               for number in range(concurrency)]
+    started = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    sent = sum(statuses.values())
+
+    return {
+        "requests": sent,
+        "errors": sent - len(latencies),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+def drive(host, port, route, dataset, requests, concurrency, seed=0):
+    """
+    Sends `requests` requests to the route from `concurrency` threads, see
+    `load`.
+    """
+    # Access tokens are renewed well before they expire
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds() / 2
+
+    def requests_of(number):
+        rng = random.Random(f"{seed}:{route.name}:{number}")
+        renewed, token = 0, None
+
+        try:
+            for _ in range(number, requests, concurrency):
+                if time.monotonic() - renewed > lifetime:
+                    token = MembershipRefreshToken.for_user(dataset.user) \
+                                                  .access_token
+                    renewed = time.monotonic()
+
+                path, body = _request(route, dataset, rng)
+                yield route.method, path, body, {
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": "application/json",
+                }
+        finally:
+            # Tokens are issued through the database in this thread
+            connections.close_all()
+
+    return {"method": route.method, **load(
+        lambda: http.client.HTTPConnection(host, port, timeout=30),
+        requests_of, concurrency)}
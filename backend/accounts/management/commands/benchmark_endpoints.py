@@ -0,0 +1,195 @@
+import json
+import logging
+import platform
+import subprocess
+import threading
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test.utils import override_settings
+
+from accounts.loader import ROUTES, SCALES, Scale, drive, prepare, seed, \
+                            throwaway_database
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class Command(BaseCommand):
+    """
+    Benchmarks every route of the checklists and collaboration applications on
+    a synthetic dataset, e.g.
+
+        python manage.py benchmark_endpoints --scale medium --output new.json \\
+            --baseline old.json
+
+    A throwaway database is created, filled by `accounts.loader.seed` and dro-
+    pped at the end, so the one in the settings is never touched. The API is
+    served from a thread of this process and every route gets the same number
+    of requests from the same number of connections. The results are only
+    comparable between runs on the same machine with the same options, which
+    are written out with them.
+
+    With `--baseline` the command fails if a route's p95 latency got worse than
+    the baseline's by more than `--tolerance`.
+    """
+    help = "Measures the throughput and latency of every API route."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="small",
+                            help="Size of the dataset.")
+
+        for field in Scale._fields:
+            parser.add_argument(f"--{field}", type=int,
+                                help=f"Overrides the number of {field}.")
+
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Requests to measure per route.")
+        parser.add_argument("--warmup", type=int, default=20,
+                            help="Requests to send per route beforehand.")
+        parser.add_argument("--concurrency", type=int, default=4,
+                            help="Connections to send the requests on.")
+        parser.add_argument("--route", action="append",
+                            help="Name of a route to benchmark, e.g. "
+                                 "checklists:aggregate. Can be repeated.")
+        parser.add_argument("--output", help="File to write the results to.")
+        parser.add_argument("--baseline",
+                            help="Results of an earlier run to compare to.")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Slowdown of the p95 allowed over the "
+                                 "baseline, as a fraction.")
+
+    def handle(self, *args, **options):
+        scale = SCALES[options["scale"]]._replace(**{
+            field: options[field] for field in Scale._fields
+            if options[field] is not None
+        })
+
+        if min(scale.groups, scale.workspaces, scale.items,
+               scale.subitems) < 1:
+            raise CommandError("Every group, workspace and item needs at "
+                               "least one child for the routes to target.")
+
+        routes = [route for route in ROUTES
+                  if not options["route"] or route.name in options["route"]]
+
+        if not routes:
+            raise CommandError("No route matches --route.")
+
+        baseline = None
+
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        results = {
+            "meta": self._meta(scale, options),
+            "routes": self._benchmark(scale, routes, options),
+        }
+        output = json.dumps(results, indent=2)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self._compare(baseline, results, options["tolerance"])
+
+    def _meta(self, scale, options):
+        try:
+            commit = subprocess.run(["git", "rev-parse", "HEAD"],
+                                    capture_output=True, text=True,
+                                    check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            "commit": commit,
+            "scale": scale._asdict(),
+            "seed": options["seed"],
+            "requests": options["requests"],
+            "warmup": options["warmup"],
+            "concurrency": options["concurrency"],
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        }
+
+    def _benchmark(self, scale, routes, options):
+        self.stderr.write("Creating the database...")
+
+        with throwaway_database():
+            server = None
+            # Every request and error would be logged otherwise. Errors are
+            # counted in the results by their status code.
+            loggers = [logging.getLogger(name) for name in
+                       ["kronathens.instrumentation", "django.request"]]
+            levels = [logger.level for logger in loggers]
+
+            try:
+                self.stderr.write(f"Seeding {scale}...")
+                dataset = seed(scale, options["seed"])
+
+                with override_settings(ALLOWED_HOSTS=["127.0.0.1"]):
+                    for logger in loggers:
+                        logger.setLevel(logging.CRITICAL)
+
+                    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+                    server.set_app(WSGIHandler())
+                    threading.Thread(target=server.serve_forever,
+                                     daemon=True).start()
+
+                    return self._drive(server, dataset, routes, options)
+            finally:
+                for logger, level in zip(loggers, levels):
+                    logger.setLevel(level)
+
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+
+    def _drive(self, server, dataset, routes, options):
+        host, port = server.server_address[:2]
+        results = {}
+
+        for route in routes:
+            prepare(dataset, route.name,
+                    options["warmup"] + options["requests"], options["seed"])
+
+            if options["warmup"]:
+                drive(host, port, route, dataset, options["warmup"],
+                      options["concurrency"], options["seed"] - 1)
+
+            result = drive(host, port, route, dataset, options["requests"],
+                           options["concurrency"], options["seed"])
+            results[route.name] = result
+
+            self.stderr.write(f"{route.name:<36}{result['throughput']:>9.1f}"
+                              f" req/s  p95 {result['p95']} ms  "
+                              f"{result['errors']} errors")
+
+        return results
+
+    def _compare(self, baseline, results, tolerance):
+        regressions = []
+
+        for name, result in results["routes"].items():
+            before = baseline.get("routes", {}).get(name, {}).get("p95")
+
+            if before and result["p95"] and \
+                    result["p95"] > before * (1 + tolerance):
+                regressions.append(f"{name}: p95 {before} ms -> "
+                                   f"{result['p95']} ms")
+
+        if baseline.get("meta", {}).get("scale") != results["meta"]["scale"]:
+            self.stderr.write("The baseline was run at another scale.")
+
+        if regressions:
+            raise CommandError("Slower than the baseline:\n"
+                               + "\n".join(regressions))
@@ -0,0 +1,124 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from accounts.loader import SCALES, Scale, seed, throwaway_database
+from checklists.models import Workspace, Item, Subitem
+from checklists.serializers import WorkspaceSerializer, ItemSerializer, \
+                                   SubitemSerializer
+from collaboration.models import Group
+from collaboration.serializers import GroupSerializer
+from kronathens.compiled import compile_serializer
+
+# The serializers of the list endpoints and the models they list
+SERIALIZERS = {
+    "workspace": (WorkspaceSerializer, Workspace),
+    "item": (ItemSerializer, Item),
+    "subitem": (SubitemSerializer, Subitem),
+    "group": (GroupSerializer, Group),
+}
+
+class Command(BaseCommand):
+    """
+    Compares the DRF serializers of the list endpoints with their compiled
+    versions (see `kronathens.compiled`) on a synthetic dataset, e.g.
+
+        python manage.py benchmark_serializers --scale large --rows 1000
+
+    Both read the same rows from the database and serialize them, which is
+    timed together as that's what a list endpoint does. The best of
+    `--repeat` runs is kept. The command fails if the two don't render the
+    same JSON.
+    """
+    help = "Compares the DRF and the compiled serializers of the list routes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="medium",
+                            help="Size of the dataset.")
+
+        for field in Scale._fields:
+            parser.add_argument(f"--{field}", type=int,
+                                help=f"Overrides the number of {field}.")
+
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--rows", type=int, default=10000,
+                            help="Rows to serialize at once.")
+        parser.add_argument("--repeat", type=int, default=5,
+                            help="Runs per serializer and path.")
+        parser.add_argument("--output", help="File to write the results to.")
+
+    def handle(self, *args, **options):
+        scale = SCALES[options["scale"]]._replace(**{
+            field: options[field] for field in Scale._fields
+            if options[field] is not None
+        })
+        self.stderr.write("Creating the database...")
+
+        with throwaway_database():
+            self.stderr.write(f"Seeding {scale}...")
+            seed(scale, options["seed"])
+
+            results = {
+                "meta": {
+                    "scale": scale._asdict(),
+                    "seed": options["seed"],
+                    "rows": options["rows"],
+                    "repeat": options["repeat"],
+                },
+                "serializers": {
+                    name: self._compare(serializer_class, model, options)
+                    for name, (serializer_class, model)
+                    in SERIALIZERS.items()
+                },
+            }
+
+        output = json.dumps(results, indent=2)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def _compare(self, serializer_class, model, options):
+        queryset = model.objects.order_by("id")[:options["rows"]]
+        compiled = compile_serializer(serializer_class)
+
+        def drf():
+            return serializer_class(list(queryset), many=True).data
+
+        def fast():
+            return compiled.represent(list(compiled.values(queryset)))
+
+        renderer = JSONRenderer()
+        expected = drf()
+
+        if renderer.render(fast()) != renderer.render(expected):
+            raise CommandError(f"{serializer_class.__name__} and its compiled "
+                               "version render different JSON.")
+
+        drf_ms = self._best(drf, options["repeat"])
+        fast_ms = self._best(fast, options["repeat"])
+        result = {
+            "rows": len(expected),
+            "drf_ms": drf_ms,
+            "compiled_ms": fast_ms,
+            "speedup": round(drf_ms / fast_ms, 1) if fast_ms else None,
+        }
+
+        self.stderr.write(f"{serializer_class.__name__:<20}{len(expected):>7} "
+                          f"rows  DRF {drf_ms} ms  compiled {fast_ms} ms")
+
+        return result
+
+    def _best(self, call, repeat):
+        timings = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+
+        return round(min(timings) * 1000, 2)
@@ -0,0 +1,94 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.loader import MODELS, SCALES, BATCH_SIZE, BulkLoader, Scale, \
+                            generate
+from checklists.search import suspended_index
+
+class Command(BaseCommand):
+    """
+    Fills the database in bulk, either with a synthetic dataset or with the
+    records of a JSON Lines file, e.g.
+
+        python manage.py bulk_load --scale huge
+        python manage.py bulk_load export.jsonl --processes 8
+
+    See `accounts.loader.BulkLoader` for the records. Rows are inserted in bat-
+    ches and the search index is built once at the end. It all happens in one
+    transaction, so an import that fails half way leaves nothing behind.
+    """
+    help = "Seeds or imports users, groups and checklists in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", nargs="?",
+                            help="JSON Lines file to import, - for standard "
+                                 "input. A dataset is generated if not given.")
+        parser.add_argument("--scale", choices=SCALES, default="small",
+                            help="Size of the generated dataset.")
+
+        for field in Scale._fields:
+            parser.add_argument(f"--{field}", type=int,
+                                help=f"Overrides the number of {field}.")
+
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--password", default="password",
+                            help="Password of the users without one.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help="Records inserted per transaction.")
+        parser.add_argument("--processes", type=int,
+                            help="Worker processes to hash the passwords of "
+                                 "imported users in.")
+
+    def handle(self, *args, **options):
+        self.started = time.perf_counter()
+        loader = BulkLoader(options["password"], options["batch_size"],
+                            options["processes"], self._progress)
+
+        try:
+            with suspended_index():
+                for record in self._records(options):
+                    loader.add(record)
+
+                self.stderr.write("Rebuilding progress counters and the "
+                                  "search index...")
+                loader.finish()
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {sum(loader.counts.values())} rows in "
+            f"{time.perf_counter() - self.started:.1f}s."))
+
+    def _records(self, options):
+        if options["file"] is None:
+            scale = SCALES[options["scale"]]._replace(**{
+                field: options[field] for field in Scale._fields
+                if options[field] is not None
+            })
+            self.stderr.write(f"Generating {scale}...")
+            yield from generate(scale, options["seed"])
+            return
+
+        file = sys.stdin if options["file"] == "-" \
+            else open(options["file"], encoding="utf-8")
+
+        with file:
+            for number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    raise CommandError(f"Line {number}: {error}")
+
+    def _progress(self, counts):
+        total = sum(counts.values())
+        elapsed = time.perf_counter() - self.started
+
+        self.stderr.write(
+            f"{total} rows ({total / elapsed:.0f}/s): "
+            + ", ".join(f"{counts[model]} {model}s" for model in MODELS))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (OutstandingToken,
+                                                            BlacklistedToken)
+
+class Command(BaseCommand):
+    """
+    Deletes the outstanding and blacklisted refresh tokens that have expired,
+    which are of no use since an expired token is rejected anyway. Meant to be
+    run periodically, e.g. from cron. Rows are deleted in small batches, each
+    in its own transaction with a pause in between, so that SQLite's single
+    writer is never held for long.
+    """
+    help = "Deletes expired refresh tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Tokens deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=0.05,
+                            help="Seconds to wait between batches.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+
+        while True:
+            # Tokens expire in about the order they were issued, so walking
+            # the primary key finds the expired ones first
+            batch = list(OutstandingToken.objects.filter(expires_at__lte=now)
+                                         .order_by("id")
+                                         .values_list("id", flat=True)
+                                         [:options["batch_size"]])
+
+            if not batch:
+                break
+
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=batch).delete()
+                OutstandingToken.objects.filter(id__in=batch).delete()
+
+            deleted += len(batch)
+            time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} expired token(s)."))
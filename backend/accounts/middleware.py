@@ -0,0 +1,78 @@
+"""
+Authenticates WebSocket connections with the same SimpleJWT access tokens as
+the REST API. Browsers cannot set headers on a WebSocket handshake so the token
+is read from `?token=` as well as from the usual `Authorization` header.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import CachedJWTAuthentication
+
+def _raw_token(scope):
+    """
+    Gets the raw token from the handshake or None if there is none.
+    """
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.split()
+
+            if len(parts) == 2 and parts[0] == b"Bearer":
+                return parts[1].decode()
+
+    tokens = parse_qs(scope.get("query_string", b"").decode()).get("token")
+
+    return tokens[0] if tokens else None
+
+@database_sync_to_async
+def _authenticate(raw_token):
+    """
+    Validates the token and loads its user. Returns the user and the expiry of
+    the token, or an anonymous user if the token is missing or invalid.
+    """
+    if raw_token is None:
+        return AnonymousUser(), None
+
+    authentication = CachedJWTAuthentication()
+
+    try:
+        token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(token), token["exp"]
+    except (AuthenticationFailed, TokenError):
+        return AnonymousUser(), None
+
+def renewed_expiry(raw_token, user):
+    """
+    Validates a fresh token sent over an open socket. Returns its expiry if it
+    belongs to the same user, otherwise None.
+    """
+    if not isinstance(raw_token, str):
+        return None
+
+    try:
+        token = CachedJWTAuthentication().get_validated_token(raw_token)
+    except (AuthenticationFailed, TokenError):
+        return None
+
+    if str(token.get(api_settings.USER_ID_CLAIM)) != str(user.pk):
+        return None
+
+    return token["exp"]
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Puts the user of the token into `scope["user"]` and the expiry of the token
+    into `scope["token_expires"]`. Consumers decide what to do with anonymous
+    users.
+    """
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope["user"], scope["token_expires"] = \
+            await _authenticate(_raw_token(scope))
+
+        return await super().__call__(scope, receive, send)
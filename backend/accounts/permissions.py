@@ -0,0 +1,10 @@
+from rest_framework.permissions import BasePermission
+
+class IsSuperuser(BasePermission):
+    """
+    Only lets superusers through. The user model has no `is_staff` field so
+    DRF's `IsAdminUser` cannot be used.
+    """
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated
+                    and request.user.is_superuser)
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .models import User
+
+@receiver([post_save, post_delete], sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    """
+    Makes the next request of a changed or deleted user load it again, e.g. so
+    that deactivating a user locks it out right away.
+    """
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
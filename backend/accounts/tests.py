@@ -1,3 +1,289 @@
-from django.test import TestCase
+import json
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import (BlacklistedToken,
+                                                            OutstandingToken)
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from checklists.models import Workspace
+from collaboration.models import Contributor
+from kronathens.testing import QueryBudgetTestCase, build_fixture
+
+from . import urls
+from .models import User
+from .tokens import (MAX_CLAIM_LENGTH, MEMBERSHIP_CLAIM,
+                     MembershipRefreshToken, access_token_for, decode_groups,
+                     encode_groups)
+
+class QueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every accounts route runs a fixed number of queries, no matter how many
+    users there are.
+    """
+    def test_every_route_has_a_budget(self):
+        self.assertBudgetsCover(urls.urlpatterns)
+
+    def _login(self, client, fixture):
+        return client.post(reverse("login"), {
+            "username": fixture.user.username, "password": fixture.password,
+        }, format="json")
+
+    def test_register(self):
+        self.assertQueryBudget("register", lambda client, f:
+            client.post(reverse("register"), {
+                "username": f"{f.user.username}-new",
+                "email": f"new-{f.user.email}", "password": "password",
+                "confirmation": "password",
+                "first_name": "New", "last_name": "User",
+            }, format="json"))
+
+    def test_login(self):
+        self.assertQueryBudget("login", self._login)
+
+    def test_refresh(self):
+        tokens = {}
+
+        def prepare(client, fixture):
+            tokens[fixture] = self._login(client, fixture).data["refresh"]
+
+        self.assertQueryBudget("refresh", lambda client, f:
+            client.post(reverse("refresh"), {"refresh": tokens[f]},
+                        format="json"), prepare)
+
+    def test_logout(self):
+        tokens = {}
+
+        def prepare(client, fixture):
+            tokens[fixture] = self._login(client, fixture).data["refresh"]
+
+        self.assertQueryBudget("logout", lambda client, f:
+            client.post(reverse("logout"), {"refresh": tokens[f]},
+                        format="json"), prepare)
+
+    def test_user_detail(self):
+        self.assertQueryBudget("user-detail", lambda client, f:
+            client.get(reverse("user-detail")))
+
+    def test_auth_cache_stats(self):
+        self.assertQueryBudget("auth-cache-stats", lambda client, f:
+            client.get(reverse("auth-cache-stats")))
+
+class AuthUserCacheTests(APITestCase):
+    """
+    The user of a token is only loaded once while it's cached, and loaded
+    again as soon as it changes, see authentication.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("auth", 2)
+
+    def setUp(self):
+        # The user IDs are given out again by the next tests
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = self.fixture.user
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def request(self):
+        """
+        Makes an authenticated request and gives its status and how many times
+        it loaded the user.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("collaboration:group-all"))
+
+        return response.status_code, len([query for query in queries
+                                          if 'FROM "User"' in query["sql"]])
+
+    def test_cached(self):
+        self.assertEqual(self.request(), (200, 1))
+        self.assertEqual(self.request(), (200, 0))
+
+        # Another token of the same user loads it once too
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.assertEqual(self.request(), (200, 1))
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_not_cached(self):
+        self.assertEqual(self.request(), (200, 1))
+        self.assertEqual(self.request(), (200, 1))
+
+    def test_changed(self):
+        self.assertEqual(self.request(), (200, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Changed"
+            self.user.save()
+
+        self.assertEqual(self.request(), (200, 1))
+
+    def test_deactivated(self):
+        self.assertEqual(self.request(), (200, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.request()[0], 401)
+
+    def test_deleted(self):
+        self.assertEqual(self.request(), (200, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertEqual(self.request()[0], 401)
+
+class MembershipClaimTests(APITestCase):
+    """
+    Access tokens claim the groups of their user, which are then read from the
+    token rather than the database, see tokens.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("claims", 2)
+        # Only contributes to the first group
+        cls.user = User.objects.get(username="claims1")
+        cls.other = Workspace.objects.create(group_id=cls.fixture.groups[1],
+                                             name="Other")
+
+    def test_round_trip(self):
+        for group_ids in [[], [7], [3, 1, 2], list(range(100, 300)),
+                          list(range(5, 5000, 3)), [1, 10 ** 6]]:
+            with self.subTest(len(group_ids)):
+                claim = encode_groups(group_ids)
+
+                self.assertEqual(decode_groups(json.loads(json.dumps(claim))),
+                                 set(group_ids))
+                self.assertLessEqual(len(json.dumps(claim)), MAX_CLAIM_LENGTH)
+
+    def test_shortest(self):
+        # Runs of IDs are a bitmap, IDs far apart a list
+        self.assertIsInstance(encode_groups(range(100, 300)), str)
+        self.assertEqual(encode_groups([1, 10 ** 6]), [1, 10 ** 6])
+
+    def test_too_many(self):
+        self.assertIsNone(encode_groups(range(1, 10 ** 6, 7)))
+
+    @override_settings(MEMBERSHIP_CLAIMS=True)
+    def test_issued(self):
+        response = self.client.post(reverse("login"), {
+            "username": self.user.username, "password": self.fixture.password,
+        }, format="json")
+        token = AccessToken(response.data["access"])
+
+        self.assertEqual(decode_groups(token[MEMBERSHIP_CLAIM]),
+                         {self.fixture.group})
+
+        refreshed = self.client.post(reverse("refresh"), {
+            "refresh": response.data["refresh"]}, format="json")
+        self.assertEqual(AccessToken(refreshed.data["access"])
+                         [MEMBERSHIP_CLAIM], token[MEMBERSHIP_CLAIM])
+
+    @override_settings(MEMBERSHIP_CLAIMS=True)
+    def test_database_fallback(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {access_token_for(self.user)}")
+
+        def get(workspace_id):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse("checklists:item-all",
+                                                   args=[workspace_id]))
+
+            return response.status_code, len([
+                query for query in queries
+                if 'FROM "Contributor"' in query["sql"]])
+
+        # Claimed, so the database isn't asked
+        self.assertEqual(get(self.fixture.workspace), (200, 0))
+        # Not claimed, so it is
+        self.assertEqual(get(self.other.id), (403, 1))
+
+        # Joined after the token was issued
+        Contributor.objects.create(group_id=self.fixture.groups[1],
+                                   user=self.user)
+        self.assertEqual(get(self.other.id), (200, 1))
+
+class TokenBlacklistTests(APITestCase):
+    """
+    Logged out refresh tokens are rejected, whether or not the check was
+    cached, and expired ones are pruned, see tokens.py and prune_tokens.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("blacklist", 2)
+
+    def setUp(self):
+        # The token IDs are kept in the cache until they expire
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def login(self):
+        response = self.client.post(reverse("login"), {
+            "username": self.fixture.user.username,
+            "password": self.fixture.password,
+        }, format="json")
+
+        return response.data["access"], response.data["refresh"]
+
+    def refresh(self, token):
+        return self.client.post(reverse("refresh"), {"refresh": token},
+                                format="json").status_code
+
+    def test_logged_out(self):
+        access, refresh = self.login()
+
+        # Caches that it's not blacklisted
+        self.assertEqual(self.refresh(refresh), 200)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("logout"),
+                                        {"refresh": refresh}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh(refresh), 401)
+
+    @override_settings(TOKEN_BLACKLIST_CACHE_TIMEOUT=0)
+    def test_blacklisted_elsewhere(self):
+        _, refresh = self.login()
+
+        self.assertEqual(self.refresh(refresh), 200)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(
+            jti=RefreshToken(refresh)["jti"]))
+        self.assertEqual(self.refresh(refresh), 401)
+
+    def test_prune_tokens(self):
+        tokens = [MembershipRefreshToken.for_user(self.fixture.user)
+                  for _ in range(5)]
+        outstanding = OutstandingToken.objects.filter(
+            jti__in=[token["jti"] for token in tokens]).order_by("id")
+        expired, kept = list(outstanding[:3]), list(outstanding[3:])
+
+        for token in [expired[0], kept[0]]:
+            BlacklistedToken.objects.create(token=token)
+
+        OutstandingToken.objects.filter(
+            id__in=[token.id for token in expired],
+        ).update(expires_at=timezone.now())
+        output = StringIO()
+
+        call_command("prune_tokens", batch_size=2, pause=0, stdout=output)
+
+        self.assertIn("Deleted 3 expired token(s).", output.getvalue())
+        self.assertEqual(list(outstanding), kept)
+        self.assertEqual(list(BlacklistedToken.objects.values_list(
+            "token", flat=True)), [kept[0].id])
@@ -0,0 +1,183 @@
+"""
+Tokens that carry the groups their user contributes to, so that permission
+checks can read the membership from the token rather than the database (see
+checklists/access.py). Turned on with `MEMBERSHIP_CLAIMS` in the settings.
+Refresh tokens also cache whether they are blacklisted.
+
+The groups are put in the access token as a plain list of IDs, or as a bitmap
+of the IDs when that is shorter, i.e. for users in many groups with nearby IDs.
+A bitmap is written as "<first ID>.<base64 of the bits>". Users in so many gro-
+ups that neither fits in `MAX_CLAIM_LENGTH` get no claim and are checked
+against the database as before.
+
+Claims can be stale for the lifetime of an access token: a user who left a
+group keeps access through the claim until the token expires. A user who joined
+a group is not in the claim but falls back to the database.
+"""
+
+import base64
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer,
+                                                  TokenRefreshSerializer)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from collaboration.models import Contributor
+
+MEMBERSHIP_CLAIM = "groups"
+
+# Longest encoded claim in characters, to keep tokens small enough for headers
+MAX_CLAIM_LENGTH = 1024
+
+def _bitmap(group_ids):
+    """
+    Encodes the IDs as a bitmap, or returns None if the bitmap alone would be
+    too long.
+    """
+    first = group_ids[0]
+    length = (group_ids[-1] - first) // 8 + 1
+
+    if length * 4 // 3 > MAX_CLAIM_LENGTH:
+        return None
+
+    bits = bytearray(length)
+
+    for group_id in group_ids:
+        offset = group_id - first
+        bits[offset // 8] |= 1 << (offset % 8)
+
+    return f"{first}." + base64.urlsafe_b64encode(bytes(bits)).decode() \
+                                   .rstrip("=")
+
+def encode_groups(group_ids):
+    """
+    Encodes group IDs for the claim. Returns None if they do not fit.
+    """
+    group_ids = sorted(set(group_ids))
+
+    if not group_ids:
+        return []
+
+    claim = min([claim for claim in (group_ids, _bitmap(group_ids))
+                 if claim is not None],
+                key=lambda claim: len(json.dumps(claim)))
+
+    return claim if len(json.dumps(claim)) <= MAX_CLAIM_LENGTH else None
+
+def decode_groups(claim):
+    """
+    Decodes the claim into a set of group IDs.
+    """
+    if isinstance(claim, list):
+        return set(claim)
+
+    first, bitmap = claim.split(".")
+    bits = base64.urlsafe_b64decode(bitmap + "=" * (-len(bitmap) % 4))
+
+    return {int(first) + position * 8 + bit
+            for position, byte in enumerate(bits)
+            for bit in range(8) if byte & (1 << bit)}
+
+def claimed_groups(token):
+    """
+    Gets the groups claimed by a validated access token, or None if it claims
+    none and the database has to be asked.
+    """
+    if token is None or not settings.MEMBERSHIP_CLAIMS:
+        return None
+
+    claim = token.get(MEMBERSHIP_CLAIM)
+
+    return None if claim is None else decode_groups(claim)
+
+def add_membership(token, user_id):
+    """
+    Puts the groups the user contributes to into the token.
+    """
+    claim = encode_groups(Contributor.objects.filter(user_id=user_id)
+                                             .values_list("group_id", flat=True))
+
+    if claim is not None:
+        token[MEMBERSHIP_CLAIM] = claim
+
+    return token
+
+def access_token_for(user):
+    """
+    Issues a fresh access token for the user, e.g. after the user's groups
+    have changed. Returns None when the claims are turned off.
+    """
+    if not settings.MEMBERSHIP_CLAIMS:
+        return None
+
+    return add_membership(AccessToken.for_user(user), user.pk)
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token that caches the result of its blacklist check. Access tok-
+    ens are short-lived so refreshes are frequent, and each one would other-
+    wise look the token up in the blacklist.
+
+    Blacklisting is final, so a blacklisted token is cached until it expires.
+    That it is not blacklisted is only cached for `TOKEN_BLACKLIST_CACHE_TIME-
+    OUT` seconds, since the token may be blacklisted by a process that does
+    not share the cache. Blacklisting through this class updates the cache.
+    """
+    def _cache_key(self):
+        return f"token-blacklisted:{self.payload[api_settings.JTI_CLAIM]}"
+
+    def _lifetime_left(self):
+        return max(int(self.payload["exp"] - time.time()), 1)
+
+    def check_blacklist(self):
+        timeout = settings.TOKEN_BLACKLIST_CACHE_TIMEOUT
+
+        if not timeout:
+            return super().check_blacklist()
+
+        blacklisted = cache.get(self._cache_key())
+
+        if blacklisted is None:
+            blacklisted = BlacklistedToken.objects.filter(
+                token__jti=self.payload[api_settings.JTI_CLAIM]).exists()
+            cache.set(self._cache_key(), blacklisted,
+                      self._lifetime_left() if blacklisted else timeout)
+
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        key, timeout = self._cache_key(), self._lifetime_left()
+
+        transaction.on_commit(lambda: cache.set(key, True, timeout))
+
+        return blacklisted
+
+class MembershipRefreshToken(CachedBlacklistRefreshToken):
+    """
+    Refresh token whose access tokens claim the current groups of the user.
+    The refresh token itself carries no claim since it lives much longer.
+    """
+    @property
+    def access_token(self):
+        access = super().access_token
+
+        if settings.MEMBERSHIP_CLAIMS:
+            add_membership(access, self[api_settings.USER_ID_CLAIM])
+
+        return access
+
+class MembershipTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = MembershipRefreshToken
+
+class MembershipTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = MembershipRefreshToken
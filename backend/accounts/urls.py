@@ -1,11 +1,13 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, UserDetailView, LogoutView
+from .views import RegisterView, UserDetailView, LogoutView, AuthCacheStatsView
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
     path("login/", TokenObtainPairView.as_view(), name="login"),
     path("refresh/", TokenRefreshView.as_view(), name="refresh"),
     path("logout/", LogoutView.as_view(), name="logout"),
-    path("me/", UserDetailView.as_view(), name="user-detail")
+    path("me/", UserDetailView.as_view(), name="user-detail"),
+    path("auth/cache/stats/", AuthCacheStatsView.as_view(),
+         name="auth-cache-stats")
 ]
\ No newline at end of file
@@ -1,10 +1,13 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from django.contrib.auth import get_user_model
+from .authentication import stats
+from .permissions import IsSuperuser
 from .serializers import *
+from .tokens import MembershipRefreshToken
 
 User = get_user_model()
 
@@ -37,6 +40,9 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    # The user is saved as a whole when updated, so it must not be a cached copy
+    authentication_classes = [JWTAuthentication]
+
     def get_object(self):
         return self.request.user
     
@@ -45,6 +51,16 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
             return UserUpdateSerializer
         return UserSerializer
     
+class AuthCacheStatsView(APIView):
+    """
+    Reports the hits and misses of the authenticated user cache in this proc-
+    ess. Only for superusers.
+    """
+    permission_classes = [IsSuperuser]
+
+    def get(self, request):
+        return Response(stats.as_dict(), status=status.HTTP_200_OK)
+
 class LogoutView(APIView):
     """
     Lets the user log out.
@@ -54,7 +70,7 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data.get("refresh")
-            token = RefreshToken(refresh_token)
+            token = MembershipRefreshToken(refresh_token)
             token.blacklist()
             return Response({"message": "Successfully logged out."}, status=status.HTTP_200_OK)
         except Exception:
@@ -0,0 +1,149 @@
+"""
+Resolves checklist objects together with the permissions of the requesting u-
+ser. Each resolver fetches the object and checks `Contributor` membership in a
+single joined query so that the views do not have to walk the chain of foreign
+keys one lookup at a time.
+
+When the access token claims the user's groups (see accounts/tokens.py), memb-
+ership is read from the claim instead and the database is only asked about
+groups missing from it, e.g. ones the user joined after the token was issued.
+"""
+
+from django.db.models import Exists, OuterRef, F
+
+from accounts.tokens import claimed_groups
+from collaboration.models import Group, Contributor
+
+from .models import Workspace, Item, Subitem
+
+def _memo(request):
+    """
+    Returns the per-request memo for resolved objects. The memo lives on the r-
+    equest so that nothing is shared between two different requests.
+    """
+    memo = getattr(request, "_checklist_access", None)
+
+    if memo is None:
+        memo = {}
+        request._checklist_access = memo
+
+    return memo
+
+def _membership(request, group_path):
+    """
+    Builds the `EXISTS` subquery checking if the requesting user contributes to
+    the group found at `group_path` from the queried model.
+    """
+    return Exists(Contributor.objects.filter(group_id=OuterRef(group_path),
+                                             user_id=request.user.id))
+
+def _lookup(request, queryset, group_path, object_id):
+    """
+    Builds the lookup of the object. Returns it with the groups claimed by the
+    token, which are None if the lookup checks membership itself.
+    """
+    claimed = claimed_groups(getattr(request, "auth", None))
+
+    if claimed is None:
+        return queryset.annotate(
+            can_modify=_membership(request, group_path)
+        ).filter(id=object_id), None
+
+    return queryset.annotate(group_for_access=F(group_path)) \
+                   .filter(id=object_id), claimed
+
+def _fallback(request, resolved):
+    """
+    Asks the database about a group that the token doesn't claim.
+    """
+    return Contributor.objects.filter(group_id=resolved.group_for_access,
+                                      user_id=request.user.id)
+
+def _resolve(request, queryset, group_path, object_id):
+    """
+    Runs the joined lookup once per request and object. Returns the object wi-
+    th `can_modify` set or None if it does not exist.
+    """
+    key = (queryset.model, object_id)
+    memo = _memo(request)
+
+    if key not in memo:
+        lookup, claimed = _lookup(request, queryset, group_path, object_id)
+        resolved = lookup.first()
+
+        if resolved is not None and claimed is not None:
+            resolved.can_modify = resolved.group_for_access in claimed or \
+                _fallback(request, resolved).exists()
+
+        memo[key] = resolved
+
+    return memo[key]
+
+async def _aresolve(request, queryset, group_path, object_id):
+    """
+    Same as `_resolve` for async views.
+    """
+    key = (queryset.model, object_id)
+    memo = _memo(request)
+
+    if key not in memo:
+        lookup, claimed = _lookup(request, queryset, group_path, object_id)
+        resolved = await lookup.afirst()
+
+        if resolved is not None and claimed is not None:
+            resolved.can_modify = resolved.group_for_access in claimed or \
+                await _fallback(request, resolved).aexists()
+
+        memo[key] = resolved
+
+    return memo[key]
+
+def resolve_group(request, group_id):
+    """
+    Gets the group along with whether the user is a contributor to it.
+    """
+    return _resolve(request, Group.objects.all(), "id", group_id)
+
+async def aresolve_group(request, group_id):
+    """
+    Same as `resolve_group` for async views.
+    """
+    return await _aresolve(request, Group.objects.all(), "id", group_id)
+
+def resolve_workspace(request, workspace_id):
+    """
+    Gets the workspace along with whether the user can modify it.
+    """
+    return _resolve(request, Workspace.objects.all(), "group_id", workspace_id)
+
+async def aresolve_workspace(request, workspace_id):
+    """
+    Same as `resolve_workspace` for async views.
+    """
+    return await _aresolve(request, Workspace.objects.all(), "group_id",
+                           workspace_id)
+
+def resolve_item(request, item_id):
+    """
+    Gets the item and its workspace along with whether the user can modify it.
+    """
+    return _resolve(request, Item.objects.select_related("workspace"),
+                    "workspace__group_id", item_id)
+
+def resolve_subitem(request, subitem_id):
+    """
+    Gets the subitem, its item and the workspace along with whether the user c-
+    an modify it.
+    """
+    return _resolve(request, Subitem.objects.select_related("item__workspace"),
+                    "item__workspace__group_id", subitem_id)
+
+def can_modify_workspace(user, workspace_id):
+    """
+    Checks if a user can modify a workspace outside of a request, e.g. when a
+    WebSocket connects. False if the workspace does not exist.
+    """
+    return Workspace.objects.filter(id=workspace_id).filter(
+        Exists(Contributor.objects.filter(group_id=OuterRef("group_id"),
+                                          user_id=user.id))
+    ).exists()
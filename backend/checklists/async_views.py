@@ -0,0 +1,117 @@
+"""
+Async versions of the hottest checklist views (see kronathens/asyncapi.py).
+They behave exactly like their counterparts in views.py.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db.models import aprefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework import status
+
+from kronathens.asyncapi import async_api_view, api_response
+from kronathens.fieldsets import FieldsetError, requested_fieldset
+
+from .access import aresolve_workspace
+from .caching import aget_aggregate, aset_aggregate
+from .events import describe
+from .models import Change
+from .serializers import WorkspaceSerializer
+from .streaming import astream_aggregate, streamable
+from . import views
+from .views import aggregate_serializer, not_modified, workspace_etag
+
+async def _workspace_or_error(request, workspace_id):
+    """
+    Resolves the workspace. Returns it and None, or None and the response to
+    send if the user can't see it.
+    """
+    workspace = await aresolve_workspace(request, workspace_id)
+
+    if workspace is None:
+        return None, api_response({"error": "Workspace not found or you do not "
+                                   "have permission to edit it."},
+                                  status=status.HTTP_400_BAD_REQUEST)
+
+    if not workspace.can_modify:
+        return None, api_response({"error": "You do not have permission to "
+                                   "edit this workspace"},
+                                  status=status.HTTP_403_FORBIDDEN)
+
+    return workspace, None
+
+@async_api_view(views.get_workspace_aggr_content)
+async def get_workspace_aggr_content(request, workspace_id):
+    """
+    Gets all the items and subitems in a workspace. Responds with 304 if the
+    client already has the current revision as given by `If-None-Match`.
+    """
+    workspace, error = await _workspace_or_error(request, workspace_id)
+
+    if error is not None:
+        return error
+
+    try:
+        fieldset = requested_fieldset(request)
+        serializer, lookups = aggregate_serializer(workspace, fieldset)
+    except FieldsetError as error:
+        return api_response({"error": str(error)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    etag = workspace_etag(workspace, fieldset)
+
+    if not_modified(request, etag):
+        return api_response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={"ETag": etag})
+
+    data = await aget_aggregate(workspace, fieldset)
+
+    if data is None and request.GET.get("stream") == "1" and \
+            request.accepted_renderer.format == "json" and \
+            streamable(fieldset):
+        return StreamingHttpResponse(astream_aggregate(workspace, fieldset),
+                                     content_type="application/json",
+                                     headers={"ETag": etag})
+
+    if data is None:
+        await aprefetch_related_objects([workspace], *lookups)
+        data = serializer.data
+        await aset_aggregate(workspace, data, fieldset)
+
+    return api_response(data, headers={"ETag": etag})
+
+@async_api_view(views.get_workspace_changes)
+async def get_workspace_changes(request, workspace_id):
+    """
+    Gets what changed in a workspace since the revision given by `?since=`.
+    Responds with 410 if the changes have been compacted away.
+    """
+    workspace, error = await _workspace_or_error(request, workspace_id)
+
+    if error is not None:
+        return error
+
+    try:
+        since = int(request.GET.get("since", ""))
+    except ValueError:
+        return api_response({"error": "A valid revision is required for "
+                             "`since`."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if since < workspace.compacted_revision:
+        return api_response({"error": "Changes since this revision are no "
+                             "longer available. Fetch the whole workspace "
+                             "instead.", "revision": workspace.revision},
+                            status=status.HTTP_410_GONE)
+
+    latest = {}
+    async for kind, object_id, deleted, sequence in Change.objects.filter(
+            workspace=workspace, sequence__gt=since,
+            sequence__lte=workspace.revision,
+    ).order_by("sequence", "id").values_list("kind", "object_id", "deleted",
+                                             "sequence"):
+        latest[kind, object_id] = (deleted, sequence)
+
+    return api_response({
+        "revision": workspace.revision,
+        "workspace": WorkspaceSerializer(workspace).data,
+        "changes": await sync_to_async(describe)(workspace, latest),
+    }, headers={"ETag": workspace_etag(workspace)})
@@ -0,0 +1,289 @@
+"""
+Applies a batch of subitem operations to a single workspace. Every operation
+is validated before anything is written so that a batch is either applied as a
+whole or not at all. Validating and writing happen in the same transaction, so
+the subitems can't change in between.
+
+Updates and deletes can name the `version` of the subitem they are based on,
+like an edit with `If-Match` (see versioning.py). The batch fails with 412 if
+one of them is at another version.
+"""
+
+from collections import defaultdict
+
+from django.db.models import F, Max
+
+from .models import Item, Subitem, Change
+from .ordering import key_between
+from .serializers import CreateSubitemSerializer, SubitemSerializer
+from .tracking import contribution, shift_many
+from .versioning import VersionConflict
+
+# Upper bound on the number of operations in one batch
+BATCH_LIMIT = 1000
+
+def _as_id(value):
+    """
+    Returns the value as an ID or None if it cannot be one.
+    """
+    if isinstance(value, bool):
+        return None
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class SubitemBatch:
+    """
+    A batch of creates, updates and deletes of subitems in a workspace. The
+    batch looks like this:
+
+        {"create": [{"item": 1, "content": "...", "weight": 1}, ...],
+         "update": [{"id": 2, "completion_status": true}, ...],
+         "delete": [3, {"id": 4, "version": 2}, ...]}
+
+    Errors are reported like DRF does for lists, i.e. one entry per operation
+    that is empty if the operation was valid. Must be validated and saved in
+    one transaction.
+    """
+    def __init__(self, workspace, data):
+        self.workspace = workspace
+        self.data = data
+        self.creates = self.updates = self.deletes = []
+
+        self.errors = None
+        self._conflicts = 0
+        self._created = []
+        self._updated = []
+        self._deleted = []
+
+    def is_valid(self):
+        """
+        Validates every operation and loads what they refer to in two queries.
+        Raises `VersionConflict` with the errors in `errors` if the operations
+        are only wrong about the versions they are based on.
+        """
+        if not isinstance(self.data, dict):
+            self.errors = {"error": "A batch must be an object."}
+            return False
+
+        self.creates = self.data.get("create", [])
+        self.updates = self.data.get("update", [])
+        self.deletes = self.data.get("delete", [])
+
+        if not all(isinstance(operations, list) for operations in
+                   (self.creates, self.updates, self.deletes)):
+            self.errors = {"error": "create, update and delete must be lists."}
+            return False
+
+        if len(self.creates) + len(self.updates) + len(self.deletes) \
+                > BATCH_LIMIT:
+            self.errors = {"error": f"A batch can hold at most {BATCH_LIMIT} "
+                           "operations."}
+            return False
+
+        errors = {
+            "create": [self._validate_create(position, operation)
+                       for position, operation in enumerate(self.creates)],
+            "update": [],
+            "delete": [],
+        }
+
+        # Items of the new subitems have to be in this workspace
+        items = set(Item.objects.filter(
+            workspace=self.workspace,
+            id__in=[subitem.item_id for _, subitem in self._created]
+        ).values_list("id", flat=True))
+
+        for position, subitem in self._created:
+            if subitem.item_id not in items:
+                errors["create"][position]["item"] = [
+                    "Item does not exist in this workspace."]
+
+        # Subitems that are updated or deleted are loaded in one go
+        update_ids = [_as_id(operation.get("id"))
+                      if isinstance(operation, dict) else None
+                      for operation in self.updates]
+        delete_ids = [_as_id(operation.get("id"))
+                      if isinstance(operation, dict) else _as_id(operation)
+                      for operation in self.deletes]
+        subitems = Subitem.objects.filter(item__workspace=self.workspace) \
+                                  .in_bulk([subitem_id for subitem_id in
+                                            update_ids + delete_ids
+                                            if subitem_id is not None])
+        seen = set()
+
+        for operation, subitem_id in zip(self.updates, update_ids):
+            errors["update"].append(
+                self._validate_update(operation, subitems.get(subitem_id),
+                                      subitem_id in seen))
+            seen.add(subitem_id)
+
+        for operation, subitem_id in zip(self.deletes, delete_ids):
+            subitem = subitems.get(subitem_id)
+
+            if subitem is None:
+                error = {"id": ["Subitem does not exist in this workspace."]}
+            elif subitem_id in seen:
+                error = {"id": ["Subitem appears more than once in the batch."]}
+            else:
+                error = self._precondition(operation, subitem)
+
+            if not error:
+                self._deleted.append(subitem)
+
+            seen.add(subitem_id)
+            errors["delete"].append(error)
+
+        failed = sum(1 for kind in errors for error in errors[kind] if error)
+
+        if failed:
+            self.errors = errors
+
+            # Only a precondition of the client's failed
+            if failed == self._conflicts:
+                raise VersionConflict()
+
+            return False
+
+        return True
+
+    def _precondition(self, operation, subitem):
+        """
+        Checks the version an update or delete is based on, if it names one.
+        """
+        if not isinstance(operation, dict) or "version" not in operation:
+            return {}
+
+        version = _as_id(operation["version"])
+
+        if version is None:
+            return {"version": ["A valid version is required."]}
+
+        if version != subitem.version:
+            self._conflicts += 1
+            return {"version": ["Subitem was changed in the meantime."]}
+
+        return {}
+
+    def _validate_create(self, position, operation):
+        if not isinstance(operation, dict):
+            return {"non_field_errors": ["Expected an object."]}
+
+        # The same rules as `create_subitem` but for the item, which is
+        # checked for the whole batch at once
+        serializer = CreateSubitemSerializer(data=operation)
+        serializer.fields.pop("item")
+        errors = {} if serializer.is_valid() else dict(serializer.errors)
+        item_id = _as_id(operation.get("item"))
+
+        if item_id is None:
+            errors["item"] = ["A valid item ID is required."]
+
+        if not errors:
+            self._created.append((position, Subitem(
+                item_id=item_id, **serializer.validated_data)))
+
+        return errors
+
+    def _validate_update(self, operation, subitem, repeated):
+        if not isinstance(operation, dict):
+            return {"non_field_errors": ["Expected an object."]}
+
+        if subitem is None:
+            return {"id": ["Subitem does not exist in this workspace."]}
+
+        if repeated:
+            return {"id": ["Subitem appears more than once in the batch."]}
+
+        error = self._precondition(operation, subitem)
+
+        if error:
+            return error
+
+        serializer = SubitemSerializer(subitem, data=operation, partial=True)
+
+        if not serializer.is_valid():
+            return dict(serializer.errors)
+
+        old = contribution(subitem.weight, subitem.completion_status)
+
+        for name, value in serializer.validated_data.items():
+            setattr(subitem, name, value)
+
+        self._updated.append((subitem, old, list(serializer.validated_data)))
+        return {}
+
+    def save(self):
+        """
+        Writes the whole batch with one statement per kind of operation and
+        keeps the progress counters in step.
+        """
+        deltas = defaultdict(lambda: [0, 0, 0])
+
+        def shift(item_id, amounts, sign=1):
+            for position, amount in enumerate(amounts):
+                deltas[item_id][position] += sign * amount
+
+        # New subitems go to the end of their items in the order given
+        last = dict(Subitem.objects.filter(
+            item__in={subitem.item_id for _, subitem in self._created}
+        ).values_list("item").annotate(Max("position")).order_by())
+
+        for _, subitem in self._created:
+            subitem.position = key_between(last.get(subitem.item_id), None)
+            last[subitem.item_id] = subitem.position
+
+        created = Subitem.objects.bulk_create(
+            [subitem for _, subitem in self._created])
+
+        for subitem in created:
+            shift(subitem.item_id, contribution(subitem.weight,
+                                                subitem.completion_status))
+
+        fields = {"version"}
+        for subitem, old, changed in self._updated:
+            # Edits from PATCH that were based on the old version fail
+            subitem.version = F("version") + 1
+            fields.update(changed)
+            shift(subitem.item_id, old, -1)
+            shift(subitem.item_id, contribution(subitem.weight,
+                                                subitem.completion_status))
+
+        if self._updated:
+            Subitem.objects.bulk_update(
+                [subitem for subitem, _, _ in self._updated], list(fields))
+
+            versions = dict(Subitem.objects.filter(
+                id__in=[subitem.id for subitem, _, _ in self._updated]
+            ).values_list("id", "version"))
+
+            for subitem, _, _ in self._updated:
+                subitem.version = versions[subitem.id]
+
+        if self._deleted:
+            Subitem.objects.filter(
+                id__in=[subitem.id for subitem in self._deleted]).delete()
+
+        for subitem in self._deleted:
+            shift(subitem.item_id, contribution(subitem.weight,
+                                                subitem.completion_status),
+                  -1)
+
+        changes = [(Change.SUBITEM, subitem.id, False)
+                   for subitem in created] + \
+                  [(Change.SUBITEM, subitem.id, False)
+                   for subitem, _, _ in self._updated] + \
+                  [(Change.SUBITEM, subitem.id, True)
+                   for subitem in self._deleted]
+
+        if changes:
+            shift_many(self.workspace, deltas, changes)
+
+        return {
+            "create": [SubitemSerializer(subitem).data for subitem in created],
+            "update": [SubitemSerializer(subitem).data
+                       for subitem, _, _ in self._updated],
+            "delete": [subitem.id for subitem in self._deleted],
+        }
@@ -0,0 +1,73 @@
+"""
+Cache for the serialized workspace aggregates. Entries are keyed by the works-
+pace ID and versioned by its revision so a stale aggregate can never be served
+once the revision has moved on. The cache itself is the `aggregates` alias in
+`CACHES`, which bounds the number of entries and evicts the least recently used.
+
+Aggregates of a sparse fieldset (see kronathens/fieldsets.py) are kept apart
+under a hash of the fieldset. Only the full aggregate is dropped when it goes
+stale, the others are left to be evicted as they are never read again.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import transaction
+
+from kronathens.stats import CacheStats
+
+stats = CacheStats("aggregates")
+
+def _key(workspace_id, fieldset=None):
+    if fieldset is None:
+        return f"workspace-aggregate:{workspace_id}"
+
+    return f"workspace-aggregate:{workspace_id}:{fieldset.digest()}"
+
+def get_aggregate(workspace, fieldset=None):
+    """
+    Returns the cached aggregate for the workspace's current revision or None.
+    """
+    data = caches["aggregates"].get(_key(workspace.id, fieldset),
+                                    version=workspace.revision)
+    stats.record(data is not None)
+
+    return data
+
+async def aget_aggregate(workspace, fieldset=None):
+    """
+    Same as `get_aggregate` for async views.
+    """
+    data = await caches["aggregates"].aget(_key(workspace.id, fieldset),
+                                           version=workspace.revision)
+    stats.record(data is not None)
+
+    return data
+
+def set_aggregate(workspace, data, fieldset=None):
+    """
+    Stores the aggregate that was serialized for the workspace's revision. In a
+    transaction, e.g. an atomic batch, it is only stored once that commits, as
+    a revision that is rolled back is given out again.
+    """
+    transaction.on_commit(lambda: caches["aggregates"].set(
+        _key(workspace.id, fieldset), data, version=workspace.revision))
+
+async def aset_aggregate(workspace, data, fieldset=None):
+    """
+    Same as `set_aggregate` for async views. Runs in the thread of the data-
+    base connection to see the transaction it may be in.
+    """
+    await sync_to_async(set_aggregate)(workspace, data, fieldset)
+
+def invalidate(workspaces):
+    """
+    Drops the aggregates of the given (workspace ID, revision) pairs once the
+    current transaction commits.
+    """
+    workspaces = list(workspaces)
+
+    def drop():
+        for workspace_id, revision in workspaces:
+            caches["aggregates"].delete(_key(workspace_id), version=revision)
+
+    transaction.on_commit(drop)
@@ -0,0 +1,101 @@
+"""
+WebSocket consumers. A client connects to a workspace and is then sent an event
+for every change to it, instead of polling the aggregate.
+"""
+
+import time
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from accounts.middleware import renewed_expiry
+
+from .access import can_modify_workspace
+from .events import describe_event, group_name
+
+# Close codes. Clients should get a new access token before reconnecting after
+# UNAUTHORIZED but should not reconnect at all after FORBIDDEN.
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+
+class WorkspaceConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Sends the changes to one workspace as they are committed. Only contributors
+    to the workspace's group can connect. The messages look like this:
+
+        {"type": "workspace.changes", "revision": 12, "workspace": {...},
+         "changes": [{"sequence": 12, "type": "subitem", "id": 3,
+                      "deleted": false, "data": {...}}, ...]}
+        {"type": "workspace.deleted"}
+
+    The socket is closed once the access token it was opened with expires, so
+    clients should send each new token with {"type": "token", "token": "..."}.
+    A client that was disconnected should catch up through the change feed
+    from the last revision it saw.
+    """
+    async def connect(self):
+        self.group = None
+        user = self.scope["user"]
+        workspace_id = self.scope["url_route"]["kwargs"]["workspace_id"]
+
+        # Accepting first lets the client see why it was closed
+        await self.accept()
+
+        if not user.is_authenticated:
+            await self.close(code=UNAUTHORIZED)
+            return
+
+        if not await database_sync_to_async(can_modify_workspace)(
+                user, workspace_id):
+            await self.close(code=FORBIDDEN)
+            return
+
+        self.group = group_name(workspace_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+
+    async def disconnect(self, code):
+        if self.group is not None:
+            await self.channel_layer.group_discard(self.group,
+                                                   self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if not isinstance(content, dict):
+            return
+
+        if content.get("type") == "ping":
+            await self.send_json({"type": "pong"})
+        elif content.get("type") == "token":
+            expires = renewed_expiry(content.get("token"), self.scope["user"])
+
+            if expires is None:
+                await self.close(code=UNAUTHORIZED)
+            else:
+                self.scope["token_expires"] = expires
+
+    async def _expired(self):
+        """
+        Closes the socket once the token it was opened with has expired so the
+        client has to prove it is still signed in.
+        """
+        if self.scope["token_expires"] <= time.time():
+            await self.close(code=UNAUTHORIZED)
+            return True
+
+        return False
+
+    async def workspace_changed(self, event):
+        if await self._expired():
+            return
+
+        message = await database_sync_to_async(describe_event)(event)
+
+        if message is not None:
+            await self.send_json(message)
+
+    async def workspace_deleted(self, event):
+        await self.send_json(event)
+        await self.close()
+
+    async def access_revoked(self, event):
+        if event["user"] == self.scope["user"].id:
+            await self.close(code=FORBIDDEN)
@@ -0,0 +1,119 @@
+"""
+Pushes the changes to a workspace to the clients watching it over a WebSocket
+(see consumers.py). Events are sent through the channel layer once the trans-
+action that made the change commits, so clients never hear of writes that were
+rolled back. Each event lists the changed rows in the same form as the change
+feed, so a client can apply pushed and fetched changes the same way.
+
+Writes only send what they logged in the change log. The rows are read by the
+consumers that receive the event, so writes to workspaces that nobody watches
+don't read anything for it.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .models import Workspace, Item, Subitem, Change
+from .serializers import WorkspaceSerializer, ItemSerializer, SubitemSerializer
+
+SERIALIZERS = {Change.ITEM: ItemSerializer, Change.SUBITEM: SubitemSerializer}
+
+def group_name(workspace_id):
+    """
+    Gets the channel layer group of the sockets watching a workspace.
+    """
+    return f"workspace-{workspace_id}"
+
+def describe(workspace, latest):
+    """
+    Describes changes to the workspace given as a mapping of (kind, object ID)
+    to (deleted, sequence), ordered by sequence. Rows that have moved out of
+    the workspace since are described as deleted.
+    """
+    def current(queryset, kind):
+        ids = [object_id for (of_kind, object_id), (deleted, _) in
+               latest.items() if of_kind == kind and not deleted]
+        return queryset.in_bulk(ids) if ids else {}
+
+    rows = {
+        Change.ITEM: current(Item.objects.filter(workspace=workspace),
+                             Change.ITEM),
+        Change.SUBITEM: current(
+            Subitem.objects.filter(item__workspace=workspace), Change.SUBITEM),
+    }
+
+    changes = []
+    for (kind, object_id), (deleted, sequence) in sorted(
+            latest.items(), key=lambda change: change[1][1]):
+        row = None if deleted else rows[kind].get(object_id)
+
+        changes.append({
+            "sequence": sequence,
+            "type": kind,
+            "id": object_id,
+            "deleted": row is None,
+            "data": None if row is None else SERIALIZERS[kind](row).data,
+        })
+
+    return changes
+
+def _send(workspace_ids, event):
+    layer = get_channel_layer()
+
+    if layer is None:
+        return
+
+    for workspace_id in workspace_ids:
+        async_to_sync(layer.group_send)(group_name(workspace_id), event)
+
+def _after_commit(callback):
+    # A failed push must not turn a committed write into an error
+    transaction.on_commit(callback, robust=True)
+
+def publish(workspace_id, revision, changes):
+    """
+    Sends the (kind, object ID, deleted) changes that were logged under a rev-
+    ision of the workspace.
+    """
+    event = {"type": "workspace.changed", "workspace": workspace_id,
+             "revision": revision, "changes": [list(change)
+                                              for change in changes]}
+    _after_commit(lambda: _send([workspace_id], event))
+
+def describe_event(event):
+    """
+    Builds the message for the clients from an event sent by `publish`, with
+    the rows as they are now. Returns None if the workspace is gone.
+    """
+    workspace = Workspace.objects.filter(id=event["workspace"]).first()
+
+    if workspace is None:
+        return None
+
+    latest = {(kind, object_id): (deleted, event["revision"])
+              for kind, object_id, deleted in event["changes"]}
+
+    return {
+        "type": "workspace.changes",
+        "revision": event["revision"],
+        "workspace": WorkspaceSerializer(workspace).data,
+        "changes": describe(workspace, latest),
+    }
+
+def workspaces_deleted(workspace_ids):
+    """
+    Tells the sockets watching the workspaces that they are gone.
+    """
+    workspace_ids = list(workspace_ids)
+    _after_commit(lambda: _send(workspace_ids,
+                                {"type": "workspace.deleted"}))
+
+def access_revoked(workspace_ids, user_id):
+    """
+    Tells the sockets of a user watching the workspaces that the user can no
+    longer see them.
+    """
+    workspace_ids = list(workspace_ids)
+    _after_commit(lambda: _send(workspace_ids, {"type": "access.revoked",
+                                                "user": user_id}))
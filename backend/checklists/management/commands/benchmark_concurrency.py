@@ -0,0 +1,106 @@
+import http.client
+import itertools
+import json
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.loader import load
+
+class Command(BaseCommand):
+    """
+    Measures how a running deployment holds up under concurrent connections,
+    to compare serving the API through WSGI and through ASGI with the async
+    views. Start both against the same database, e.g.
+
+        gunicorn kronathens.wsgi -w 1 --threads 8 -b 127.0.0.1:8000
+        ASYNC_VIEWS=1 daphne -b 127.0.0.1 -p 8001 kronathens.asgi:application
+
+    and run
+
+        python manage.py benchmark_concurrency --username u --password p \\
+            --target wsgi=http://127.0.0.1:8000 \\
+            --target asgi=http://127.0.0.1:8001 \\
+            --path /api/checklists/workspace/aggregate/all/1/
+
+    Every connection is kept alive and sends its next request as soon as the
+    last one was answered, so the throughput is what the server can sustain at
+    that many connections. The requests are sent and measured like those of
+    `benchmark_endpoints`, see `accounts.loader.load`.
+    """
+    help = "Compares the throughput of deployments under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", action="append", required=True,
+                            help="NAME=URL of a deployment, can be repeated.")
+        parser.add_argument("--path", action="append", required=True,
+                            help="Endpoint to request, can be repeated.")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--concurrency", type=int, nargs="+",
+                            default=[1, 8, 32, 128],
+                            help="Numbers of connections to try.")
+        parser.add_argument("--duration", type=float, default=10.0,
+                            help="Seconds to run each level for.")
+
+    def handle(self, *args, **options):
+        targets = []
+
+        for target in options["target"]:
+            name, _, url = target.partition("=")
+
+            if not url:
+                raise CommandError(f"Expected NAME=URL, got {target!r}.")
+
+            targets.append((name, urlsplit(url)))
+
+        self.stdout.write(f"{'target':<10}{'conns':>6}{'req/s':>10}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'errors':>8}")
+
+        for name, url in targets:
+            for concurrency in options["concurrency"]:
+                # Access tokens are short-lived so each run gets its own
+                token = self._login(url, options["username"],
+                                    options["password"])
+                result = self._run(url, token, options["path"], concurrency,
+                                   options["duration"])
+
+                # Percentiles are None if no request succeeded
+                latencies = "".join(f"{str(result[key]):>9}" for key
+                                    in ["p50", "p95", "p99"])
+                self.stdout.write(
+                    f"{name:<10}{concurrency:>6}{result['throughput']:>10.1f}"
+                    f"{latencies}{result['errors']:>8}")
+
+    def _connection(self, url):
+        connection_class = http.client.HTTPSConnection \
+            if url.scheme == "https" else http.client.HTTPConnection
+        return connection_class(url.hostname, url.port, timeout=30)
+
+    def _login(self, url, username, password):
+        connection = self._connection(url)
+        connection.request("POST", url.path.rstrip("/") + "/api/token/",
+                           json.dumps({"username": username,
+                                       "password": password}),
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+
+        if response.status != 200:
+            raise CommandError(f"Could not log in to {url.geturl()}: "
+                               f"{response.status} {body[:200]!r}")
+
+        return json.loads(body)["access"]
+
+    def _run(self, url, token, paths, concurrency, duration):
+        headers = {"Authorization": f"Bearer {token}"}
+        prefix = url.path.rstrip("/")
+
+        def requests(number):
+            for request in itertools.count(number):
+                yield "GET", prefix + paths[request % len(paths)], None, headers
+
+        return load(lambda: self._connection(url), requests, concurrency,
+                    duration)
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef
+from django.utils import timezone
+
+from checklists.models import Workspace, Change
+
+class Command(BaseCommand):
+    """
+    Keeps the change log from growing without bound. Meant to be run periodic-
+    ally, e.g. from cron. It first drops changes that a later change to the
+    same object supersedes, which loses nothing. Then it drops changes that are
+    older than CHANGE_LOG_MAX_AGE or beyond the newest CHANGE_LOG_MAX_ENTRIES
+    of a workspace and records the cut-off, so that clients further behind are
+    told to fetch the whole workspace again.
+    """
+    help = "Compacts the change log of every workspace."
+
+    def handle(self, *args, **options):
+        superseded = Change.objects.filter(Exists(Change.objects.filter(
+            workspace=OuterRef("workspace"), kind=OuterRef("kind"),
+            object_id=OuterRef("object_id"), sequence__gt=OuterRef("sequence"),
+        )))
+        dropped, _ = superseded.delete()
+
+        # Everything up to the newest change that is too old goes
+        cutoffs = dict(Change.objects.filter(
+            created_at__lt=timezone.now() - settings.CHANGE_LOG_MAX_AGE,
+        ).values_list("workspace").annotate(Max("sequence")).order_by())
+
+        # And anything beyond the newest entries of long logs
+        limit = settings.CHANGE_LOG_MAX_ENTRIES
+        for workspace_id in Change.objects.values_list("workspace") \
+                .annotate(entries=Count("id")).filter(entries__gt=limit) \
+                .order_by().values_list("workspace", flat=True):
+            sequence = Change.objects.filter(workspace=workspace_id) \
+                                     .order_by("-sequence", "-id") \
+                                     .values_list("sequence", flat=True)[limit]
+            cutoffs[workspace_id] = max(cutoffs.get(workspace_id, 0), sequence)
+
+        # One workspace at a time to keep the writes short
+        for workspace_id, sequence in cutoffs.items():
+            with transaction.atomic():
+                deleted, _ = Change.objects.filter(
+                    workspace=workspace_id, sequence__lte=sequence).delete()
+                Workspace.objects.filter(
+                    id=workspace_id, compacted_revision__lt=sequence
+                ).update(compacted_revision=sequence)
+                dropped += deleted
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dropped {dropped} change(s), cut off the log of "
+            f"{len(cutoffs)} workspace(s)."))
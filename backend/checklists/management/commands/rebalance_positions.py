@@ -0,0 +1,63 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Length
+
+from checklists.models import Workspace, Item, Subitem, Change
+from checklists.ordering import MAX_KEY_LENGTH, rebalance
+from checklists.tracking import touch_workspace
+
+class Command(BaseCommand):
+    """
+    Gives short keys to every list of items or subitems that has a key longer
+    than the threshold. Meant to be run periodically, e.g. from cron, so that
+    keys are rarely rebalanced while a user is waiting on a move.
+    """
+    help = "Rebalances the order keys of items and subitems that grew too long."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-length", type=int,
+                            default=MAX_KEY_LENGTH // 2,
+                            help="Rebalance lists with keys longer than this.")
+
+    def handle(self, *args, **options):
+        too_long = {"length__gt": options["max_length"]}
+
+        # Workspaces whose items need new keys
+        item_lists = set(Item.objects.annotate(length=Length("position"))
+                                     .filter(**too_long)
+                                     .values_list("workspace", flat=True))
+
+        # Items whose subitems need new keys, by workspace
+        subitem_lists = defaultdict(set)
+        for item_id, workspace_id in Subitem.objects \
+                .annotate(length=Length("position")).filter(**too_long) \
+                .values_list("item", "item__workspace"):
+            subitem_lists[workspace_id].add(item_id)
+
+        workspaces = Workspace.objects.filter(
+            id__in=item_lists | set(subitem_lists))
+        rebalanced = 0
+
+        for workspace in workspaces:
+            changes = []
+
+            with transaction.atomic():
+                if workspace.id in item_lists:
+                    changes += [(Change.ITEM, item_id, False) for item_id in
+                                rebalance(Item.objects.filter(
+                                    workspace=workspace))]
+                    rebalanced += 1
+
+                for item_id in subitem_lists[workspace.id]:
+                    changes += [(Change.SUBITEM, subitem_id, False)
+                                for subitem_id in rebalance(
+                                    Subitem.objects.filter(item=item_id))]
+                    rebalanced += 1
+
+                touch_workspace(workspace, changes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebalanced {rebalanced} list(s) in {len(workspaces)} "
+            "workspace(s)."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from checklists.models import Workspace
+from checklists.tracking import rebuild_progress
+
+class Command(BaseCommand):
+    """
+    Recomputes the progress counters on items and workspaces from the subitems.
+    Use it after importing data or if the counters are ever suspected to drift.
+    """
+    help = "Rebuilds the progress counters of items and workspaces."
+
+    def add_arguments(self, parser):
+        parser.add_argument("workspace_ids", nargs="*", type=int,
+                            help="Only rebuild these workspaces.")
+
+    def handle(self, *args, **options):
+        workspaces = Workspace.objects.all()
+
+        if options["workspace_ids"]:
+            workspaces = workspaces.filter(id__in=options["workspace_ids"])
+
+        with transaction.atomic():
+            rebuild_progress(workspaces)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt progress for {workspaces.count()} workspace(s)."))
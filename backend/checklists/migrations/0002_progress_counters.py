@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Workspace = apps.get_model('checklists', 'Workspace')
+    Item = apps.get_model('checklists', 'Item')
+    Subitem = apps.get_model('checklists', 'Subitem')
+
+    def total(queryset, expression):
+        return Coalesce(Subquery(queryset.annotate(value=expression).values('value')), Value(0))
+
+    subitems = Subitem.objects.filter(item=OuterRef('pk')).order_by().values('item')
+    Item.objects.update(
+        total_weight=total(subitems, Sum('weight')),
+        completed_weight=total(subitems, Sum('weight', filter=Q(completion_status=True))),
+        subitem_count=total(subitems, Count('id')),
+    )
+
+    items = Item.objects.filter(workspace=OuterRef('pk')).order_by().values('workspace')
+    Workspace.objects.update(**{
+        name: total(items, Sum(name))
+        for name in ('total_weight', 'completed_weight', 'subitem_count')
+    })
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='completed_weight',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='subitem_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='total_weight',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='completed_weight',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='subitem_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='total_weight',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
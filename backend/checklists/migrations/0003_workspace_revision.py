@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0002_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
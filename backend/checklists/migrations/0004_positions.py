@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:49
+
+from django.db import migrations, models
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def next_key(key):
+    # The order keys of checklists/ordering.py counting up from the first one,
+    # kept here so that this migration doesn't change along with that module.
+    # The first character of a key tells how many digits follow it.
+    if key is None:
+        return 'a0'
+
+    head, digits = key[0], list(key[1:])
+
+    for position in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[position]) + 1
+
+        if digit < len(DIGITS):
+            digits[position] = DIGITS[digit]
+            return head + ''.join(digits)
+
+        digits[position] = DIGITS[0]
+
+    # Carried out of the key, which gets one digit longer
+    return chr(ord(head) + 1) + ''.join(digits) + DIGITS[0]
+
+
+def number_rows(model, parent):
+    # Existing rows keep the order they were shown in, which was by ID
+    rows, last_parent, key = [], None, None
+
+    for row in model.objects.order_by(parent, 'id').only('id', parent).iterator():
+        if getattr(row, parent) != last_parent:
+            last_parent, key = getattr(row, parent), None
+
+        key = next_key(key)
+        row.position = key
+        rows.append(row)
+
+        if len(rows) >= 500:
+            model.objects.bulk_update(rows, ['position'])
+            rows = []
+
+    model.objects.bulk_update(rows, ['position'])
+
+
+def fill_positions(apps, schema_editor):
+    number_rows(apps.get_model('checklists', 'Item'), 'workspace_id')
+    number_rows(apps.get_model('checklists', 'Subitem'), 'item_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0003_workspace_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='position',
+            field=models.CharField(default='a0', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='subitem',
+            name='position',
+            field=models.CharField(default='a0', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['workspace', 'position'], name='Item_workspa_440a41_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subitem',
+            index=models.Index(fields=['item', 'position'], name='Subitem_item_id_5e516d_idx'),
+        ),
+        migrations.RunPython(fill_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_log(apps, schema_editor):
+    # Nothing before the current revision was logged
+    Workspace = apps.get_model('checklists', 'Workspace')
+    Workspace.objects.update(compacted_revision=F('revision'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0004_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='compacted_revision',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveBigIntegerField()),
+                ('kind', models.CharField(choices=[('item', 'Item'), ('subitem', 'Subitem')], max_length=8)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='checklists.workspace')),
+            ],
+            options={
+                'verbose_name': 'Change',
+                'verbose_name_plural': 'Changes',
+                'db_table': 'Change',
+                'indexes': [models.Index(fields=['workspace', 'sequence'], name='Change_workspa_71af59_idx')],
+            },
+        ),
+        migrations.RunPython(start_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,132 @@
+# Full-text index of workspaces, items and subitems (see checklists/search.py)
+
+from django.db import migrations
+
+# Rows are keyed by the ID of what they index times three plus the kind of it,
+# so that the triggers find them by rowid rather than scanning the table.
+CREATE = [
+    '''
+    CREATE VIRTUAL TABLE "SearchIndex" USING fts5(
+        workspace_id UNINDEXED, title, body,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_insert" AFTER INSERT ON "Workspace"
+    BEGIN
+        INSERT INTO "SearchIndex" (rowid, workspace_id, title, body)
+        VALUES (new.id * 3, new.id, new.name, coalesce(new.description, ''));
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_update"
+    AFTER UPDATE OF name, description ON "Workspace"
+    BEGIN
+        UPDATE "SearchIndex"
+        SET title = new.name, body = coalesce(new.description, '')
+        WHERE rowid = new.id * 3;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_delete" AFTER DELETE ON "Workspace"
+    BEGIN
+        DELETE FROM "SearchIndex" WHERE rowid = old.id * 3;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_insert" AFTER INSERT ON "Item"
+    BEGIN
+        INSERT INTO "SearchIndex" (rowid, workspace_id, title, body)
+        VALUES (new.id * 3 + 1, new.workspace_id, new.heading, '');
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_update"
+    AFTER UPDATE OF heading, workspace_id ON "Item"
+    BEGIN
+        UPDATE "SearchIndex"
+        SET title = new.heading, workspace_id = new.workspace_id
+        WHERE rowid = new.id * 3 + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_move" AFTER UPDATE OF workspace_id ON "Item"
+    WHEN old.workspace_id != new.workspace_id
+    BEGIN
+        UPDATE "SearchIndex" SET workspace_id = new.workspace_id
+        WHERE rowid IN (SELECT id * 3 + 2 FROM "Subitem"
+                        WHERE item_id = new.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_delete" AFTER DELETE ON "Item"
+    BEGIN
+        DELETE FROM "SearchIndex" WHERE rowid = old.id * 3 + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_subitem_insert" AFTER INSERT ON "Subitem"
+    BEGIN
+        INSERT INTO "SearchIndex" (rowid, workspace_id, title, body)
+        VALUES (new.id * 3 + 2,
+                (SELECT workspace_id FROM "Item" WHERE id = new.item_id),
+                '', new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_subitem_update"
+    AFTER UPDATE OF content, item_id ON "Subitem"
+    BEGIN
+        UPDATE "SearchIndex"
+        SET body = new.content,
+            workspace_id = (SELECT workspace_id FROM "Item"
+                            WHERE id = new.item_id)
+        WHERE rowid = new.id * 3 + 2;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_subitem_delete" AFTER DELETE ON "Subitem"
+    BEGIN
+        DELETE FROM "SearchIndex" WHERE rowid = old.id * 3 + 2;
+    END
+    ''',
+    # Index what is already there
+    '''
+    INSERT INTO "SearchIndex" (rowid, workspace_id, title, body)
+    SELECT id * 3, id, name, coalesce(description, '') FROM "Workspace"
+    UNION ALL
+    SELECT id * 3 + 1, workspace_id, heading, '' FROM "Item"
+    UNION ALL
+    SELECT "Subitem".id * 3 + 2, "Item".workspace_id, '', "Subitem".content
+    FROM "Subitem" JOIN "Item" ON "Item".id = "Subitem".item_id
+    ''',
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS "SearchIndex_{table}_{event}"'
+    for table, events in (('workspace', ('insert', 'update', 'delete')),
+                          ('item', ('insert', 'update', 'move', 'delete')),
+                          ('subitem', ('insert', 'update', 'delete')))
+    for event in events
+] + ['DROP TABLE IF EXISTS "SearchIndex"']
+
+
+def run(statements):
+    # FTS5 is SQLite only. Other databases go without the search index.
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0005_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,44 @@
+# Version columns for optimistic concurrency (see checklists/versioning.py)
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('checklists.migrations.0006_search_index')
+
+# SQLite rebuilds a table to add a column to it, which drops the triggers on it
+# and fails on the triggers of other tables that refer to it. They are dropped
+# first and made again once the columns are there.
+TRIGGERS = [statement for statement in search_index.CREATE
+            if 'CREATE TRIGGER' in statement]
+DROP_TRIGGERS = [statement for statement in search_index.DROP
+                 if 'DROP TRIGGER' in statement]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.run(DROP_TRIGGERS),
+                             search_index.run(TRIGGERS)),
+        migrations.AddField(
+            model_name='item',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='subitem',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(search_index.run(TRIGGERS),
+                             search_index.run(DROP_TRIGGERS)),
+    ]
@@ -0,0 +1,158 @@
+# Scopes the full-text index by group (see checklists/search.py)
+
+from importlib import import_module
+
+from django.db import migrations
+
+search_index = import_module('checklists.migrations.0006_search_index')
+
+# Each row also holds the token `g<group ID>` of the group it belongs to in the
+# indexed `scope` column, so that a search only looks at the groups of the user
+# in the index itself rather than checking the workspace of every hit.
+CREATE = [
+    '''
+    CREATE VIRTUAL TABLE "SearchIndex" USING fts5(
+        workspace_id UNINDEXED, scope, title, body,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_insert" AFTER INSERT ON "Workspace"
+    BEGIN
+        INSERT INTO "SearchIndex" (rowid, workspace_id, scope, title, body)
+        VALUES (new.id * 3, new.id, 'g' || new.group_id, new.name,
+                coalesce(new.description, ''));
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_update"
+    AFTER UPDATE OF name, description ON "Workspace"
+    BEGIN
+        UPDATE "SearchIndex"
+        SET title = new.name, body = coalesce(new.description, '')
+        WHERE rowid = new.id * 3;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_regroup"
+    AFTER UPDATE OF group_id ON "Workspace"
+    WHEN old.group_id != new.group_id
+    BEGIN
+        UPDATE "SearchIndex" SET scope = 'g' || new.group_id
+        WHERE workspace_id = new.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_workspace_delete" AFTER DELETE ON "Workspace"
+    BEGIN
+        DELETE FROM "SearchIndex" WHERE rowid = old.id * 3;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_insert" AFTER INSERT ON "Item"
+    BEGIN
+        INSERT INTO "SearchIndex" (rowid, workspace_id, scope, title, body)
+        VALUES (new.id * 3 + 1, new.workspace_id,
+                (SELECT 'g' || group_id FROM "Workspace"
+                 WHERE id = new.workspace_id),
+                new.heading, '');
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_update"
+    AFTER UPDATE OF heading, workspace_id ON "Item"
+    BEGIN
+        UPDATE "SearchIndex"
+        SET title = new.heading, workspace_id = new.workspace_id,
+            scope = (SELECT 'g' || group_id FROM "Workspace"
+                     WHERE id = new.workspace_id)
+        WHERE rowid = new.id * 3 + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_move" AFTER UPDATE OF workspace_id ON "Item"
+    WHEN old.workspace_id != new.workspace_id
+    BEGIN
+        UPDATE "SearchIndex"
+        SET workspace_id = new.workspace_id,
+            scope = (SELECT 'g' || group_id FROM "Workspace"
+                     WHERE id = new.workspace_id)
+        WHERE rowid IN (SELECT id * 3 + 2 FROM "Subitem"
+                        WHERE item_id = new.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_item_delete" AFTER DELETE ON "Item"
+    BEGIN
+        DELETE FROM "SearchIndex" WHERE rowid = old.id * 3 + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_subitem_insert" AFTER INSERT ON "Subitem"
+    BEGIN
+        INSERT INTO "SearchIndex" (rowid, workspace_id, scope, title, body)
+        SELECT new.id * 3 + 2, "Item".workspace_id,
+               'g' || "Workspace".group_id, '', new.content
+        FROM "Item" JOIN "Workspace" ON "Workspace".id = "Item".workspace_id
+        WHERE "Item".id = new.item_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_subitem_update"
+    AFTER UPDATE OF content, item_id ON "Subitem"
+    BEGIN
+        UPDATE "SearchIndex"
+        SET body = new.content,
+            workspace_id = (SELECT workspace_id FROM "Item"
+                            WHERE id = new.item_id),
+            scope = (SELECT 'g' || "Workspace".group_id FROM "Item"
+                     JOIN "Workspace" ON "Workspace".id = "Item".workspace_id
+                     WHERE "Item".id = new.item_id)
+        WHERE rowid = new.id * 3 + 2;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "SearchIndex_subitem_delete" AFTER DELETE ON "Subitem"
+    BEGIN
+        DELETE FROM "SearchIndex" WHERE rowid = old.id * 3 + 2;
+    END
+    ''',
+    # Index what is already there
+    '''
+    INSERT INTO "SearchIndex" (rowid, workspace_id, scope, title, body)
+    SELECT id * 3, id, 'g' || group_id, name, coalesce(description, '')
+    FROM "Workspace"
+    UNION ALL
+    SELECT "Item".id * 3 + 1, "Item".workspace_id,
+           'g' || "Workspace".group_id, "Item".heading, ''
+    FROM "Item" JOIN "Workspace" ON "Workspace".id = "Item".workspace_id
+    UNION ALL
+    SELECT "Subitem".id * 3 + 2, "Item".workspace_id,
+           'g' || "Workspace".group_id, '', "Subitem".content
+    FROM "Subitem" JOIN "Item" ON "Item".id = "Subitem".item_id
+    JOIN "Workspace" ON "Workspace".id = "Item".workspace_id
+    ''',
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS "SearchIndex_{table}_{event}"'
+    for table, events in (('workspace',
+                           ('insert', 'update', 'regroup', 'delete')),
+                          ('item', ('insert', 'update', 'move', 'delete')),
+                          ('subitem', ('insert', 'update', 'delete')))
+    for event in events
+] + ['DROP TABLE IF EXISTS "SearchIndex"']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checklists', '0007_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            search_index.run(search_index.DROP + CREATE),
+            search_index.run(DROP + search_index.CREATE),
+        ),
+    ]
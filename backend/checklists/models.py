@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from collaboration.models import *
 
@@ -17,6 +18,24 @@ class Workspace(models.Model):
     name = models.CharField(max_length=128, null=False)
     description = models.TextField(null=True)
 
+    # Progress of the subitems in the workspace. These are kept up to date by
+    # the views so that the subitems don't have to be loaded to show progress.
+    total_weight = models.IntegerField(default=0, null=False)
+    completed_weight = models.IntegerField(default=0, null=False)
+    subitem_count = models.IntegerField(default=0, null=False)
+
+    # Goes up by one whenever anything in the workspace changes. Clients can
+    # compare it to tell whether their copy of the workspace is still current.
+    revision = models.PositiveBigIntegerField(default=0, null=False)
+
+    # Changes up to this revision have been dropped from the change log, so a
+    # client that is further behind has to fetch the whole workspace again.
+    compacted_revision = models.PositiveBigIntegerField(default=0, null=False)
+
+    # Goes up by one with every edit of the row itself, which is only made if
+    # the row is still at the version it was based on (see versioning.py)
+    version = models.PositiveIntegerField(default=1, null=False)
+
 class Item(models.Model):
     """
     This is an item in the checklist. Synonymous to a header.
@@ -26,11 +45,23 @@ class Item(models.Model):
         db_table = "Item"
         verbose_name = "Item"
         verbose_name_plural = "Items"
+        indexes = [models.Index(fields=["workspace", "position"])]
     
     # Points to the checklist that contains this item.
     workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE)
     heading = models.TextField(null=False, blank=True)
 
+    # Order key of the item within the workspace (see ordering.py)
+    position = models.CharField(max_length=64, null=False, default="a0")
+
+    # Progress of the subitems under this item. Same as for the workspace.
+    total_weight = models.IntegerField(default=0, null=False)
+    completed_weight = models.IntegerField(default=0, null=False)
+    subitem_count = models.IntegerField(default=0, null=False)
+
+    # Same as for the workspace
+    version = models.PositiveIntegerField(default=1, null=False)
+
 class Subitem(models.Model):
     """
     This is a sub-item under the checklist item/heading. 
@@ -40,11 +71,47 @@ class Subitem(models.Model):
         db_table = "Subitem"
         verbose_name = "Subitem"
         verbose_name_plural = "Subitems"
+        indexes = [models.Index(fields=["item", "position"])]
     
     # Points to the item that points to it. 
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
     content = models.TextField(null=False, blank=True)
 
+    # Order key of the subitem within the item (see ordering.py)
+    position = models.CharField(max_length=64, null=False, default="a0")
+
     # Each subitem has a value of one unless specified otherwise. 
     weight = models.IntegerField(default=1, null=False)
-    completion_status = models.BooleanField(default=False, null=False)
\ No newline at end of file
+    completion_status = models.BooleanField(default=False, null=False)
+
+    # Same as for the workspace
+    version = models.PositiveIntegerField(default=1, null=False)
+
+class Change(models.Model):
+    """
+    An entry in the change log of a workspace. Every write to an item or a su-
+    bitem is logged under the revision the workspace was bumped to, so clients
+    can ask for what changed since the revision they have.
+    """
+
+    class Meta:
+        db_table = "Change"
+        verbose_name = "Change"
+        verbose_name_plural = "Changes"
+        indexes = [models.Index(fields=["workspace", "sequence"])]
+
+    ITEM = "item"
+    SUBITEM = "subitem"
+    KINDS = [(ITEM, "Item"), (SUBITEM, "Subitem")]
+
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE)
+
+    # The revision of the workspace that the change is part of
+    sequence = models.PositiveBigIntegerField(null=False)
+    kind = models.CharField(max_length=8, choices=KINDS, null=False)
+    object_id = models.BigIntegerField(null=False)
+
+    # Deleted objects are kept as tombstones. Deleting an item also deletes
+    # its subitems without logging them one by one.
+    deleted = models.BooleanField(default=False, null=False)
+    created_at = models.DateTimeField(default=timezone.now)
@@ -0,0 +1,254 @@
+"""
+Order keys for items and subitems. A key is a string and rows are shown in the
+order of their keys, so moving a row only means giving it a key that sorts be-
+tween its new neighbours. No other row has to be renumbered.
+
+A key has an integer part and an optional fractional part. The first character
+of the integer part tells how long it is, so appending to the end of a list
+increments the integer and keys only grow logarithmically. Inserting between
+two rows bisects the fractional part, which grows by about one character every
+five inserts into the same gap. `rebalance` rewrites the keys of a list when
+they get too long.
+
+Keys only use `0-9a-z` so that they sort the same under any database collation.
+This is adapted from David Greenspan's "Implementing Fractional Indexing".
+"""
+
+from django.db.models import F
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# Integer part heads. Lowercase letters start positive integers, which get one
+# digit longer per letter. Digits start negative ones, getting longer going
+# down so that they still sort below all positive integers.
+ZERO = "a0"
+SMALLEST_INTEGER = "0" + DIGITS[0] * 10
+
+# Keys longer than this are rebalanced
+MAX_KEY_LENGTH = 32
+
+class OrderKeyError(ValueError):
+    """
+    Raised when a key is malformed or there is no key between two keys.
+    """
+
+def _integer_length(head):
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "0" <= head <= "9":
+        return ord("9") - ord(head) + 2
+    raise OrderKeyError(f"Invalid order key head: {head!r}")
+
+def _integer_part(key):
+    length = _integer_length(key[0])
+
+    if length > len(key):
+        raise OrderKeyError(f"Invalid order key: {key!r}")
+
+    return key[:length]
+
+def _validate(key):
+    if key == SMALLEST_INTEGER:
+        raise OrderKeyError(f"Invalid order key: {key!r}")
+
+    fraction = key[len(_integer_part(key)):]
+
+    if fraction.endswith(DIGITS[0]):
+        raise OrderKeyError(f"Invalid order key: {key!r}")
+
+def _midpoint(a, b):
+    """
+    Gives a fraction between fractions `a` and `b`, where `a` may be empty and
+    `b` may be None for no upper bound. Neither may end in a zero.
+    """
+    if b is not None:
+        # Keep the common prefix and bisect what comes after it
+        length = 0
+        while (a[length] if length < len(a) else DIGITS[0]) == b[length]:
+            length += 1
+
+        if length > 0:
+            return b[:length] + _midpoint(a[length:], b[length:])
+
+    low = DIGITS.index(a[0]) if a else 0
+    high = DIGITS.index(b[0]) if b is not None else BASE
+
+    if high - low > 1:
+        return DIGITS[(low + high + 1) // 2]
+
+    # The first digits are consecutive
+    if b is not None and len(b) > 1:
+        return b[:1]
+
+    return DIGITS[low] + _midpoint(a[1:], None)
+
+def _increment(integer):
+    head, digits = integer[0], list(integer[1:])
+
+    for position in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[position]) + 1
+
+        if digit < BASE:
+            digits[position] = DIGITS[digit]
+            return head + "".join(digits)
+
+        digits[position] = DIGITS[0]
+
+    # Carried out of the integer so the next head is needed
+    if head == "9":
+        return "a" + DIGITS[0]
+    if head == "z":
+        return None
+    if head >= "a":
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+
+    return chr(ord(head) + 1) + "".join(digits)
+
+def _decrement(integer):
+    head, digits = integer[0], list(integer[1:])
+
+    for position in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[position]) - 1
+
+        if digit >= 0:
+            digits[position] = DIGITS[digit]
+            return head + "".join(digits)
+
+        digits[position] = DIGITS[-1]
+
+    # Borrowed out of the integer so the previous head is needed
+    if head == "a":
+        return "9" + DIGITS[-1]
+    if head == "0":
+        return None
+    if head <= "9":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+
+    return chr(ord(head) - 1) + "".join(digits)
+
+def key_between(a, b):
+    """
+    Returns a key that sorts strictly between `a` and `b`. Either may be None
+    to mean the start or the end of the list.
+    """
+    if a is not None:
+        _validate(a)
+    if b is not None:
+        _validate(b)
+    if a is not None and b is not None and a >= b:
+        raise OrderKeyError(f"{a!r} does not sort before {b!r}")
+
+    if a is None:
+        if b is None:
+            return ZERO
+
+        integer = _integer_part(b)
+        fraction = b[len(integer):]
+
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint("", fraction)
+        if integer < b:
+            return integer
+
+        key = _decrement(integer)
+        if key is None:
+            raise OrderKeyError("Cannot decrement any more")
+        return key
+
+    integer = _integer_part(a)
+    fraction = a[len(integer):]
+
+    if b is None:
+        key = _increment(integer)
+        return integer + _midpoint(fraction, None) if key is None else key
+
+    if integer == _integer_part(b):
+        return integer + _midpoint(fraction, b[len(integer):])
+
+    key = _increment(integer)
+    if key is None:
+        raise OrderKeyError("Cannot increment any more")
+
+    return key if key < b else integer + _midpoint(fraction, None)
+
+def keys_after(key, count):
+    """
+    Returns `count` increasing keys that all sort after `key`, which may be
+    None to start a new list.
+    """
+    keys = []
+
+    for _ in range(count):
+        key = key_between(key, None)
+        keys.append(key)
+
+    return keys
+
+def _neighbours(siblings, after, before):
+    if after is not None:
+        lower = siblings.filter(id=after).values_list("position", flat=True) \
+                        .first()
+        if lower is None:
+            return None
+
+        upper = siblings.filter(position__gt=lower).order_by("position") \
+                        .values_list("position", flat=True).first()
+        return lower, upper
+
+    if before is not None:
+        upper = siblings.filter(id=before).values_list("position", flat=True) \
+                        .first()
+        if upper is None:
+            return None
+
+        lower = siblings.filter(position__lt=upper).order_by("-position") \
+                        .values_list("position", flat=True).first()
+        return lower, upper
+
+    return siblings.order_by("-position").values_list("position", flat=True) \
+                   .first(), None
+
+def key_for(siblings, after=None, before=None):
+    """
+    Returns the key for a row placed among `siblings` right after the sibling
+    with ID `after` or right before the one with ID `before`, or at the end of
+    the list if neither is given. The siblings are rebalanced first if the key
+    would be too long.
+
+    Returns the key and the IDs of the siblings that were given new keys, or
+    (None, []) if the sibling to place the row next to is not there.
+    """
+    neighbours = _neighbours(siblings, after, before)
+
+    if neighbours is None:
+        return None, []
+
+    key = key_between(*neighbours)
+
+    if len(key) <= MAX_KEY_LENGTH:
+        return key, []
+
+    rebalanced = rebalance(siblings)
+    return key_between(*_neighbours(siblings, after, before)), rebalanced
+
+def rebalance(queryset):
+    """
+    Gives the rows of one list fresh, short keys in their current order and
+    returns their IDs. Only called when keys have grown too long since every
+    row is rewritten, which moves each one on to its next version.
+    """
+    rows = list(queryset.order_by("position", "id").only("id", "position"))
+
+    for row, key in zip(rows, keys_after(None, len(rows))):
+        row.position = key
+        row.version = F("version") + 1
+
+    queryset.model.objects.bulk_update(rows, ["position", "version"],
+                                       batch_size=500)
+
+    return [row.id for row in rows]
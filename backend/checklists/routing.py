@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .consumers import WorkspaceConsumer
+
+websocket_urlpatterns = [
+    path("ws/checklists/workspace/<int:workspace_id>/",
+         WorkspaceConsumer.as_asgi()),
+]
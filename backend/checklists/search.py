@@ -0,0 +1,203 @@
+"""
+Full-text search over the workspaces, items and subitems a user contributes
+to. Everything is indexed in the `SearchIndex` FTS5 table, which triggers keep
+in step with the checklist tables (see migrations 0006 and 0008) so that no
+write path can forget to update it. Hits are ranked by BM25 with titles, i.e.
+workspace names and item headings, weighing more than the rest.
+
+Every row is tagged with the token `g<group ID>` in its `scope` column, so the
+groups of the user are matched in the index along with the query. Pages are
+keyset paginated on the rank and the rowid of the last hit, so a page deep in
+the results costs as much as the first one.
+"""
+
+import base64
+import html
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+from collaboration.models import Contributor
+
+KINDS = ("workspace", "item", "subitem")
+
+# BM25 weights of the workspace_id, scope, title and body columns
+WEIGHTS = (0.0, 0.0, 2.0, 1.0)
+
+# Highlighted terms are marked with these and then turned into <mark> tags once
+# the snippet has been escaped
+_OPEN, _CLOSE = "\x02", "\x03"
+
+SNIPPET_TOKENS = 16
+
+# Arguments of snippet() after the column
+SNIPPET = (_OPEN, _CLOSE, SNIPPET_TOKENS)
+
+# Hits per page of the search endpoint
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+class SearchUnavailable(Exception):
+    """
+    Raised when the database has no search index, i.e. it isn't SQLite.
+    """
+
+def match_expression(query, group_ids):
+    """
+    Turns what the user typed into an FTS5 query that finds rows of the groups
+    containing every word, the last one as a prefix since it may not be typed
+    out yet. Returns None if there is nothing to search for.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+
+    if not terms or not group_ids:
+        return None
+
+    scope = " OR ".join(f"g{group_id}" for group_id in group_ids)
+
+    return f"scope : ({scope}) AND {{title body}} : ({' '.join(terms)}*)"
+
+def encode_cursor(key, backwards=False):
+    """
+    Turns the key of a hit into the cursor of the page after it, or before it
+    if `backwards`.
+    """
+    rank, rowid = key
+    value = f"{'b' if backwards else 'a'}:{rank!r}:{rowid}"
+
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Gives the key and the direction in a cursor of `encode_cursor`. Raises
+    ValueError if it is not one.
+    """
+    # Bad base64 and UTF-8 raise ValueErrors too
+    direction, rank, rowid = base64.urlsafe_b64decode(cursor.encode()) \
+        .decode().split(":")
+
+    if direction not in ("a", "b"):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+    return (float(rank), int(rowid)), direction == "b"
+
+def _snippet(text):
+    return html.escape(text).replace(_OPEN, "<mark>") \
+                            .replace(_CLOSE, "</mark>")
+
+def search(user, query, limit, key=None, backwards=False):
+    """
+    Returns up to `limit` hits for the query, best first, as pairs of the key
+    of the hit and the hit. Only hits after the one with the given key are
+    returned, or the ones right before it if `backwards`. Each hit has the type
+    and ID of what was found, its workspace and a snippet with the matching
+    terms in <mark> tags.
+    """
+    if connection.vendor != "sqlite":
+        raise SearchUnavailable()
+
+    expression = match_expression(query, list(
+        Contributor.objects.filter(user=user)
+                           .values_list("group_id", flat=True)))
+
+    if expression is None:
+        return []
+
+    rank = f'bm25("SearchIndex", {", ".join(map(str, WEIGHTS))})'
+    after = "" if key is None else \
+        f"AND ({rank}, rowid) {'<' if backwards else '>'} (%s, %s)"
+    order = "DESC" if backwards else "ASC"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            SELECT rowid, workspace_id,
+                   snippet("SearchIndex", 2, %s, %s, '…', %s),
+                   snippet("SearchIndex", 3, %s, %s, '…', %s), {rank}
+            FROM "SearchIndex"
+            WHERE "SearchIndex" MATCH %s {after}
+            ORDER BY {rank} {order}, rowid {order}
+            LIMIT %s
+            ''',
+            [*SNIPPET, *SNIPPET, expression, *(key or ()), limit],
+        )
+        rows = cursor.fetchall()
+
+    if backwards:
+        rows.reverse()
+
+    return [((rank, rowid), {
+        "type": KINDS[rowid % 3],
+        "id": rowid // 3,
+        "workspace": workspace_id,
+        # From the title unless the terms are only in the body
+        "snippet": _snippet(title if _OPEN in title else body),
+    }) for rowid, workspace_id, title, body, rank in rows]
+
+# Triggers indexing new rows, by the table they are on
+_INSERT_TRIGGERS = {
+    "Workspace": "SearchIndex_workspace_insert",
+    "Item": "SearchIndex_item_insert",
+    "Subitem": "SearchIndex_subitem_insert",
+}
+
+@contextmanager
+def suspended_index():
+    """
+    Stops indexing rows as they are inserted and indexes all of them at once
+    at the end instead, which is several times faster for bulk loads. Every-
+    thing runs in one transaction so that the triggers are back in place even
+    if the block fails. Does nothing but the transaction on other databases.
+    """
+    with transaction.atomic():
+        if connection.vendor != "sqlite":
+            yield
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                SELECT name, sql FROM sqlite_master
+                WHERE type = 'trigger'
+                  AND name IN ({", ".join(["%s"] * len(_INSERT_TRIGGERS))})
+                ''',
+                list(_INSERT_TRIGGERS.values()),
+            )
+            triggers = cursor.fetchall()
+            last = {}
+
+            for table in _INSERT_TRIGGERS:
+                cursor.execute(f'SELECT coalesce(max(id), 0) FROM "{table}"')
+                last[table] = cursor.fetchone()[0]
+
+            for name, _ in triggers:
+                cursor.execute(f'DROP TRIGGER "{name}"')
+
+        yield
+
+        with connection.cursor() as cursor:
+            for _, sql in triggers:
+                cursor.execute(sql)
+
+            cursor.execute(
+                '''
+                INSERT INTO "SearchIndex" (rowid, workspace_id, scope, title,
+                                           body)
+                SELECT id * 3, id, 'g' || group_id, name,
+                       coalesce(description, '')
+                FROM "Workspace" WHERE id > %s
+                UNION ALL
+                SELECT "Item".id * 3 + 1, "Item".workspace_id,
+                       'g' || "Workspace".group_id, "Item".heading, ''
+                FROM "Item"
+                JOIN "Workspace" ON "Workspace".id = "Item".workspace_id
+                WHERE "Item".id > %s
+                UNION ALL
+                SELECT "Subitem".id * 3 + 2, "Item".workspace_id,
+                       'g' || "Workspace".group_id, '', "Subitem".content
+                FROM "Subitem" JOIN "Item" ON "Item".id = "Subitem".item_id
+                JOIN "Workspace" ON "Workspace".id = "Item".workspace_id
+                WHERE "Subitem".id > %s
+                ''',
+                [last["Workspace"], last["Item"], last["Subitem"]],
+            )
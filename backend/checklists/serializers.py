@@ -1,6 +1,30 @@
+from django.db.models import F
 from rest_framework import serializers
 
 from .models import Workspace, Item, Subitem
+from .versioning import VersionConflict
+
+class PartialUpdateMixin:
+    """
+    Saves only the columns that were sent when updating. Workspaces and items
+    carry counters that are updated elsewhere and a full save would overwrite
+    them with whatever was loaded before. The row is only updated if it is
+    still at the version that was loaded, which the views read again when the
+    edit begins, otherwise `VersionConflict` is raised (see versioning.py).
+    """
+    def update(self, instance, validated_data):
+        updated = type(instance).objects \
+            .filter(pk=instance.pk, version=instance.version) \
+            .update(version=F("version") + 1, **validated_data)
+
+        if not updated:
+            raise VersionConflict()
+
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+
+        instance.version += 1
+        return instance
 
 class CreateWorkspaceSerializer(serializers.ModelSerializer):
     """
@@ -8,10 +32,10 @@ class CreateWorkspaceSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Workspace
-        fields = ["id", "group", "name", "description"]
-        read_only_fields = ["id"]
+        fields = ["id", "group", "name", "description", "version"]
+        read_only_fields = ["id", "version"]
 
-class WorkspaceSerializer(serializers.ModelSerializer):
+class WorkspaceSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     """
     Serializer for workspace. It serializes and gives freedom to the modification
     methods. However, it doesn't allow the modification of group because once the
@@ -19,8 +43,10 @@ class WorkspaceSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Workspace
-        fields = ["id", "group", "name", "description"]
-        read_only_fields = ["id", "group"]
+        fields = ["id", "group", "name", "description", "total_weight",
+                  "completed_weight", "subitem_count", "version"]
+        read_only_fields = ["id", "group", "total_weight", "completed_weight",
+                            "subitem_count", "version"]
 
 class CreateItemSerializer(serializers.ModelSerializer):
     """
@@ -29,18 +55,20 @@ class CreateItemSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Item
-        fields = ["id", "workspace", "heading"]
-        read_only_fields = ["id"]
+        fields = ["id", "workspace", "heading", "position", "version"]
+        read_only_fields = ["id", "position", "version"]
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     """
     Serializer for items. Only for modification of the content and not the work-
     space that it belongs to. 
     """
     class Meta:
         model = Item
-        fields = ["id", "workspace", "heading"]
-        read_only_fields = ["id", "workspace"]
+        fields = ["id", "workspace", "heading", "position", "total_weight",
+                  "completed_weight", "subitem_count", "version"]
+        read_only_fields = ["id", "workspace", "position", "total_weight",
+                            "completed_weight", "subitem_count", "version"]
 
 class CreateSubitemSerializer(serializers.ModelSerializer):
     """
@@ -48,18 +76,36 @@ class CreateSubitemSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Subitem
-        fields = ["id", "item", "content", "weight", "completion_status"]
-        read_only_fields = ["id"]
+        fields = ["id", "item", "content", "weight", "completion_status",
+                  "position", "version"]
+        read_only_fields = ["id", "position", "version"]
     
-class SubitemSerializer(serializers.ModelSerializer):
+class SubitemSerializer(PartialUpdateMixin, serializers.ModelSerializer):
     """
     A serializer for subitems and only modifiable for the creation of the conte-
     nt except ID and the ID of the item the subitem belongs to.
     """
     class Meta:
         model = Subitem
-        fields = ["id", "item", "content", "weight", "completion_status"]
-        read_only_fields = ["id", "item"]
+        fields = ["id", "item", "content", "weight", "completion_status",
+                  "position", "version"]
+        read_only_fields = ["id", "item", "position", "version"]
+
+class MoveItemSerializer(serializers.Serializer):
+    """
+    Where to move an item to within its workspace. It goes right after the i-
+    tem `after` or right before the item `before`, or to the end if neither is
+    given.
+    """
+    after = serializers.IntegerField(required=False, allow_null=True)
+    before = serializers.IntegerField(required=False, allow_null=True)
+
+class MoveSubitemSerializer(MoveItemSerializer):
+    """
+    Where to move a subitem to. Same as for items but the subitem can also be
+    moved under another item.
+    """
+    item = serializers.IntegerField(required=False)
 
 class AggregatedItemSerializer(serializers.ModelSerializer):
     """
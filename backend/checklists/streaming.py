@@ -0,0 +1,220 @@
+"""
+Streams the aggregate of a workspace as JSON while it is read from the data-
+base, for workspaces too large to build up in memory. The items and subitems
+come from one ordered join that is read `CHUNK_SIZE` rows at a time, and the
+JSON is written in blocks of about `BUFFER_SIZE` bytes, so the memory used
+stays the same no matter how large the workspace is.
+
+Each chunk is a query of its own that starts after the last row of the one
+before, rather than a cursor that is kept open. A client can take as long as
+it likes to read the stream without holding a read transaction on SQLite all
+the while, which would keep writers from checkpointing the WAL.
+
+The output is byte for byte what `AggregatedWorkspaceSerializer` gives when
+rendered by DRF's JSON renderer. The fields are represented by that serializer
+and its nested ones, and the JSON is only spliced together around the nested
+lists.
+
+With a sparse fieldset (see kronathens/fieldsets.py) only the columns of the
+fields kept are read. Streaming is for the nested lists, so it needs them kept.
+
+Under ASGI, Django reads a synchronous stream whole before sending it, so the
+memory is only bounded there with `ASYNC_VIEWS`, which streams asynchronously.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from rest_framework.renderers import JSONRenderer
+
+from kronathens.fieldsets import Fieldset, columns, prune
+
+from .models import Item, Subitem
+from .serializers import AggregatedWorkspaceSerializer
+
+# Rows read from the database by each query
+CHUNK_SIZE = 2000
+# Bytes of JSON collected before they are sent on
+BUFFER_SIZE = 64 * 1024
+
+# What the rows are ordered by, which comes first in each of them
+_ORDER = ("position", "id", "subitem__position", "subitem__id")
+
+def _fields(model, names):
+    # The IDs tell where an item starts and whether it has any subitems
+    return [field for field in model._meta.concrete_fields
+            if field.name == "id" or field.name in names]
+
+class _Level:
+    """
+    A serializer with a nested list, e.g. a workspace and its `item_set`. Ren-
+    ders an object as the JSON before and after the contents of its list.
+    """
+    def __init__(self, serializer, nested):
+        names = list(serializer.fields)
+        self.before = names[:names.index(nested)]
+        self.opening = f'"{nested}":['.encode()
+        self.child = serializer.fields[nested].child
+
+        # Leaves the nested list out of the representation
+        del serializer.fields[nested]
+        self.serializer = serializer
+
+    def split(self, renderer, instance):
+        data = self.serializer.to_representation(instance)
+        before = {name: data[name] for name in self.before}
+        after = {name: value for name, value in data.items()
+                 if name not in before}
+
+        start = renderer.render(before)[:-1] + b"," if before else b"{"
+        end = b"]," + renderer.render(after)[1:] if after else b"]}"
+
+        return start + self.opening, end
+
+class AggregateEncoder:
+    """
+    Encodes the aggregate of a workspace from its `rows`. `feed` and `close`
+    give back the JSON written so far once there is enough of it, otherwise
+    None.
+    """
+    def __init__(self, workspace, fieldset=None):
+        self.workspace = workspace
+        self.renderer = JSONRenderer()
+        workspaces = _Level(prune(AggregatedWorkspaceSerializer(), fieldset),
+                            "item_set")
+        self.items = _Level(workspaces.child, "subitem_set")
+        self.subitems = self.items.child
+        self.item_fields = _fields(Item, columns(self.items.serializer))
+        self.subitem_fields = _fields(Subitem, columns(self.subitems))
+
+        start, self.end = workspaces.split(self.renderer, workspace)
+        self.buffer = [start]
+        self.size = len(start)
+
+        # The item being written and the JSON that closes it
+        self.item = None
+        self.item_end = None
+        self.first_subitem = True
+
+    def _write(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+
+    def _flush(self, force=False):
+        if self.size < BUFFER_SIZE and not force:
+            return None
+
+        data = b"".join(self.buffer)
+        self.buffer = []
+        self.size = 0
+
+        return data
+
+    def chunks(self):
+        """
+        The items of the workspace, each joined with its subitems in order or
+        with NULLs if it has none, in lists of up to `CHUNK_SIZE` rows. Each
+        row starts with its place in the order.
+        """
+        columns = [*_ORDER, *[field.name for field in self.item_fields],
+                   *[f"subitem__{field.name}" for field in self.subitem_fields]]
+        after = Q()
+
+        while True:
+            # Filtered first, as a later filter() would join the subitems again
+            chunk = list(Item.objects.filter(after, workspace=self.workspace.id)
+                                     .order_by(*_ORDER)
+                                     .values_list(*columns)[:CHUNK_SIZE])
+
+            if chunk:
+                yield chunk
+
+            if len(chunk) < CHUNK_SIZE:
+                return
+
+            position, item_id, subitem_position, subitem_id = chunk[-1][:4]
+            after = Q(position__gt=position) | \
+                Q(position=position, id__gt=item_id)
+
+            # Further subitems of the same item, unless it has none
+            if subitem_id is not None:
+                after |= Q(id=item_id, subitem__position__gt=subitem_position) \
+                    | Q(id=item_id, subitem__position=subitem_position,
+                        subitem__id__gt=subitem_id)
+
+    def feed(self, row):
+        start = len(_ORDER)
+        item_values = row[start:start + len(self.item_fields)]
+        subitem_values = row[start + len(self.item_fields):]
+
+        if item_values[0] != self.item:
+            if self.item is not None:
+                self._write(self.item_end + b",")
+
+            item = Item(**{field.attname: value for field, value
+                           in zip(self.item_fields, item_values)})
+            start, self.item_end = self.items.split(self.renderer, item)
+            self._write(start)
+            self.item = item.id
+            self.first_subitem = True
+
+        # The item has no subitems if the left join found none
+        if subitem_values[0] is not None:
+            subitem = Subitem(**{field.attname: value for field, value
+                                 in zip(self.subitem_fields, subitem_values)})
+
+            if not self.first_subitem:
+                self._write(b",")
+
+            self._write(self.renderer.render(
+                self.subitems.to_representation(subitem)))
+            self.first_subitem = False
+
+        return self._flush()
+
+    def close(self):
+        if self.item is not None:
+            self._write(self.item_end)
+
+        self._write(self.end)
+
+        return self._flush(force=True)
+
+def streamable(fieldset):
+    """
+    Whether the fieldset keeps the items and their subitems.
+    """
+    return fieldset is None or fieldset.keeps("item_set") and \
+        fieldset.nested.get("item_set", Fieldset()).keeps("subitem_set")
+
+def stream_aggregate(workspace, fieldset=None):
+    """
+    Gives the JSON of the workspace's aggregate in blocks. The fieldset is
+    checked right away, before anything is sent.
+    """
+    encoder = AggregateEncoder(workspace, fieldset)
+
+    def blocks():
+        for chunk in encoder.chunks():
+            for row in chunk:
+                data = encoder.feed(row)
+
+                if data is not None:
+                    yield data
+
+        yield encoder.close()
+
+    return blocks()
+
+def astream_aggregate(workspace, fieldset=None):
+    """
+    Same as `stream_aggregate` for async views. The rows are read and encoded
+    in a thread, as the database can only be used synchronously.
+    """
+    blocks = stream_aggregate(workspace, fieldset)
+    next_block = sync_to_async(next)
+
+    async def ablocks():
+        while (data := await next_block(blocks, None)) is not None:
+            yield data
+
+    return ablocks()
@@ -1,3 +1,1971 @@
-from django.test import TestCase
+import gzip
+import json
+import re
+from functools import partial
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import cbor2
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.middleware import JWTAuthMiddleware
+from accounts.models import User
+from accounts.tokens import access_token_for
+from collaboration.models import Contributor, Group
+from kronathens.compiled import CompiledSerializer
+from kronathens.compression import choose_encoding
+from kronathens.fieldsets import Fieldset
+from kronathens.instrumentation import query_shape, timed
+from kronathens.pagination import KeysetPagination
+
+from kronathens.testing import (QUERY_BUDGETS, AsyncViewParityTestCase,
+                                ConcurrencyTestCase, QueryBudgetTestCase,
+                                build_fixture)
+
+from . import async_views, caching, consumers, routing, streaming, urls, views
+from .models import Change, Item, Subitem, Workspace
+from .tracking import COUNTERS, contribution
+from .serializers import (AggregatedWorkspaceSerializer, ItemSerializer,
+                          SubitemSerializer, WorkspaceSerializer)
+
+class QueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every checklists route runs a fixed number of queries, no matter how many
+    workspaces, items and subitems there are.
+    """
+    def test_every_route_has_a_budget(self):
+        self.assertBudgetsCover(urls.urlpatterns, urls.app_name)
+
+    def test_get_all_workspaces(self):
+        self.assertQueryBudget("checklists:workspace-all", lambda client, f:
+            client.get(reverse("checklists:workspace-all", args=[f.group])))
+
+    def test_create_workspace(self):
+        self.assertQueryBudget("checklists:workspace-create", lambda client, f:
+            client.post(reverse("checklists:workspace-create", args=[f.group]),
+                        {"name": "New"}, format="json"))
+
+    def test_modify_workspace_details(self):
+        self.assertQueryBudget("checklists:workspace-update", lambda client, f:
+            client.patch(reverse("checklists:workspace-update",
+                                 args=[f.workspace]),
+                         {"name": "Renamed"}, format="json"))
+
+    def test_delete_workspace(self):
+        self.assertQueryBudget("checklists:workspace-delete", lambda client, f:
+            client.delete(reverse("checklists:workspace-delete",
+                                  args=[f.workspace])))
+
+    def test_get_all_items(self):
+        self.assertQueryBudget("checklists:item-all", lambda client, f:
+            client.get(reverse("checklists:item-all", args=[f.workspace])))
+
+    def test_create_item(self):
+        self.assertQueryBudget("checklists:item-create", lambda client, f:
+            client.post(reverse("checklists:item-create", args=[f.workspace]),
+                        {"heading": "New"}, format="json"))
+
+    def test_modify_item(self):
+        self.assertQueryBudget("checklists:item-update", lambda client, f:
+            client.patch(reverse("checklists:item-update", args=[f.item]),
+                         {"heading": "Renamed"}, format="json"))
+
+    def test_delete_item(self):
+        self.assertQueryBudget("checklists:item-delete", lambda client, f:
+            client.delete(reverse("checklists:item-delete", args=[f.item])))
+
+    def test_move_item(self):
+        self.assertQueryBudget("checklists:item-move", lambda client, f:
+            client.post(reverse("checklists:item-move", args=[f.item]),
+                        {"after": None}, format="json"))
+
+    def test_get_all_subitems(self):
+        self.assertQueryBudget("checklists:subitem-all", lambda client, f:
+            client.get(reverse("checklists:subitem-all", args=[f.item])))
+
+    def test_create_subitem(self):
+        self.assertQueryBudget("checklists:subitem-create", lambda client, f:
+            client.post(reverse("checklists:subitem-create", args=[f.item]),
+                        {"content": "New", "weight": 2}, format="json"))
+
+    def test_modify_subitem(self):
+        self.assertQueryBudget("checklists:subitem-update", lambda client, f:
+            client.patch(reverse("checklists:subitem-update",
+                                 args=[f.subitems[0]]),
+                         {"completion_status": False, "weight": 5},
+                         format="json"))
+
+    def test_delete_subitem(self):
+        self.assertQueryBudget("checklists:subitem-delete", lambda client, f:
+            client.delete(reverse("checklists:subitem-delete",
+                                  args=[f.subitems[0]])))
+
+    def test_batch_subitems(self):
+        self.assertQueryBudget("checklists:subitem-batch", lambda client, f:
+            client.post(reverse("checklists:subitem-batch",
+                                args=[f.workspace]),
+                        {"create": [{"item": f.item, "content": "New"}],
+                         "update": [{"id": f.subitems[0],
+                                     "completion_status": False}],
+                         "delete": [f.subitems[1]]}, format="json"))
+
+    def test_move_subitem(self):
+        self.assertQueryBudget("checklists:subitem-move", lambda client, f:
+            client.post(reverse("checklists:subitem-move",
+                                args=[f.subitems[0]]),
+                        {"after": f.subitems[-1]}, format="json"))
+
+    def test_get_workspace_aggr_content(self):
+        self.assertQueryBudget("checklists:aggregate", lambda client, f:
+            client.get(reverse("checklists:aggregate", args=[f.workspace])))
+
+    def test_stream_workspace_aggr_content(self):
+        # One query per CHUNK_SIZE rows by design, so both datasets are read
+        # in one here
+        with mock.patch.object(streaming, "CHUNK_SIZE", 10 ** 6):
+            self.assertQueryBudget("checklists:aggregate?stream=1",
+                lambda client, f: client.get(
+                    reverse("checklists:aggregate", args=[f.workspace]),
+                    {"stream": 1}))
+
+    def test_stream_reads_in_chunks(self):
+        client = self.client_for(self.large)
+        rows = Subitem.objects.filter(item__workspace=self.large.workspace) \
+                              .count()
+
+        with mock.patch.object(streaming, "CHUNK_SIZE", 1000), \
+                CaptureQueriesContext(connection) as context:
+            response = client.get(reverse("checklists:aggregate",
+                                          args=[self.large.workspace]),
+                                  {"stream": 1})
+            b"".join(response.streaming_content)
+
+        reads = [query for query in context.captured_queries
+                 if 'FROM "Item" LEFT OUTER JOIN' in query["sql"]]
+        self.assertEqual(len(reads), rows // 1000 + 1)
+
+    def test_get_workspace_changes(self):
+        def prepare(client, fixture):
+            # A few changes to catch up on
+            for subitem in fixture.subitems[:3]:
+                client.patch(reverse("checklists:subitem-update",
+                                     args=[subitem]),
+                             {"weight": 4}, format="json")
+
+        self.assertQueryBudget("checklists:changes", lambda client, f:
+            client.get(reverse("checklists:changes", args=[f.workspace]),
+                       {"since": 1}), prepare)
+
+    def test_get_aggregate_cache_stats(self):
+        self.assertQueryBudget("checklists:aggregate-cache-stats",
+            lambda client, f: client.get(
+                reverse("checklists:aggregate-cache-stats")))
+
+    def test_search_checklists(self):
+        self.assertQueryBudget("checklists:search", lambda client, f:
+            client.get(reverse("checklists:search"), {"q": "subitem"}))
+
+class AccessTests(APITestCase):
+    """
+    Users who don't contribute to the group of a workspace are told it's not
+    theirs with 403, with or without the groups claimed in their token.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("access", 2)
+        cls.outsider = User.objects.create_user("outsider",
+                                                "outsider@example.com")
+        group = Group.objects.create(creator=cls.outsider, name="Elsewhere")
+        Contributor.objects.create(group=group, user=cls.outsider)
+
+    def calls(self):
+        f = self.fixture
+        subitem = f.subitems[0]
+
+        return [
+            ("get", "checklists:workspace-all", f.group, None),
+            ("post", "checklists:workspace-create", f.group, {"name": "New"}),
+            ("patch", "checklists:workspace-update", f.workspace,
+             {"name": "Renamed"}),
+            ("delete", "checklists:workspace-delete", f.workspace, None),
+            ("get", "checklists:item-all", f.workspace, None),
+            ("post", "checklists:item-create", f.workspace,
+             {"heading": "New"}),
+            ("patch", "checklists:item-update", f.item, {"heading": "New"}),
+            ("delete", "checklists:item-delete", f.item, None),
+            ("post", "checklists:item-move", f.item, {"after": None}),
+            ("get", "checklists:subitem-all", f.item, None),
+            ("post", "checklists:subitem-create", f.item, {"content": "New"}),
+            ("patch", "checklists:subitem-update", subitem,
+             {"content": "New"}),
+            ("delete", "checklists:subitem-delete", subitem, None),
+            ("post", "checklists:subitem-batch", f.workspace,
+             {"delete": [subitem]}),
+            ("post", "checklists:subitem-move", subitem, {"after": None}),
+            ("get", "checklists:aggregate", f.workspace, None),
+            ("get", "checklists:changes", f.workspace, {"since": 1}),
+        ]
+
+    def assertForbidden(self):
+        for method, name, argument, data in self.calls():
+            with self.subTest(name):
+                response = getattr(self.client, method)(
+                    reverse(name, args=[argument]), data,
+                    format=None if method == "get" else "json")
+
+                self.assertEqual(response.status_code, 403)
+
+        # Nothing was written either
+        self.assertEqual(Workspace.objects.get(id=self.fixture.workspace).name,
+                         "Workspace 0")
+        self.assertTrue(Subitem.objects.filter(id=self.fixture.subitems[0])
+                        .exists())
+
+    def test_non_contributor(self):
+        self.client.force_authenticate(self.outsider)
+        self.assertForbidden()
+
+    @override_settings(MEMBERSHIP_CLAIMS=True)
+    def test_non_contributor_with_claims(self):
+        self.client.force_authenticate(self.outsider,
+                                       access_token_for(self.outsider))
+        self.assertForbidden()
+
+    def test_unauthenticated(self):
+        response = self.client.get(reverse("checklists:item-all",
+                                           args=[self.fixture.workspace]))
+
+        self.assertEqual(response.status_code, 401)
+
+class ProgressTests(APITestCase):
+    """
+    The counters of items and workspaces follow every write to their sub-
+    items, see tracking.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("progress", 2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+
+    def counters(self, model, object_id):
+        return model.objects.values_list(*COUNTERS).get(id=object_id)
+
+    def assertShifted(self, call, item, amounts, workspace_amounts=None):
+        # The workspace moves by as much as the item unless told otherwise
+        workspace = Item.objects.get(id=item).workspace_id
+        before = [self.counters(Item, item),
+                  self.counters(Workspace, workspace)]
+
+        response = call()
+
+        self.assertLess(response.status_code, 300, response.content)
+        self.assertEqual([self.counters(Item, item),
+                          self.counters(Workspace, workspace)],
+                         [tuple(map(sum, zip(counters, amounts)))
+                          for counters, amounts in zip(before, [
+                              amounts, workspace_amounts or amounts])])
+        self.assertCounted()
+
+    def assertCounted(self):
+        # What rebuilding them from the subitems would give
+        items = {}
+
+        for subitem in Subitem.objects.all():
+            amounts = contribution(subitem.weight, subitem.completion_status)
+            counted = items.get(subitem.item_id, (0, 0, 0))
+            items[subitem.item_id] = tuple(map(sum, zip(counted, amounts)))
+
+        workspaces = {}
+
+        for item in Item.objects.all():
+            counters = self.counters(Item, item.id)
+            self.assertEqual(counters, items.get(item.id, (0, 0, 0)))
+            counted = workspaces.get(item.workspace_id, (0, 0, 0))
+            workspaces[item.workspace_id] = tuple(map(sum, zip(counted,
+                                                              counters)))
+
+        for workspace in Workspace.objects.all():
+            self.assertEqual(self.counters(Workspace, workspace.id),
+                             workspaces.get(workspace.id, (0, 0, 0)))
+
+    def test_create(self):
+        item = self.fixture.item
+
+        self.assertShifted(lambda: self.client.post(
+            reverse("checklists:subitem-create", args=[item]),
+            {"content": "New", "weight": 3, "completion_status": True},
+            format="json"), item, (3, 3, 1))
+
+    def test_modify(self):
+        subitem = Subitem.objects.get(id=self.fixture.subitems[0])
+        weight = subitem.weight
+
+        # The first subitem of the fixture is completed
+        self.assertShifted(lambda: self.client.patch(
+            reverse("checklists:subitem-update", args=[subitem.id]),
+            {"weight": weight + 2, "completion_status": False},
+            format="json"), subitem.item_id, (2, -weight, 0))
+
+    def test_delete(self):
+        subitem = Subitem.objects.get(id=self.fixture.subitems[0])
+
+        self.assertShifted(lambda: self.client.delete(
+            reverse("checklists:subitem-delete", args=[subitem.id])),
+            subitem.item_id, (-subitem.weight, -subitem.weight, -1))
+
+    def test_delete_item(self):
+        item = self.fixture.items[-1]
+        counters = self.counters(Item, item)
+        before = self.counters(Workspace, self.fixture.workspace)
+
+        response = self.client.delete(reverse("checklists:item-delete",
+                                              args=[item]))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.counters(Workspace, self.fixture.workspace),
+                         tuple(a - b for a, b in zip(before, counters)))
+        self.assertCounted()
+
+    def test_move(self):
+        subitem = Subitem.objects.get(id=self.fixture.subitems[0])
+        amounts = contribution(subitem.weight, subitem.completion_status)
+        source, target = self.fixture.items
+        response = self.client.post(
+            reverse("checklists:item-create",
+                    args=[self.fixture.workspaces[1]]),
+            {"heading": "Elsewhere"}, format="json")
+        elsewhere = response.json()["id"]
+
+        def move(**data):
+            return lambda: self.client.post(
+                reverse("checklists:subitem-move", args=[subitem.id]),
+                {"after": None, **data}, format="json")
+
+        # Within its workspace only the items are counted anew
+        self.assertShifted(move(), source, (0, 0, 0))
+        self.assertShifted(move(item=target), target, amounts, (0, 0, 0))
+        self.assertShifted(move(item=elsewhere), elsewhere, amounts)
+        self.assertEqual(self.counters(Workspace, self.fixture.workspaces[1]),
+                         amounts)
+
+    def test_batch(self):
+        first, second, third = Subitem.objects.filter(
+            id__in=self.fixture.subitems[:3]).order_by("id")
+
+        # The first subitem of the fixture is completed and the second isn't
+        self.assertShifted(lambda: self.client.post(
+            reverse("checklists:subitem-batch",
+                    args=[self.fixture.workspace]),
+            {"create": [{"item": self.fixture.item, "content": "New",
+                         "weight": 2, "completion_status": True}],
+             "update": [{"id": first.id, "completion_status": False},
+                        {"id": second.id, "weight": second.weight + 1}],
+             "delete": [third.id]}, format="json"), self.fixture.item,
+            (2 + 1 - third.weight, 2 - first.weight
+             - (third.weight if third.completion_status else 0), 0))
+
+class AggregateETagTests(APITestCase):
+    """
+    The aggregate is tagged with the revision of its workspace, so clients that
+    have it already are answered with 304 until something in it is written to.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("etag", 2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+        self.url = reverse("checklists:aggregate",
+                           args=[self.fixture.workspace])
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        self.assertEqual(response.status_code, 200)
+
+        for header in [etag, f'"other", {etag}', "*"]:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+            self.assertEqual(response.content, b"")
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+                         .status_code, 200)
+
+        # Writes to other workspaces don't count
+        self.client.post(reverse("checklists:item-create",
+                                 args=[self.fixture.workspaces[1]]),
+                         {"heading": "Elsewhere"}, format="json")
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+                         .status_code, 304)
+
+    def test_written(self):
+        f = self.fixture
+        subitem = f.subitems[0]
+        writes = [
+            ("patch", "checklists:workspace-update", f.workspace,
+             {"name": "Renamed"}),
+            ("post", "checklists:item-create", f.workspace, {"heading": "New"}),
+            ("patch", "checklists:item-update", f.item, {"heading": "New"}),
+            ("post", "checklists:item-move", f.item, {"after": None}),
+            ("post", "checklists:subitem-create", f.item, {"content": "New"}),
+            ("patch", "checklists:subitem-update", subitem,
+             {"content": "New"}),
+            ("post", "checklists:subitem-move", subitem,
+             {"item": f.items[1], "after": None}),
+            ("post", "checklists:subitem-batch", f.workspace,
+             {"delete": [subitem]}),
+            ("delete", "checklists:item-delete", f.items[1], None),
+        ]
+        etags = [self.client.get(self.url)["ETag"]]
+
+        for method, name, argument, data in writes:
+            with self.subTest(name):
+                response = getattr(self.client, method)(
+                    reverse(name, args=[argument]), data, format="json")
+                self.assertLess(response.status_code, 300, response.content)
+
+                response = self.client.get(self.url,
+                                           HTTP_IF_NONE_MATCH=etags[-1])
+
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn(response["ETag"], etags)
+                etags.append(response["ETag"])
+
+class AggregateCacheTests(APITestCase):
+    """
+    The cached aggregate of a workspace is dropped by every write to it, see
+    caching.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("cache", 2)
+
+    def setUp(self):
+        # The IDs and revisions are given out again by the next tests
+        caches["aggregates"].clear()
+        self.addCleanup(caches["aggregates"].clear)
+        self.client.force_authenticate(self.fixture.user)
+
+    def cached(self, workspace_id, revision):
+        return caches["aggregates"].get(caching._key(workspace_id),
+                                        version=revision)
+
+    def fetch(self, workspace_id):
+        """
+        Fetches the aggregate, which caches it, and gives its revision.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse("checklists:aggregate",
+                                               args=[workspace_id]))
+
+        revision = Workspace.objects.get(id=workspace_id).revision
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cached(workspace_id, revision), response.json())
+        return revision
+
+    def test_every_write(self):
+        f = self.fixture
+        subitem = f.subitems[0]
+        writes = [
+            ("patch", "checklists:workspace-update", f.workspace,
+             {"name": "Renamed"}),
+            ("post", "checklists:item-create", f.workspace, {"heading": "New"}),
+            ("patch", "checklists:item-update", f.item, {"heading": "New"}),
+            ("post", "checklists:item-move", f.item, {"after": None}),
+            ("post", "checklists:subitem-create", f.item, {"content": "New"}),
+            ("patch", "checklists:subitem-update", subitem,
+             {"content": "New"}),
+            ("post", "checklists:subitem-move", subitem,
+             {"item": f.items[1], "after": None}),
+            ("post", "checklists:subitem-batch", f.workspace,
+             {"delete": [subitem]}),
+            ("delete", "checklists:subitem-delete", f.subitems[1], None),
+            ("delete", "checklists:item-delete", f.items[1], None),
+            ("delete", "checklists:workspace-delete", f.workspace, None),
+        ]
+
+        for method, name, argument, data in writes:
+            with self.subTest(name):
+                revision = self.fetch(f.workspace)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = getattr(self.client, method)(
+                        reverse(name, args=[argument]), data, format="json")
+
+                self.assertLess(response.status_code, 300, response.content)
+                self.assertIsNone(self.cached(f.workspace, revision))
+
+    def test_rolled_back(self):
+        revision = self.fetch(self.fixture.workspace)
+
+        # Nothing was written so it's still current
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("checklists:subitem-update",
+                        args=[self.fixture.subitems[0]]),
+                {"weight": 4}, format="json", HTTP_IF_MATCH='"v0"')
+
+        self.assertEqual(response.status_code, 412)
+        self.assertIsNotNone(self.cached(self.fixture.workspace, revision))
+
+class PaginationTests(APITestCase):
+    """
+    The list endpoints are paged by a cursor on the ID, see kronathens/pagina-
+    tion.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("pages", 2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+        self.url = reverse("checklists:subitem-all", args=[self.fixture.item])
+
+    def walk(self, url, link="next"):
+        """
+        Follows the links from the page at the URL and gives the IDs of every
+        page in the order they were read.
+        """
+        pages = []
+
+        while url is not None:
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            pages.append([row["id"] for row in response.json()["results"]])
+            url = response.json()[link]
+
+        return pages
+
+    def test_walk(self):
+        pages = self.walk(f"{self.url}?page_size=3")
+        subitems = self.fixture.subitems
+
+        self.assertEqual(sum(pages, []), subitems)
+        self.assertEqual([len(page) for page in pages],
+                         [3] * 6 + [len(subitems) - 18])
+
+        # And back again from the last page
+        response = self.client.get(f"{self.url}?page_size=3")
+
+        while response.json()["next"] is not None:
+            last = response.json()["next"]
+            response = self.client.get(last)
+
+        back = self.walk(last, "previous")
+        self.assertEqual(sum(reversed(back), []), subitems)
+
+    def test_written_while_walking(self):
+        response = self.client.get(self.url, {"page_size": 5})
+        seen = [row["id"] for row in response.json()["results"]]
+
+        # Rows already read going away doesn't shift the pages after them
+        Subitem.objects.filter(id__in=seen[:3]).delete()
+        added = Subitem.objects.create(item_id=self.fixture.item,
+                                       content="New", position="zz")
+        rest = sum(self.walk(response.json()["next"]), [])
+
+        self.assertEqual(rest, self.fixture.subitems[5:] + [added.id])
+
+    def test_page_size(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(len(response.json()["results"]),
+                         min(len(self.fixture.subitems),
+                             KeysetPagination.page_size))
+        self.assertIsNone(response.json()["previous"])
+
+        response = self.client.get(self.url, {"page_size": 10 ** 6})
+        self.assertEqual(len(response.json()["results"]),
+                         len(self.fixture.subitems))
+
+    def test_not_paginated(self):
+        paged = sum(self.walk(f"{self.url}?page_size=7"), [])
+        response = self.client.get(self.url, {"paginate": "false"})
+
+        self.assertEqual([row["id"] for row in response.json()], paged)
+        self.assertEqual(response.json(), SubitemSerializer(
+            Subitem.objects.filter(item=self.fixture.item).order_by("id"),
+            many=True).data)
+
+class OrderingTests(APITestCase):
+    """
+    Moved items and subitems are shown where they were put, see ordering.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("ordering", 2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+
+    def aggregate(self):
+        response = self.client.get(reverse("checklists:aggregate",
+                                           args=[self.fixture.workspace]))
+
+        return {item["id"]: item for item in response.json()["item_set"]}
+
+    def order(self, item):
+        return [subitem["id"]
+                for subitem in self.aggregate()[item]["subitem_set"]]
+
+    def move(self, subitem, **data):
+        response = self.client.post(reverse("checklists:subitem-move",
+                                            args=[subitem]), data,
+                                    format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_move_subitem(self):
+        item, subitems = self.fixture.item, list(self.fixture.subitems)
+        first, second, last = subitems[0], subitems[1], subitems[-1]
+
+        self.assertEqual(self.order(item), subitems)
+
+        self.move(last, after=first)
+        subitems.remove(last)
+        subitems.insert(1, last)
+        self.assertEqual(self.order(item), subitems)
+
+        self.move(second, before=first)
+        subitems.remove(second)
+        subitems.insert(0, second)
+        self.assertEqual(self.order(item), subitems)
+
+        self.move(second)
+        subitems.remove(second)
+        subitems.append(second)
+        self.assertEqual(self.order(item), subitems)
+
+    def test_move_item(self):
+        items = list(self.fixture.items)
+
+        response = self.client.post(reverse("checklists:item-move",
+                                            args=[items[1]]),
+                                    {"before": items[0]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.aggregate()), items[::-1])
+
+    def test_move_to_another_item(self):
+        source, target = self.fixture.items
+        subitem = Subitem.objects.get(id=self.fixture.subitems[0])
+        amounts = contribution(subitem.weight, subitem.completion_status)
+        counters = {item: Item.objects.values_list(*COUNTERS).get(id=item)
+                    for item in (source, target)}
+        order = self.order(target)
+
+        self.move(subitem.id, item=target, after=order[0])
+
+        aggregate = self.aggregate()
+        self.assertEqual(self.order(target), [order[0], subitem.id, *order[1:]])
+        self.assertNotIn(subitem.id, self.order(source))
+
+        # What it counted for went with it
+        for item, sign in [(source, -1), (target, 1)]:
+            self.assertEqual(
+                tuple(aggregate[item][name] for name in COUNTERS),
+                tuple(before + sign * amount for before, amount in
+                      zip(counters[item], amounts)))
+
+    def test_rebalanced(self):
+        item, subitems = self.fixture.item, list(self.fixture.subitems)
+        first, second = subitems[:2]
+
+        # Moving into the same gap over and over makes the keys grow until
+        # the list is given new ones
+        with mock.patch("checklists.ordering.MAX_KEY_LENGTH", 4):
+            for subitem in subitems[-5:]:
+                self.move(subitem, after=first)
+                subitems.remove(subitem)
+                subitems.insert(1, subitem)
+
+        self.assertEqual(self.order(item), subitems)
+        self.assertLessEqual(max(len(key) for key in Subitem.objects.filter(
+            item=item).values_list("position", flat=True)), 4)
+
+    def test_lists(self):
+        items = list(self.fixture.items)
+        subitems = list(self.fixture.subitems)
+
+        self.client.post(reverse("checklists:item-move", args=[items[1]]),
+                         {"before": items[0]}, format="json")
+        self.move(subitems[-1], before=subitems[0])
+        self.move(subitems[1], after=subitems[5])
+
+        aggregate = self.aggregate()
+        lists = [(reverse("checklists:item-all",
+                          args=[self.fixture.workspace]), list(aggregate)),
+                 (reverse("checklists:subitem-all", args=[self.fixture.item]),
+                  self.order(self.fixture.item))]
+
+        # The lists the frontend renders agree with the aggregate, whole or a
+        # page at a time and whichever fields are asked for
+        for url, expected in lists:
+            response = self.client.get(url, {"paginate": "false"})
+            self.assertEqual([row["id"] for row in response.json()], expected)
+
+            ids, page = [], {"page_size": 3, "fields": "id"}
+
+            while url is not None:
+                response = self.client.get(url, page).json()
+                ids += [row["id"] for row in response["results"]]
+                url, page = response["next"], {}
+
+            self.assertEqual(ids, expected)
+
+    def test_unknown_neighbour(self):
+        other = Subitem.objects.filter(item=self.fixture.items[1]).first()
+
+        response = self.client.post(
+            reverse("checklists:subitem-move", args=[self.fixture.subitems[0]]),
+            {"after": other.id}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.order(self.fixture.item), self.fixture.subitems)
+
+class ChangeFeedTests(APITestCase):
+    """
+    Clients catch up on a workspace with what changed since the revision they
+    have, see `get_workspace_changes`.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("feed", 2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+
+    def revision(self):
+        return Workspace.objects.get(id=self.fixture.workspace).revision
+
+    def changes(self, since, workspace=None):
+        response = self.client.get(
+            reverse("checklists:changes",
+                    args=[workspace or self.fixture.workspace]),
+            {"since": since})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def write(self, method, name, argument, data=None):
+        response = getattr(self.client, method)(
+            reverse(name, args=[argument]), data, format="json")
+
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def test_contents(self):
+        since = self.revision()
+        subitem = self.fixture.subitems[0]
+
+        self.assertEqual(self.changes(since)["changes"], [])
+
+        self.write("patch", "checklists:subitem-update", subitem,
+                   {"content": "First"})
+        self.write("patch", "checklists:item-update", self.fixture.item,
+                   {"heading": "Renamed"})
+        self.write("patch", "checklists:subitem-update", subitem,
+                   {"content": "Second"})
+        created = self.write("post", "checklists:subitem-create",
+                             self.fixture.item, {"content": "New"}).json()
+
+        feed = self.changes(since)
+        changes = feed["changes"]
+
+        self.assertEqual(feed["revision"], self.revision())
+        self.assertEqual(feed["workspace"]["id"], self.fixture.workspace)
+        # Once each, as they are now and in the order they were last changed
+        self.assertCountEqual([(change["type"], change["id"], change["deleted"])
+                               for change in changes],
+                              [(Change.SUBITEM, subitem, False),
+                               (Change.SUBITEM, created["id"], False),
+                               (Change.ITEM, self.fixture.item, False)])
+        data = {(change["type"], change["id"]): change["data"]
+                for change in changes}
+        self.assertEqual(data[Change.SUBITEM, subitem], SubitemSerializer(
+            Subitem.objects.get(id=subitem)).data)
+        self.assertEqual(data[Change.SUBITEM, subitem]["content"], "Second")
+        self.assertEqual(data[Change.ITEM, self.fixture.item], ItemSerializer(
+            Item.objects.get(id=self.fixture.item)).data)
+        self.assertEqual([change["sequence"] for change in changes],
+                         sorted(change["sequence"] for change in changes))
+
+        # Nothing new since the latest
+        self.assertEqual(self.changes(feed["revision"])["changes"], [])
+
+    def test_tombstones(self):
+        since = self.revision()
+        deleted, moved = self.fixture.subitems[:2]
+        item = self.fixture.items[1]
+        elsewhere = self.write("post", "checklists:item-create",
+                               self.fixture.workspaces[1],
+                               {"heading": "Elsewhere"}).json()["id"]
+        since_elsewhere = Workspace.objects.get(
+            id=self.fixture.workspaces[1]).revision
+
+        self.write("patch", "checklists:subitem-update", deleted,
+                   {"content": "Changed"})
+        self.write("delete", "checklists:subitem-delete", deleted)
+        self.write("post", "checklists:subitem-move", moved,
+                   {"item": elsewhere})
+        self.write("delete", "checklists:item-delete", item)
+
+        tombstones = {(change["type"], change["id"]): change
+                      for change in self.changes(since)["changes"]}
+
+        for key in [(Change.SUBITEM, deleted), (Change.SUBITEM, moved),
+                    (Change.ITEM, item)]:
+            self.assertTrue(tombstones[key]["deleted"])
+            self.assertIsNone(tombstones[key]["data"])
+
+        # Where the subitem was moved to it's new
+        changes = self.changes(since_elsewhere,
+                               self.fixture.workspaces[1])["changes"]
+        self.assertIn((Change.SUBITEM, moved, False),
+                      [(change["type"], change["id"], change["deleted"])
+                       for change in changes])
+
+    def test_compacted(self):
+        since = self.revision()
+
+        for weight in range(1, 4):
+            self.write("patch", "checklists:subitem-update",
+                       self.fixture.subitems[0], {"weight": weight})
+
+        # Only logs the item, so it's the one change left below
+        self.write("patch", "checklists:item-update", self.fixture.item,
+                   {"heading": "Renamed"})
+        expected = self.changes(since)
+
+        # Superseded changes go without losing anything
+        call_command("compact_changes", stdout=StringIO())
+        self.assertEqual(self.changes(since), expected)
+
+        with override_settings(CHANGE_LOG_MAX_ENTRIES=1):
+            call_command("compact_changes", stdout=StringIO())
+
+        compacted = Workspace.objects.get(id=self.fixture.workspace) \
+                                     .compacted_revision
+        response = self.client.get(reverse("checklists:changes",
+                                           args=[self.fixture.workspace]),
+                                   {"since": since})
+
+        self.assertGreater(compacted, since)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()["revision"], self.revision())
+        self.assertEqual(self.changes(compacted)["changes"],
+                         [change for change in expected["changes"]
+                          if change["sequence"] > compacted])
+        self.assertEqual(len(self.changes(compacted)["changes"]), 1)
+
+class InstrumentationTests(APITestCase):
+    """
+    Sampled requests report where their time went and requests running the
+    same query over and over are warned about, see kronathens/instrumenta-
+    tion.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("timings", 2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+        self.url = reverse("checklists:aggregate",
+                           args=[self.fixture.workspace])
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries, \
+                self.assertLogs("kronathens.instrumentation", "DEBUG") as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(re.findall(r"(\w+);dur=[\d.]+",
+                                    response["Server-Timing"]),
+                         ["db", "auth", "serialize", "total"])
+        self.assertIn(f'desc="{len(queries)} queries"',
+                      response["Server-Timing"])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["view"], line["status"], line["queries"]),
+                         ("checklists:aggregate", 200, len(queries)))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_rendering_is_serialization(self):
+        for accept in ["application/json", "application/msgpack",
+                       "application/cbor"]:
+            with mock.patch("kronathens.renderers.timed",
+                            wraps=timed) as renderer_timed:
+                response = self.client.get(self.url, HTTP_ACCEPT=accept)
+
+            self.assertEqual(response["Content-Type"], accept)
+            renderer_timed.assert_called_once_with("serialize")
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        self.assertNotIn("Server-Timing", self.client.get(self.url))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_repeated_queries(self):
+        # The same lookup once per request of the batch
+        with self.assertLogs("kronathens.instrumentation", "WARNING") as logs:
+            self.client.post(reverse("batch"), {"requests": [
+                {"method": "GET", "path": reverse("checklists:item-all",
+                                                  args=[workspace])}
+                for workspace in self.fixture.workspaces
+            ] * 3}, format="json")
+
+        warnings = [json.loads(record.getMessage()) for record in logs.records]
+
+        self.assertTrue(warnings)
+        for warning in warnings:
+            self.assertEqual(warning["event"], "repeated_query")
+            self.assertEqual(warning["view"], "batch")
+            self.assertGreaterEqual(
+                warning["count"], settings.INSTRUMENTATION_REPEAT_THRESHOLD)
+
+        # Nothing to warn about in a request that reads each thing once
+        with self.assertNoLogs("kronathens.instrumentation", "WARNING"):
+            self.client.get(self.url)
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape("SELECT \"a\" FROM \"Item\" WHERE \"id\" = 12 AND "
+                        "\"heading\" = 'it''s' AND \"id\" IN (?, ?, ?)"),
+            "SELECT \"a\" FROM \"Item\" WHERE \"id\" = ? AND \"heading\" = ? "
+            "AND \"id\" IN (...)")
+
+class AggregateStreamTests(APITestCase):
+    """
+    The streamed aggregate is the same JSON as the one built in memory.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("stream", 4)
+        # An item without subitems and one with characters that get escaped
+        Item.objects.create(workspace_id=cls.fixture.workspace, position="a",
+                            heading='"Quoted" \\ \u2028 caf\u00e9')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+
+    def assertStreamsTheSame(self, workspace):
+        url = reverse("checklists:aggregate", args=[workspace])
+        expected = self.client.get(url)
+
+        self.assertEqual(expected.status_code, 200)
+
+        # The aggregate is cached by the first request. The rows are read in
+        # chunks that end in the middle of items and right after the item
+        # without subitems.
+        for chunk_size in [1, 7, streaming.CHUNK_SIZE]:
+            with mock.patch.object(streaming, "BUFFER_SIZE", 100), \
+                    mock.patch.object(streaming, "CHUNK_SIZE", chunk_size), \
+                    mock.patch("checklists.views.get_aggregate",
+                               return_value=None):
+                response = self.client.get(url, {"stream": 1})
+                chunks = list(response.streaming_content)
+
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertEqual(response["ETag"], expected["ETag"])
+            self.assertEqual(b"".join(chunks), expected.content)
+
+        return chunks
+
+    def test_workspace_with_items(self):
+        chunks = self.assertStreamsTheSame(self.fixture.workspace)
+
+        # Written out in blocks rather than all at once
+        self.assertGreater(len(chunks), 1)
+
+    def test_workspace_without_items(self):
+        self.assertStreamsTheSame(self.fixture.workspaces[1])
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """
+    Has fields that need converting and two fields on the same column.
+    """
+    revision = serializers.IntegerField(source="sequence")
+
+    class Meta:
+        model = Change
+        fields = ["revision", "id", "workspace", "sequence", "kind", "deleted",
+                  "created_at"]
+
+class CompiledSerializerTests(APITestCase):
+    """
+    The compiled serializers give the same data as the DRF ones.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("compiled", 3)
+        client = APIClient()
+        client.force_authenticate(cls.fixture.user)
+        client.delete(reverse("checklists:subitem-delete",
+                              args=[cls.fixture.subitems[0]]))
+
+    def assertCompiledTheSame(self, serializer_class, queryset):
+        compiled = CompiledSerializer(serializer_class)
+        queryset = queryset.order_by("id")
+
+        self.assertGreater(len(queryset), 0)
+        self.assertEqual(compiled.represent(compiled.values(queryset)),
+                         serializer_class(queryset, many=True).data)
+
+    def test_workspaces(self):
+        self.assertCompiledTheSame(WorkspaceSerializer,
+                                   Workspace.objects.all())
+
+    def test_items(self):
+        self.assertCompiledTheSame(ItemSerializer, Item.objects.all())
+
+    def test_subitems(self):
+        self.assertCompiledTheSame(SubitemSerializer, Subitem.objects.all())
+
+    def test_converted_and_repeated_columns(self):
+        self.assertCompiledTheSame(ChangeSerializer, Change.objects.all())
+
+    def test_nested_serializer_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CompiledSerializer(AggregatedWorkspaceSerializer)
+
+class NegotiationTests(APITestCase):
+    """
+    Responses come in the format and the encoding the client accepts, and
+    JSON otherwise.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("negotiation", 4)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+        self.url = reverse("checklists:aggregate",
+                           args=[self.fixture.workspace])
+
+    def test_json_by_default(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_binary_formats(self):
+        expected = self.client.get(self.url).json()
+
+        for media_type, loads in [("application/msgpack", msgpack.unpackb),
+                                  ("application/cbor", cbor2.loads)]:
+            response = self.client.get(self.url, HTTP_ACCEPT=media_type)
+
+            self.assertEqual(response["Content-Type"], media_type)
+            self.assertEqual(loads(response.content), expected)
+
+    def test_binary_request_body(self):
+        url = reverse("checklists:item-create", args=[self.fixture.workspace])
+
+        for media_type, dumps in [("application/msgpack", msgpack.packb),
+                                  ("application/cbor", cbor2.dumps)]:
+            response = self.client.post(url, dumps({"heading": media_type}),
+                                        content_type=media_type)
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()["heading"], media_type)
+
+    def test_compressed(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # The tag is weakened but still matches
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_small_and_streamed_bodies_are_not_compressed(self):
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 9):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertNotIn("Content-Encoding", response)
+
+        with mock.patch("checklists.views.get_aggregate", return_value=None):
+            response = self.client.get(self.url, {"stream": 1},
+                                       HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertTrue(response.streaming)
+        self.assertNotIn("Content-Encoding", response)
+        json.loads(b"".join(response.streaming_content))
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip"), "gzip")
+        self.assertEqual(choose_encoding("deflate, gzip;q=0.5"), "gzip")
+        self.assertIsNone(choose_encoding(""))
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIsNone(choose_encoding("*;q=0, identity"))
+        self.assertIsNotNone(choose_encoding("*"))
+
+class FieldsetTests(APITestCase):
+    """
+    `?fields=` and `?exclude=` trim the responses down and the queries with
+    them.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("fieldset", 3)
+
+    def setUp(self):
+        # Other tests cached aggregates under the same IDs and revisions
+        caches["aggregates"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+        self.url = reverse("checklists:aggregate",
+                           args=[self.fixture.workspace])
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+
+        self.assertEqual(response.status_code, 200)
+        return response, " ".join(query["sql"] for query in queries)
+
+    def test_parse(self):
+        self.assertEqual(Fieldset.parse("b,a.x, a.y", "c"),
+                         Fieldset.parse("a.y,b,a,a.x", "c,"))
+        self.assertEqual(str(Fieldset.parse("id,item_set.id", "name")),
+                         "id,item_set;-name;item_set(id)")
+
+    def test_list_fields(self):
+        url = reverse("checklists:subitem-all", args=[self.fixture.item])
+        response, sql = self.get(url, {"fields": "id,weight"})
+
+        self.assertEqual(list(response.json()["results"][0]), ["id", "weight"])
+        self.assertNotIn('"content"', sql)
+
+    def test_list_exclude(self):
+        url = reverse("checklists:subitem-all", args=[self.fixture.item])
+        response, sql = self.get(url, {"exclude": "content,position"})
+
+        self.assertEqual(list(response.json()["results"][0]),
+                         ["id", "item", "weight", "completion_status",
+                          "version"])
+        self.assertNotIn('"content"', sql)
+
+    def test_nested_fields(self):
+        response, sql = self.get(self.url, {
+            "fields": "name,item_set.heading,item_set.subitem_set.weight"})
+        data = response.json()
+
+        self.assertEqual(list(data), ["item_set", "name"])
+        self.assertEqual(list(data["item_set"][0]),
+                         ["subitem_set", "heading"])
+        self.assertEqual(list(data["item_set"][0]["subitem_set"][0]),
+                         ["weight"])
+        self.assertNotIn('"content"', sql)
+        self.assertIn('SELECT "Item"."id", "Item"."workspace_id", '
+                      '"Item"."heading" FROM', sql)
+
+    def test_nested_exclude(self):
+        expected = self.client.get(self.url).json()
+        response, sql = self.get(self.url, {
+            "exclude": "item_set.subitem_set.content"})
+
+        for item in expected["item_set"]:
+            for subitem in item["subitem_set"]:
+                del subitem["content"]
+
+        self.assertEqual(response.json(), expected)
+        self.assertNotIn('"content"', sql)
+
+    def test_pruned_level_is_not_queried(self):
+        response, sql = self.get(self.url, {"exclude": "item_set"})
+
+        self.assertNotIn("item_set", response.json())
+        self.assertNotIn('FROM "Item"', sql)
+
+    def test_sparse_aggregate_has_its_own_tag(self):
+        full = self.client.get(self.url)
+        response = self.client.get(self.url, {"fields": "id"},
+                                   HTTP_IF_NONE_MATCH=full["ETag"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": self.fixture.workspace})
+        self.assertNotEqual(response["ETag"], full["ETag"])
+
+    def test_streamed(self):
+        params = {"fields": "id,item_set.heading,item_set.subitem_set.weight"}
+        expected = self.client.get(self.url, params)
+
+        with mock.patch("checklists.views.get_aggregate", return_value=None):
+            response = self.client.get(self.url, {**params, "stream": 1})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content),
+                         expected.content)
+
+    def test_unknown_fields(self):
+        url = reverse("checklists:item-all", args=[self.fixture.workspace])
+
+        for url, params, error in [
+            (url, {"fields": "id,nope"}, "Unknown field `nope`."),
+            (self.url, {"exclude": "item_set.nope"},
+             "Unknown field `item_set.nope`."),
+            (self.url, {"fields": "name.id"}, "`name` has no fields of its "
+             "own."),
+        ]:
+            response = self.client.get(url, params)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {"error": error})
+
+class SearchTests(APITestCase):
+    """
+    Search only finds what is in the groups of the user, best first, a page
+    at a time.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("search", 3)
+        outsider = User.objects.create_user("outsider", "outsider@example.com")
+        group = Group.objects.create(creator=outsider, name="Elsewhere")
+        Contributor.objects.create(group=group, user=outsider)
+        cls.hidden = Workspace.objects.create(group=group,
+                                              name="Hidden <b>plans</b>")
+
+    def setUp(self):
+        self.client.force_authenticate(self.fixture.user)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse("checklists:search"),
+                                   {"q": query, **params})
+
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_the_groups_of_the_user(self):
+        self.assertEqual(self.search("hidden")["results"], [])
+
+        # Found once it's in one of them
+        Workspace.objects.filter(id=self.hidden.id).update(
+            group=self.fixture.group)
+        self.assertEqual(self.search("hidden")["results"], [{
+            "type": "workspace",
+            "id": self.hidden.id,
+            "workspace": self.hidden.id,
+            "snippet": "<mark>Hidden</mark> &lt;b&gt;plans&lt;/b&gt;",
+        }])
+
+    def test_escaping(self):
+        # Operators of FTS5 and the scope of the rows are searched as text
+        for query in ['"', "subitem OR", "scope : g1", "NEAR(", "g"]:
+            self.assertEqual(self.search(query)["results"], [])
+
+    def test_pages(self):
+        everything = self.search("subitem", page_size=100)["results"]
+        self.assertGreater(len(everything), 14)
+
+        pages, data = [], self.search("subitem", page_size=7)
+        self.assertIsNone(data["previous"])
+
+        while True:
+            pages.append(data["results"])
+
+            if data["next"] is None:
+                break
+
+            data = self.client.get(data["next"]).json()
+
+        self.assertEqual(sum(pages, []), everything)
+
+        # And back again
+        for page in reversed(pages[:-1]):
+            data = self.client.get(data["previous"]).json()
+            self.assertEqual(data["results"], page)
+
+        self.assertIsNone(data["previous"])
+
+    def test_invalid_cursor(self):
+        for cursor in ["nope", "YTp4OjE=", ""]:
+            response = self.client.get(reverse("checklists:search"),
+                                       {"q": "subitem", "cursor": cursor})
+
+            self.assertEqual(response.status_code, 400)
+
+class SubitemBatchTests(APITestCase):
+    """
+    A batch of subitem operations is written as a whole or not at all, with
+    an error for each operation that stopped it.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("subitembatch", 3)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+        self.url = reverse("checklists:subitem-batch",
+                           args=[self.fixture.workspace])
+        self.before = Item.objects.get(id=self.fixture.item)
+
+    def assertNothingWritten(self):
+        item = Item.objects.get(id=self.fixture.item)
+
+        self.assertEqual(item.subitem_count, self.before.subitem_count)
+        self.assertEqual(item.total_weight, self.before.total_weight)
+        self.assertFalse(Subitem.objects.filter(content="New").exists())
+        self.assertEqual(Subitem.objects.get(id=self.fixture.subitems[0])
+                         .version, 1)
+
+    def operations(self, delete):
+        return {"create": [{"item": self.fixture.item, "content": "New"},
+                           {"item": self.fixture.item, "content": "New",
+                            "weight": "heavy"}],
+                "update": [{"id": self.fixture.subitems[0], "weight": 4}],
+                "delete": delete}
+
+    def test_invalid(self):
+        response = self.client.post(
+            self.url, self.operations([self.fixture.subitems[0], 0]),
+            format="json")
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors["create"][0], {})
+        self.assertIn("weight", errors["create"][1])
+        self.assertEqual(errors["update"], [{}])
+        self.assertEqual(errors["delete"], [
+            {"id": ["Subitem appears more than once in the batch."]},
+            {"id": ["Subitem does not exist in this workspace."]},
+        ])
+        self.assertNothingWritten()
+
+        response = self.client.post(self.url, {"create": {}}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            "error": "create, update and delete must be lists."})
+
+        for body in [[], [{"create": []}], 1, "create"]:
+            response = self.client.post(self.url, body, format="json")
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(),
+                             {"error": "A batch must be an object."})
+
+    def test_created_like_create_subitem(self):
+        for operation in [{"content": "New", "weight": "heavy"},
+                          {"weight": 2}, {"content": "x" * 10000}]:
+            single = self.client.post(
+                reverse("checklists:subitem-create", args=[self.fixture.item]),
+                operation, format="json")
+            batched = self.client.post(self.url, {"create": [
+                {"item": self.fixture.item, **operation}]}, format="json")
+
+            self.assertEqual(single.status_code == 400,
+                             batched.status_code == 400)
+
+            if single.status_code == 400:
+                self.assertEqual(batched.json()["create"], [single.json()])
+
+    def test_stale_version(self):
+        first, second = self.fixture.subitems[:2]
+        operations = self.operations([{"id": second, "version": 2}])
+        del operations["create"][1]
+        operations["update"][0]["version"] = 1
+
+        response = self.client.post(self.url, operations, format="json")
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.json(), {
+            "create": [{}], "update": [{}],
+            "delete": [{"version": ["Subitem was changed in the meantime."]}],
+        })
+        self.assertNothingWritten()
+        self.assertTrue(Subitem.objects.filter(id=second).exists())
+
+        # Anything else wrong with the batch comes first
+        operations["update"][0]["weight"] = "heavy"
+        response = self.client.post(self.url, operations, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        operations["update"][0]["weight"] = 4
+        operations["delete"] = [{"id": second, "version": "x"}]
+        response = self.client.post(self.url, operations, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        operations["delete"] = [{"id": second, "version": 1}]
+        response = self.client.post(self.url, operations, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["update"][0]["version"], 2)
+        self.assertFalse(Subitem.objects.filter(id=second).exists())
+
+    def test_without_versions(self):
+        # Based on the rows as they are when it's written, like PATCH without
+        # If-Match
+        Subitem.objects.filter(id=self.fixture.subitems[0]).update(
+            version=F("version") + 5)
+
+        response = self.client.post(self.url, {
+            "update": [{"id": self.fixture.subitems[0], "weight": 4}],
+            "delete": [self.fixture.subitems[1]],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["update"][0]["version"], 7)
+
+class BatchTests(APITestCase):
+    """
+    `/api/batch/` answers its requests like they would have been answered on
+    their own, authenticating only once.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("batch", 3)
+
+    def setUp(self):
+        caches["aggregates"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+
+    def batch(self, requests, atomic=False):
+        response = self.client.post(reverse("batch"), {
+            "requests": requests, "atomic": atomic,
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def write(self, heading):
+        return [
+            {"method": "POST", "body": {"heading": heading},
+             "path": reverse("checklists:item-create",
+                             args=[self.fixture.workspace])},
+            {"method": "PATCH", "body": {"heading": heading},
+             "path": reverse("checklists:item-update", args=[0])},
+            {"method": "GET", "path": reverse("checklists:item-all",
+                                              args=[self.fixture.workspace])},
+        ]
+
+    def test_reads(self):
+        routes = [
+            ("collaboration:group-all", []),
+            ("checklists:workspace-all", [self.fixture.group]),
+            ("checklists:aggregate", [self.fixture.workspace]),
+        ]
+        paths = [reverse(name, args=args) for name, args in routes]
+        expected = [self.client.get(path) for path in paths]
+        caches["aggregates"].clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.batch([{"method": "GET", "path": path}
+                               for path in paths])
+
+        self.assertEqual([response["body"] for response in data["responses"]],
+                         [response.json() for response in expected])
+        self.assertEqual(data["responses"][2]["headers"]["ETag"],
+                         expected[2]["ETag"])
+        self.assertEqual(len(queries),
+                         sum(QUERY_BUDGETS[name] for name, _ in routes))
+
+    def test_headers(self):
+        path = reverse("checklists:aggregate", args=[self.fixture.workspace])
+        etag = self.client.get(path)["ETag"]
+        data = self.batch([{"method": "GET", "path": path,
+                            "headers": {"If-None-Match": etag}}])
+
+        self.assertEqual(data["responses"][0]["status"], 304)
+
+    def test_not_atomic(self):
+        data = self.batch(self.write("Kept"))
+
+        self.assertEqual([response["status"] for response in data["responses"]],
+                         [201, 400, 200])
+        self.assertTrue(Item.objects.filter(heading="Kept").exists())
+
+    def test_atomic(self):
+        data = self.batch(self.write("Rolled back"), atomic=True)
+
+        self.assertEqual([response["status"] for response in data["responses"]],
+                         [201, 400, 424])
+        self.assertFalse(data["committed"])
+        self.assertFalse(Item.objects.filter(heading="Rolled back").exists())
+
+        data = self.batch(self.write("Committed")[::2], atomic=True)
+
+        self.assertTrue(data["committed"])
+        self.assertTrue(Item.objects.filter(heading="Committed").exists())
+
+    def test_unknown_route(self):
+        data = self.batch([{"method": "GET", "path": "/api/nope/"}])
+
+        self.assertEqual(data["responses"][0]["status"], 404)
+
+    def test_invalid(self):
+        for requests in [[], [{"method": "GET", "path": "/admin/"}],
+                         [{"method": "GET", "path": "/api/batch/"}],
+                         [{"method": "POST", "path": "/api/%62atch/"}],
+                         [{"method": "POST", "path": "/api/batch/?x=1"}],
+                         [{"method": "GET", "path": "/api/nope/"}] * 51]:
+            response = self.client.post(reverse("batch"),
+                                        {"requests": requests}, format="json")
+
+            self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(None)
+        response = self.client.post(reverse("batch"), {"requests": [
+            {"method": "GET", "path": reverse("collaboration:group-all")},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 401)
+
+class VersioningTests(APITestCase):
+    """
+    Edits only go through if the row is still at the version they are based
+    on, see versioning.py.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("versioning", 3)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+        self.subitem = Subitem.objects.get(id=self.fixture.subitems[0])
+        self.url = reverse("checklists:subitem-update",
+                           args=[self.subitem.id])
+
+    def patch(self, data, **headers):
+        return self.client.patch(self.url, data, format="json", **headers)
+
+    def test_versions_go_up(self):
+        for name, args, data in [
+            ("checklists:workspace-update", [self.fixture.workspace],
+             {"name": "Renamed"}),
+            ("checklists:item-update", [self.fixture.item],
+             {"heading": "Renamed"}),
+            ("checklists:subitem-update", [self.subitem.id],
+             {"content": "Renamed"}),
+        ]:
+            response = self.client.patch(reverse(name, args=args), data,
+                                         format="json", HTTP_IF_MATCH='"v1"')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["version"], 2)
+            self.assertEqual(response["ETag"], '"v2"')
+
+    def test_stale_if_match(self):
+        self.assertEqual(self.patch({"content": "First"}).status_code, 200)
+
+        for tag in ['"v1"', 'W/"v1"', '"2"']:
+            response = self.patch({"content": "Second"}, HTTP_IF_MATCH=tag)
+
+            self.assertEqual(response.status_code, 412)
+            self.assertEqual(response.json()["current"]["content"], "First")
+            self.assertEqual(response["ETag"], '"v2"')
+
+        response = self.patch({"content": "Second"},
+                              HTTP_IF_MATCH='"v1", "v2"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 3)
+
+    def change_after_it_was_read(self):
+        resolve = views.resolve_subitem
+
+        def resolve_then_change(request, subitem_id):
+            subitem = resolve(request, subitem_id)
+            Subitem.objects.filter(id=subitem_id).update(
+                weight=5, version=F("version") + 1)
+            Item.objects.filter(id=subitem.item_id).update(
+                total_weight=F("total_weight") + 5 - subitem.weight)
+            return subitem
+
+        return mock.patch.object(views, "resolve_subitem",
+                                 resolve_then_change)
+
+    def test_changed_after_it_was_read(self):
+        total_weight = Item.objects.get(id=self.subitem.item_id).total_weight
+
+        # The last edit wins, counted from the row as it was changed to
+        with self.change_after_it_was_read():
+            response = self.patch({"weight": 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 3)
+        self.assertEqual(Item.objects.get(id=self.subitem.item_id)
+                         .total_weight,
+                         total_weight + 3 - self.subitem.weight)
+
+    def test_changed_after_the_version_it_names(self):
+        total_weight = Item.objects.get(id=self.subitem.item_id).total_weight
+
+        with self.change_after_it_was_read():
+            response = self.patch({"weight": 3}, HTTP_IF_MATCH='"v1"')
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.json()["current"]["weight"], 5)
+
+        # Nothing was counted for the edit that failed
+        self.assertEqual(Item.objects.get(id=self.subitem.item_id)
+                         .total_weight, total_weight + 5 - self.subitem.weight)
+        self.assertEqual(Subitem.objects.get(id=self.subitem.id).weight, 5)
+
+    def test_delete(self):
+        item = Item.objects.get(id=self.subitem.item_id)
+        url = reverse("checklists:subitem-delete", args=[self.subitem.id])
+
+        with self.change_after_it_was_read():
+            response = self.client.delete(url, HTTP_IF_MATCH='"v1"')
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.json()["current"]["weight"], 5)
+
+        # Taken off the counters by the weight it had when it was deleted
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(Item.objects.get(id=item.id).total_weight,
+                         item.total_weight - self.subitem.weight)
+        self.assertEqual(Item.objects.get(id=item.id).subitem_count,
+                         item.subitem_count - 1)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Item.objects.get(id=item.id).subitem_count,
+                         item.subitem_count - 1)
+
+    def test_compressed_tags_match(self):
+        # Long enough to be compressed
+        response = self.patch({"content": "Compressible " * 100},
+                              HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], 'W/"v2"')
+
+        # The weakened tag still names the version it was given for
+        response = self.patch({"weight": 4}, HTTP_ACCEPT_ENCODING="gzip",
+                              HTTP_IF_MATCH=response["ETag"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(gzip.decompress(response.content))
+                         ["version"], 3)
+        self.assertEqual(self.patch({"weight": 5}, HTTP_IF_MATCH='W/"v2"')
+                         .status_code, 412)
+
+    def test_deleted(self):
+        Subitem.objects.filter(id=self.subitem.id).delete()
+
+        with mock.patch.object(views, "resolve_subitem",
+                               return_value=self.subitem):
+            self.subitem.can_modify = True
+            response = self.patch({"content": "Gone"})
+
+        self.assertEqual(response.status_code, 412)
+        self.assertIsNone(response.json()["current"])
+
+    def test_batch_moves_the_version_on(self):
+        response = self.client.post(
+            reverse("checklists:subitem-batch",
+                    args=[self.fixture.workspace]),
+            {"update": [{"id": self.subitem.id, "completion_status": True}]},
+            format="json")
+
+        self.assertEqual(response.json()["update"][0]["version"], 2)
+        self.assertEqual(self.patch({"content": "Stale"},
+                                    HTTP_IF_MATCH='"v1"').status_code, 412)
+
+    def test_moves_move_the_version_on(self):
+        for name, row in [("checklists:item-move", self.fixture.item),
+                          ("checklists:subitem-move", self.subitem.id)]:
+            response = self.client.post(reverse(name, args=[row]),
+                                        {"after": None}, format="json")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["version"], 2)
+            self.assertEqual(response["ETag"], '"v2"')
+
+        self.assertEqual(self.patch({"content": "Stale"},
+                                    HTTP_IF_MATCH='"v1"').status_code, 412)
+
+class ConcurrentWriteTests(ConcurrencyTestCase):
+    """
+    Concurrent writes wait for each other instead of failing to lock the
+    database.
+    """
+    def test_create(self):
+        item_url = reverse("checklists:item-create",
+                           args=[self.fixture.workspace])
+        subitem_url = reverse("checklists:subitem-create",
+                              args=[self.fixture.item])
+
+        statuses = self.concurrently(lambda client, number: client.post(
+            subitem_url if number % 2 else item_url,
+            {"heading": str(number), "content": str(number)}, format="json"))
+
+        self.assertEqual(statuses, {201: 80})
+
+        # Every one of them got a place of its own
+        for siblings in [Item.objects.filter(workspace=self.fixture.workspace),
+                         Subitem.objects.filter(item=self.fixture.item)]:
+            positions = list(siblings.values_list("position", flat=True))
+            self.assertEqual(len(positions), len(set(positions)))
+
+    def test_edit(self):
+        subitems = list(Subitem.objects.filter(item=self.fixture.item))
+        total_weight = Item.objects.get(id=self.fixture.item).total_weight
+
+        statuses = self.concurrently(lambda client, number: client.patch(
+            reverse("checklists:subitem-update",
+                    args=[subitems[number % len(subitems)].id]),
+            {"weight": number % 7}, format="json"))
+
+        self.assertEqual(statuses, {200: 80})
+
+        # Each edit counted from the weight the one before it left
+        weights = Subitem.objects.filter(item=self.fixture.item)
+        self.assertEqual(Item.objects.get(id=self.fixture.item).total_weight,
+                         total_weight - sum(s.weight for s in subitems)
+                         + sum(s.weight for s in weights))
+
+    def test_batch(self):
+        subitems = list(Subitem.objects.filter(item=self.fixture.item))
+        url = reverse("checklists:subitem-batch", args=[self.fixture.workspace])
+
+        # Batches without versions never conflict, however they interleave
+        statuses = self.concurrently(lambda client, number: client.post(url, {
+            "create": [{"item": self.fixture.item, "content": str(number)}],
+            "update": [{"id": subitems[number % len(subitems)].id,
+                        "weight": number % 7}],
+        }, format="json"))
+
+        self.assertEqual(statuses, {200: 80})
+
+        item = Item.objects.get(id=self.fixture.item)
+        current = Subitem.objects.filter(item=self.fixture.item)
+        self.assertEqual((item.total_weight, item.subitem_count),
+                         (sum(s.weight for s in current), len(current)))
+
+    def test_rename_workspace(self):
+        url = reverse("checklists:workspace-update",
+                      args=[self.fixture.workspace])
+
+        # Each rename also rewrites the workspace's search index rows
+        statuses = self.concurrently(lambda client, number: client.patch(
+            url, {"name": f"Renamed {number}"}, format="json"))
+
+        self.assertEqual(statuses, {200: 80})
+
+        client = APIClient()
+        client.force_authenticate(self.fixture.user)
+        name = Workspace.objects.get(id=self.fixture.workspace).name
+        response = client.get(reverse("checklists:search"), {"q": name})
+        self.assertIn(self.fixture.workspace,
+                      [result["workspace"] for result
+                       in response.json()["results"]])
+
+    def test_delete(self):
+        subitem = Subitem.objects.filter(item=self.fixture.item).first()
+        item = Item.objects.get(id=self.fixture.item)
+        url = reverse("checklists:subitem-delete", args=[subitem.id])
+
+        statuses = self.concurrently(lambda client, number:
+                                     client.delete(url), times=5)
+
+        # Only the delete that removed the row counted it off
+        self.assertEqual(statuses[204], 1)
+        self.assertEqual(Item.objects.get(id=item.id).subitem_count,
+                         item.subitem_count - 1)
+        self.assertEqual(Item.objects.get(id=item.id).total_weight,
+                         item.total_weight - subitem.weight)
+
+class EventTests(TransactionTestCase):
+    """
+    Clients watching a workspace over a WebSocket are sent its changes once
+    they are committed. Only contributors can watch.
+    """
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+        self.fixture = build_fixture("events", 2)
+        self.application = JWTAuthMiddleware(
+            URLRouter(routing.websocket_urlpatterns))
+
+    async def open(self, user=None, workspace=None):
+        workspace = workspace or self.fixture.workspace
+        path = f"/ws/checklists/workspace/{workspace}/"
+
+        if user is not None:
+            path += f"?token={AccessToken.for_user(user)}"
+
+        socket = WebsocketCommunicator(self.application, path)
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def test_close_codes(self):
+        outsider = await sync_to_async(User.objects.create_user)(
+            "outsider", "outsider@example.com", "password")
+
+        for user, code in [(None, consumers.UNAUTHORIZED),
+                           (outsider, consumers.FORBIDDEN)]:
+            socket = await self.open(user)
+
+            self.assertEqual(await socket.receive_output(),
+                             {"type": "websocket.close", "code": code})
+
+    async def test_changes(self):
+        socket = await self.open(self.fixture.user)
+        client = APIClient()
+        client.force_authenticate(self.fixture.user)
+        subitem = self.fixture.subitems[0]
+
+        response = await sync_to_async(client.patch)(
+            reverse("checklists:subitem-update", args=[subitem]),
+            {"content": "Pushed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        event = await socket.receive_json_from(timeout=5)
+        workspace = await Workspace.objects.aget(id=self.fixture.workspace)
+
+        self.assertEqual(event["type"], "workspace.changes")
+        self.assertEqual(event["revision"], workspace.revision)
+        self.assertEqual(event["workspace"]["name"], workspace.name)
+        self.assertEqual(
+            {(change["type"], change["id"]): change["data"] and
+             change["data"].get("content") for change in event["changes"]}
+            [(Change.SUBITEM, subitem)], "Pushed")
+
+        await socket.disconnect()
+
+class PublishTests(APITestCase):
+    """
+    Writes only send what they changed, the rows are read by the consumers.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("publish", 2)
+
+    def test_nothing_is_read_for_workspaces_nobody_watches(self):
+        self.client.force_authenticate(self.fixture.user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(reverse("checklists:subitem-update",
+                                      args=[self.fixture.subitems[0]]),
+                              {"content": "Unwatched"}, format="json")
+
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(len(queries), 0)
+
+class AsyncViewParityTests(AsyncViewParityTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("parity", 2)
+
+    def test_aggregate(self):
+        user, workspace = self.fixture.user, self.fixture.workspace
+        same = partial(self.assertSameResponses,
+                       views.get_workspace_aggr_content,
+                       async_views.get_workspace_aggr_content,
+                       reverse("checklists:aggregate", args=[workspace]),
+                       [workspace])
+
+        etag = same(user=user)["ETag"]
+        self.assertEqual(same(user=user, HTTP_IF_NONE_MATCH=etag)
+                         .status_code, 304)
+        self.assertEqual(same(user=user, HTTP_ACCEPT="application/msgpack")
+                         ["Content-Type"], "application/msgpack")
+        self.assertEqual(same(user=user, HTTP_ACCEPT="text/csv")
+                         .status_code, 406)
+        self.assertEqual(same().status_code, 401)
+        self.assertEqual(same(HTTP_AUTHORIZATION="Bearer nope").status_code,
+                         401)
+        self.assertEqual(same(method="post", user=user).status_code, 405)
+
+    def test_changes(self):
+        user, workspace = self.fixture.user, self.fixture.workspace
+        compacted = Workspace.objects.get(id=workspace).compacted_revision
+        same = partial(self.assertSameResponses, views.get_workspace_changes,
+                       async_views.get_workspace_changes,
+                       reverse("checklists:changes", args=[workspace]),
+                       [workspace], user=user)
+
+        self.assertEqual(same(data={"since": compacted}).status_code, 200)
+        self.assertEqual(same(data={"since": "x"}).status_code, 400)
+        self.assertEqual(same(data={"since": compacted - 1}).status_code, 410)
+        self.assertEqual(same(method="options").status_code, 200)
+
+class MetricsTests(APITestCase):
+    """
+    `/metrics` counts the requests by route and is only served to Prometheus.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("metrics", 2)
+
+    def scrape(self, **headers):
+        return self.client.get(reverse("metrics"), **headers)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self):
+        for headers in [{}, {"HTTP_AUTHORIZATION": "Bearer nope"},
+                        {"HTTP_AUTHORIZATION": "secret"}]:
+            response = self.scrape(**headers)
+
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response["WWW-Authenticate"], "Bearer")
+
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer secret")
+                         .status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_without_a_token(self):
+        for debug in [False, True]:
+            with override_settings(DEBUG=debug):
+                self.assertEqual(self.scrape().status_code, 403)
+                self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer ")
+                                 .status_code, 403)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_labels(self):
+        self.client.force_authenticate(self.fixture.user)
+        self.client.get(reverse("checklists:aggregate",
+                                args=[self.fixture.workspace]))
+        self.client.get(f"/api/checklists/nope/{self.fixture.workspace}/")
+
+        metrics = self.scrape(HTTP_AUTHORIZATION="Bearer secret") \
+                      .content.decode()
+
+        # Routes rather than paths, so there is one series per route
+        self.assertIn('kronathens_requests_total{method="GET",'
+                      'route="checklists:aggregate",status="200"}', metrics)
+        self.assertIn('kronathens_requests_total{method="GET",'
+                      'route="unmatched",status="404"}', metrics)
+        self.assertNotIn(f"/{self.fixture.workspace}/", metrics)
+        self.assertIn('kronathens_request_queries_count{'
+                      'route="checklists:aggregate"}', metrics)
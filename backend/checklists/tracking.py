@@ -0,0 +1,194 @@
+"""
+Bookkeeping for the data that is stored on workspaces and items but derived f-
+rom what is in them, i.e. the progress counters, the workspace revision and the
+change log. The views call these functions in the same transaction as the write
+they describe.
+"""
+
+from django.db.models import (F, Q, Sum, Count, OuterRef, Subquery, Value,
+                              Case, When)
+from django.db.models.functions import Coalesce
+
+from . import caching, events
+from .models import Workspace, Item, Subitem, Change
+
+COUNTERS = ("total_weight", "completed_weight", "subitem_count")
+
+def contribution(weight, completion_status):
+    """
+    Returns what a single subitem adds to the counters of its item and worksp-
+    ace as a (total weight, completed weight, count) tuple.
+    """
+    return (weight, weight if completion_status else 0, 1)
+
+def _shifted(total, completed, count):
+    """
+    Builds the update adding the given amounts to the counters. The addition
+    happens in the database so concurrent writes are not lost.
+    """
+    updates = {}
+
+    for name, amount in zip(COUNTERS, (total, completed, count)):
+        if amount:
+            updates[name] = F(name) + amount
+
+    return updates
+
+def touch_workspace(workspace, changes=(), **updates):
+    """
+    Bumps the revision of a workspace after something in it has changed, al-
+    ong with any other updates to the workspace row. `changes` are logged und-
+    er the new revision as (kind, object ID, deleted) tuples and pushed to the
+    clients watching the workspace. The cached aggregate of the revision that
+    was loaded is dropped as it is now out of date.
+    """
+    Workspace.objects.filter(id=workspace.id).update(
+        revision=F("revision") + 1, **updates)
+    caching.invalidate([(workspace.id, workspace.revision)])
+
+    revision = Workspace.objects.filter(id=workspace.id) \
+                                .values_list("revision", flat=True).get()
+
+    if changes:
+        Change.objects.bulk_create([
+            Change(workspace_id=workspace.id, sequence=revision, kind=kind,
+                   object_id=object_id, deleted=deleted)
+            for kind, object_id, deleted in changes
+        ])
+
+    events.publish(workspace.id, revision, changes)
+
+def shift_progress(item_id, workspace, total, completed, count, changes=()):
+    """
+    Moves the counters of an item and its workspace by the given amounts.
+    """
+    updates = _shifted(total, completed, count)
+    changes = list(changes)
+
+    if updates:
+        Item.objects.filter(id=item_id).update(**updates)
+        changes.append((Change.ITEM, item_id, False))
+
+    touch_workspace(workspace, changes, **updates)
+
+def shift_many(workspace, deltas, changes=()):
+    """
+    Moves the counters of several items in one workspace at once. `deltas` m-
+    aps item IDs to (total weight, completed weight, count) amounts.
+    """
+    updates = {}
+    changes = list(changes)
+
+    for position, name in enumerate(COUNTERS):
+        whens = [When(id=item_id, then=Value(amounts[position]))
+                 for item_id, amounts in deltas.items() if amounts[position]]
+
+        if whens:
+            updates[name] = F(name) + Case(*whens, default=Value(0))
+
+    if updates:
+        Item.objects.filter(id__in=deltas).update(**updates)
+        changes += [(Change.ITEM, item_id, False)
+                    for item_id, amounts in deltas.items() if any(amounts)]
+
+    touch_workspace(workspace, changes, **_shifted(*(
+        sum(amounts[position] for amounts in deltas.values())
+        for position in range(len(COUNTERS))
+    )))
+
+def subitem_added(subitem, workspace, changes=()):
+    """
+    Counts a newly created subitem towards its item and workspace. `changes`
+    are any other rows that were written to along with it.
+    """
+    shift_progress(subitem.item_id, workspace,
+                   *contribution(subitem.weight, subitem.completion_status),
+                   changes=[(Change.SUBITEM, subitem.id, False), *changes])
+
+def subitem_removed(subitem, workspace):
+    """
+    Takes a subitem off the counters of its item and workspace once its row
+    was deleted. The subitem must hold the values the row had then.
+    """
+    total, completed, count = contribution(subitem.weight,
+                                           subitem.completion_status)
+    shift_progress(subitem.item_id, workspace, -total, -completed, -count,
+                   changes=[(Change.SUBITEM, subitem.id, True)])
+
+def subitem_changed(subitem, workspace, old_weight, old_status):
+    """
+    Applies the difference between the old and new weight and status of a mo-
+    dified subitem.
+    """
+    old = contribution(old_weight, old_status)
+    new = contribution(subitem.weight, subitem.completion_status)
+
+    shift_progress(subitem.item_id, workspace,
+                   *(after - before for before, after in zip(old, new)),
+                   changes=[(Change.SUBITEM, subitem.id, False)])
+
+def subitem_moved(subitem, source, target, changes=()):
+    """
+    Moves what a subitem counts for from its old item to its new one. Both i-
+    tems must have their workspace loaded. `changes` are any other rows of the
+    target item that were written to, i.e. when its subitems were rebalanced.
+    """
+    amounts = contribution(subitem.weight, subitem.completion_status)
+    negated = tuple(-amount for amount in amounts)
+    moved = [(Change.SUBITEM, subitem.id, False), *changes]
+
+    if source.id == target.id:
+        touch_workspace(source.workspace, moved)
+    elif source.workspace_id == target.workspace_id:
+        shift_many(source.workspace, {source.id: negated, target.id: amounts},
+                   moved)
+    else:
+        # It leaves a tombstone in the workspace that it was moved out of
+        shift_progress(source.id, source.workspace, *negated,
+                       changes=[(Change.SUBITEM, subitem.id, True)])
+        shift_progress(target.id, target.workspace, *amounts, changes=moved)
+
+def item_removed(item):
+    """
+    Takes all of an item's subitems off its workspace. Must be called before
+    the item is deleted since the amounts are read from the item's row.
+    """
+    row = Item.objects.filter(id=item.id)
+
+    touch_workspace(item.workspace, [(Change.ITEM, item.id, True)], **{
+        name: F(name) - Subquery(row.values(name)) for name in COUNTERS
+    })
+
+def _sum(queryset, expression):
+    """
+    Sums an expression over a correlated queryset, giving zero when it's empty.
+    """
+    return Coalesce(Subquery(queryset.annotate(value=expression)
+                                     .values("value")), Value(0))
+
+def rebuild_progress(workspaces=None):
+    """
+    Recomputes the counters from the subitems. Rebuilds every workspace unle-
+    ss a queryset of workspaces is given. The change log of the workspaces is
+    cut off at the new revision since the rebuilt counters aren't logged, so
+    clients will fetch the whole workspaces again.
+    """
+    if workspaces is None:
+        workspaces = Workspace.objects.all()
+
+    # Items are rebuilt straight from their subitems
+    subitems = Subitem.objects.filter(item=OuterRef("pk")).order_by() \
+                              .values("item")
+    Item.objects.filter(workspace__in=workspaces).update(
+        total_weight=_sum(subitems, Sum("weight")),
+        completed_weight=_sum(subitems, Sum("weight",
+                                            filter=Q(completion_status=True))),
+        subitem_count=_sum(subitems, Count("id")),
+    )
+
+    # Workspaces are then the sum of their items
+    items = Item.objects.filter(workspace=OuterRef("pk")).order_by() \
+                        .values("workspace")
+    workspaces.update(revision=F("revision") + 1,
+                      compacted_revision=F("revision") + 1,
+                      **{name: _sum(items, Sum(name)) for name in COUNTERS})
@@ -1,18 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# The hot read endpoints can be served by async views under ASGI
+hot = async_views if settings.ASYNC_VIEWS else views
+
+app_name = 'checklists'
 
 urlpatterns = [
-    path('workspace/all/<int:group_id>/', views.get_all_workspaces),
-    path('workspace/create/<int:group_id>/', views.create_workspace),
-    path('workspace/update/<int:workspace_id>/', views.modify_workspace_details),
-    path('workspace/delete/<int:workspace_id>/', views.delete_workspace),
-    path('workspace/item/create/<int:workspace_id>/', views.create_item),
-    path('workspace/item/all/<int:workspace_id>/', views.get_all_items),
-    path('workspace/item/update/<int:item_id>/', views.modify_item),
-    path('workspace/item/delete/<int:item_id>/', views.delete_item),
-    path('workspace/subitem/all/<int:item_id>/', views.get_all_subitems),
-    path('workspace/subitem/create/<int:item_id>/', views.create_subitem),
-    path('workspace/subitem/update/<int:subitem_id>/', views.modify_subitem),
-    path('workspace/subitem/delete/<int:subitem_id>/', views.delete_subitem),
-    path('workspace/aggregate/all/<int:workspace_id>/', views.get_workspace_aggr_content)
+    path('workspace/all/<int:group_id>/', views.get_all_workspaces, name='workspace-all'),
+    path('workspace/create/<int:group_id>/', views.create_workspace, name='workspace-create'),
+    path('workspace/update/<int:workspace_id>/', views.modify_workspace_details, name='workspace-update'),
+    path('workspace/delete/<int:workspace_id>/', views.delete_workspace, name='workspace-delete'),
+    path('workspace/item/create/<int:workspace_id>/', views.create_item, name='item-create'),
+    path('workspace/item/all/<int:workspace_id>/', views.get_all_items, name='item-all'),
+    path('workspace/item/update/<int:item_id>/', views.modify_item, name='item-update'),
+    path('workspace/item/delete/<int:item_id>/', views.delete_item, name='item-delete'),
+    path('workspace/item/move/<int:item_id>/', views.move_item, name='item-move'),
+    path('workspace/subitem/all/<int:item_id>/', views.get_all_subitems, name='subitem-all'),
+    path('workspace/subitem/create/<int:item_id>/', views.create_subitem, name='subitem-create'),
+    path('workspace/subitem/update/<int:subitem_id>/', views.modify_subitem, name='subitem-update'),
+    path('workspace/subitem/delete/<int:subitem_id>/', views.delete_subitem, name='subitem-delete'),
+    path('workspace/subitem/batch/<int:workspace_id>/', views.batch_subitems, name='subitem-batch'),
+    path('workspace/subitem/move/<int:subitem_id>/', views.move_subitem, name='subitem-move'),
+    path('workspace/aggregate/all/<int:workspace_id>/', hot.get_workspace_aggr_content, name='aggregate'),
+    path('workspace/aggregate/changes/<int:workspace_id>/', hot.get_workspace_changes, name='changes'),
+    path('workspace/aggregate/cache/stats/', views.get_aggregate_cache_stats, name='aggregate-cache-stats'),
+    path('search/', views.search_checklists, name='search')
 ]
\ No newline at end of file
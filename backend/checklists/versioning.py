@@ -0,0 +1,88 @@
+"""
+Optimistic concurrency for the PATCH endpoints of workspaces, items and sub-
+items. Each row has a `version` that goes up by one with every edit of it.
+
+Clients can name the version their edit is based on with `If-Match`, giving
+the `ETag` that PATCH responds with, i.e. the version as `"v<version>"`. If
+the row has moved on since, the edit is answered with 412 and the current row,
+which the client can apply and retry without fetching the workspace again. The
+tag names a version of the row rather than the bytes of a response, so it also
+matches once compression made it weak (see kronathens/compression.py).
+
+Edits without `If-Match` are based on the row as it is when they are made, so
+the last one wins. Either way the row is read again in the transaction of the
+edit (see `lock_for_edit`) and the edit is a conditional `UPDATE ... WHERE id
+= ? AND version = ?` against that version (see `PartialUpdateMixin`).
+"""
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+class VersionConflict(Exception):
+    """
+    Raised when the row changed since it was read.
+    """
+
+def version_etag(instance):
+    """
+    Gives the entity tag for the current version of a row.
+    """
+    return quote_etag(f"v{instance.version}")
+
+def if_match(request, instance):
+    """
+    Tells whether the row is at a version named by `If-Match`, or if there is
+    no such header.
+    """
+    header = request.headers.get("If-Match")
+
+    if header is None:
+        return True
+
+    tags = parse_etags(header)
+
+    # Compared weakly, as the row is the same whichever encoding it was sent in
+    return "*" in tags or version_etag(instance) in \
+        {tag.removeprefix("W/") for tag in tags}
+
+def lock_for_edit(request, instance):
+    """
+    Reads the row again at the start of the transaction of an edit, locking
+    it where the database can, and brings the instance up to date with it. The
+    values the edit changes from are then the ones it really changes. Raises
+    `VersionConflict` if the row was deleted or is not at a version named by
+    `If-Match`.
+    """
+    model = type(instance)
+    current = model.objects.select_for_update().filter(pk=instance.pk).first()
+
+    if current is None or not if_match(request, current):
+        raise VersionConflict()
+
+    for field in model._meta.concrete_fields:
+        value = getattr(current, field.attname)
+
+        # Only drop a related object that was loaded if it's another one now
+        if field.is_relation and value != getattr(instance, field.attname) \
+                and field.is_cached(instance):
+            field.delete_cached_value(instance)
+
+        setattr(instance, field.attname, value)
+
+def precondition_failed(serializer_class, instance):
+    """
+    Responds to an edit that was based on another version with the current
+    row, or None in its place if it was deleted in the meantime.
+    """
+    current = type(instance).objects.filter(pk=instance.pk).first()
+
+    if current is None:
+        return Response({"error": "This was deleted in the meantime.",
+                         "current": None},
+                        status=status.HTTP_412_PRECONDITION_FAILED)
+
+    return Response({"error": "This was changed in the meantime.",
+                     "current": serializer_class(current).data},
+                    status=status.HTTP_412_PRECONDITION_FAILED,
+                    headers={"ETag": version_etag(current)})
@@ -1,81 +1,78 @@
+from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from accounts.models import User
+from accounts.permissions import IsSuperuser
 from collaboration.models import Group, Contributor
-
+from kronathens.fieldsets import (FieldsetError, requested_fieldset, prune,
+                                  nested, columns)
+from kronathens.pagination import paginated_response
+
+from .access import (resolve_group, resolve_workspace, resolve_item,
+                     resolve_subitem)
+from .batch import SubitemBatch
+from .caching import get_aggregate, set_aggregate, invalidate, stats
+from .events import describe, workspaces_deleted
 from .models import *
+from .ordering import key_for
+from .search import (search, decode_cursor, encode_cursor, SearchUnavailable,
+                     SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE)
 from .serializers import *
-
-def workspace_exists(workspace_id):
-    """
-    Checks if a workspace exists. Returns true if it does and false if not.
-    """
-    try:
-        workspace = Workspace.objects.get(id=workspace_id)
-    except Workspace.DoesNotExist:
-        return False
-    return True
-
-def item_exists(item_id):
-    """
-    Checks if an item exists. Returns true if it does and false if otherwise.
-    """
-    try:
-        Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
-        return False
-
-    return True
-
-def user_can_modify(group_id, user_id):
-    """
-    Checks if the user has the permission to edit the workspace. Returns true 
-    if yes and false otherwise.
-    """
-    try:
-        Contributor.objects.get(group=group_id, user=user_id)
-    except Contributor.DoesNotExist:
-        return False
-    return True
+from .streaming import stream_aggregate, streamable
+from .versioning import (VersionConflict, lock_for_edit, precondition_failed,
+                         version_etag)
+from .tracking import (subitem_added, subitem_changed, subitem_removed,
+                       subitem_moved, item_removed, touch_workspace)
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_all_workspaces(request, group_id):
     """
     Getting all the workspaces that are present in the group. Must be authenti-
-    cated and group must belong to view. 
+    cated and group must belong to view.
     """
-    # User is usually automatically the user ID but group is the `Group`` object.
-    user = request.user.id
+    # Making sure the user has valid permissions to perform the action.
+    group = resolve_group(request, group_id)
 
-    # Making sure the user has valid permissions to perform the action. 
-    try:
-        contributor = Contributor.objects.get(user_id=user, group_id=group_id)
-    except Contributor.DoesNotExist:
-        return Response({"error": "Group not found or you are not a contributor "
-                        "and do not have permission to edit this workspace"},
+    if group is None:
+        return Response({"error": "Group not found."},
                         status=status.HTTP_404_NOT_FOUND)
-    
+
+    if not group.can_modify:
+        return Response({"error": "You are not a contributor and do not have "
+                        "permission to edit this workspace"},
+                        status=status.HTTP_403_FORBIDDEN)
+
     # Getting the workspaces and validation.
-    try:
-        workspaces = Workspace.objects.filter(group_id=group_id)
-        serializer = WorkspaceSerializer(workspaces, many=True)
+    workspaces = Workspace.objects.filter(group_id=group_id)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    except Workspace.DoesNotExist:
-        return Response({"error": "Workspace not found"}, 
-                        status=status.HTTP_404_NOT_FOUND)
+    return paginated_response(request, workspaces, WorkspaceSerializer)
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_workspace(request, group_id):
     """
     Creates a workspace based on the information. must be authenticated to create
-    a workspace. 
+    a workspace.
     """
+    group = resolve_group(request, group_id)
+
+    if group is None:
+        return Response({"error": "Group not found."},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    if not group.can_modify:
+        return Response({"error": "You are not a contributor and do not have "
+                        "permission to edit this workspace"},
+                        status=status.HTTP_403_FORBIDDEN)
+
     copy = request.data
     copy["group"] = group_id
 
@@ -92,64 +89,63 @@ def create_workspace(request, group_id):
 def modify_workspace_details(request, workspace_id):
     """
     Allows the user to update the information of the workspace, given it's an
-    authorized user
+    authorized user. Responds with 412 if it changed in the meantime, see
+    versioning.py.
     """
-    user = request.user.id
+    # Get the workspace and validate the user in one go
+    workspace = resolve_workspace(request, workspace_id)
 
-    # Get the workspace to see where the workspace belongs to
-    try:
-        workspace = Workspace.objects.get(id=workspace_id)
-
-        # Then validate the user to make sure user is authorized
-        group_id = workspace.group
-        try:
-            Contributor.objects.get(group=group_id, 
-                                    user=user)
-        except Contributor.DoesNotExist:
-            return Response({"error": "You do not have permission to edit this "
-                            "workspace"}, status=status.HTTP_401_UNAUTHORIZED)
-
-
-    except Workspace.DoesNotExist:
+    if workspace is None:
         return Response({"error": "Workspace not found or you do not have the "
-                    "permission to edit this workspace"}, 
+                    "permission to edit this workspace"},
                     status=status.HTTP_400_BAD_REQUEST)
 
+    if not workspace.can_modify:
+        return Response({"error": "You do not have permission to edit this "
+                        "workspace"}, status=status.HTTP_403_FORBIDDEN)
+
     # Now the serialization part and saving it
     serializer = WorkspaceSerializer(workspace, data=request.data, partial=True)
 
     if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
+        try:
+            with transaction.atomic():
+                lock_for_edit(request, workspace)
+                serializer.save()
+                touch_workspace(workspace)
+        except VersionConflict:
+            return precondition_failed(WorkspaceSerializer, workspace)
+
+        return Response(serializer.data, status=status.HTTP_200_OK,
+                        headers={"ETag": version_etag(workspace)})
+
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def delete_workspace(request, workspace_id):
     """
-    Lets the user delete a workspace given the ID of the workspace. however, 
-    the user must be authorized. 
+    Lets the user delete a workspace given the ID of the workspace. however,
+    the user must be authorized.
     """
-    user = request.user.id
+    workspace = resolve_workspace(request, workspace_id)
 
     # Make sure the workspace exists first
-    try:
-        workspace = Workspace.objects.get(id=workspace_id)
-
-    except Workspace.DoesNotExist:
+    if workspace is None:
         return Response({"error": "Workspace not found or you do not have "
-                         "permissions to edit the workspace"}, 
+                         "permissions to edit the workspace"},
                          status=status.HTTP_400_BAD_REQUEST)
 
-    # Then make sure the workspace belongs to the user 
-    try:
-        Contributor.objects.get(group=workspace.group, user=user)
-    except Contributor.DoesNotExist:
+    # Then make sure the workspace belongs to the user
+    if not workspace.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                         "workspace"}, status=status.HTTP_401_UNAUTHORIZED)
-    
-    workspace.delete()
+                         "workspace"}, status=status.HTTP_403_FORBIDDEN)
+
+    with transaction.atomic():
+        invalidate([(workspace.id, workspace.revision)])
+        workspaces_deleted([workspace.id])
+        workspace.delete()
+
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(["GET"])
@@ -159,53 +155,56 @@ def get_all_items(request, workspace_id):
     Get all items from a workspace. User has to be authorized. No need for a m-
     ethod that finds individual items.
     """
-    user = request.user.id
-
     # Check if the workspace that the user is asking for is valid.
-    try:
-        workspace = Workspace.objects.get(id=workspace_id)
+    workspace = resolve_workspace(request, workspace_id)
 
-        # Check if the user has permissions to access the workspace
-        try:
-            Contributor.objects.get(id=workspace.group.id, user=user)
-        except Contributor.DoesNotExist:
-            return Response({"error": "You do not have permission to access "
-                             "workspace."}, status=status.HTTP_401_UNAUTHORIZED)
-
-    except Workspace.DoesNotExist:
+    if workspace is None:
         return Response({"error": "Workspace does not exist or you do not have "
-                         "permission to edit this workspace."}, 
+                         "permission to edit this workspace."},
                          status=status.HTTP_400_BAD_REQUEST)
 
+    # Check if the user has permissions to access the workspace
+    if not workspace.can_modify:
+        return Response({"error": "You do not have permission to access "
+                         "workspace."}, status=status.HTTP_403_FORBIDDEN)
+
     items = Item.objects.filter(workspace=workspace_id)
-    serializer = ItemSerializer(items, many=True)
 
-    return Response(serializer.data,status=status.HTTP_200_OK)
+    # In the order they are shown in, like in the aggregate
+    return paginated_response(request, items, ItemSerializer,
+                              ("position", "id"))
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_item(request, workspace_id):
     """
-    Creates an item in the workspace. 
+    Creates an item in the workspace.
     """
-    user = request.user.id
+    workspace = resolve_workspace(request, workspace_id)
 
-    if not workspace_exists(workspace_id=workspace_id):
+    if workspace is None:
         return Response({"error": "Workspace not found or you do not have "
-                         "permissions to edit this workspace"}, 
+                         "permissions to edit this workspace"},
                          status=status.HTTP_400_BAD_REQUEST)
 
-    workspace = Workspace.objects.get(id=workspace_id)
-    if not user_can_modify(group_id=workspace.group.id, user_id=user):
+    if not workspace.can_modify:
         return Response({"error": "You do not have permissions to edit this "
-                         "workspace"}, status=status.HTTP_401_UNAUTHORIZED)
-    
+                         "workspace"}, status=status.HTTP_403_FORBIDDEN)
+
     copy = request.data
     copy["workspace"] = workspace_id
     serializer = CreateItemSerializer(data=copy)
 
     if serializer.is_valid():
-        serializer.save()
+        with transaction.atomic():
+            # New items go to the end of the workspace
+            key, rebalanced = key_for(Item.objects.filter(workspace=workspace))
+            item = serializer.save(position=key)
+            touch_workspace(workspace, [
+                (Change.ITEM, item_id, False)
+                for item_id in [item.id, *rebalanced]
+            ])
+
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     return Response(serializer.data, status=status.HTTP_400_BAD_REQUEST)
@@ -215,31 +214,31 @@ def create_item(request, workspace_id):
 def modify_item(request, item_id):
     """
     Lets the user modify an item. But we need to know that the user can access
-    the workspace. 
+    the workspace. Responds with 412 if it changed in the meantime.
     """
-    try:
-        item = Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
-        return Response({"error": "Item does not exist"}, 
-                        status=status.HTTP_400_BAD_REQUEST)
+    item = resolve_item(request, item_id)
 
-    if not workspace_exists(workspace_id=item.workspace.id):
-        return Response({"error": "Workspace does not exist or you do not have "
-                        "permissions to edit this workspace"},
+    if item is None:
+        return Response({"error": "Item does not exist"},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    workspace = Workspace.objects.get(id=item.workspace.id)
-    if not user_can_modify(group_id=workspace.group.id, user_id=request.user.id):
+    if not item.can_modify:
         return Response({"error": "You do not have permissions to edit this "
-                         "workspace."}, status=status.HTTP_401_UNAUTHORIZED)
+                         "workspace."}, status=status.HTTP_403_FORBIDDEN)
 
-    
-    item = Item.objects.get(id=item_id)
     serializer = ItemSerializer(item, data=request.data, partial=True)
 
     if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            with transaction.atomic():
+                lock_for_edit(request, item)
+                serializer.save()
+                touch_workspace(item.workspace, [(Change.ITEM, item.id, False)])
+        except VersionConflict:
+            return precondition_failed(ItemSerializer, item)
+
+        return Response(serializer.data, status=status.HTTP_200_OK,
+                        headers={"ETag": version_etag(item)})
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -249,54 +248,87 @@ def delete_item(request, item_id):
     """
     Lets the user delete an item.
     """
-    user = request.user.id
+    item = resolve_item(request, item_id)
 
-    try:
-        item = Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
-        return Response({"error": "Item does not exist"}, 
+    if item is None:
+        return Response({"error": "Item does not exist"},
                         status=status.HTTP_400_BAD_REQUEST)
-    
-    if not workspace_exists(workspace_id=item.workspace.id):
-        return Response({"error": "Workspace does not exist or you do not have "
-                         "permissions to edit this workspace. "},
-                         status=status.HTTP_400_BAD_REQUEST)
-    
-    if not user_can_modify(group_id=item.workspace.group.id, user_id=user):
+
+    if not item.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                         "workspace"}, status=status.HTTP_401_UNAUTHORIZED)
-    
-    item.delete()
+                         "workspace"}, status=status.HTTP_403_FORBIDDEN)
+
+    with transaction.atomic():
+        item_removed(item)
+        item.delete()
+
     return Response(status=status.HTTP_204_NO_CONTENT)
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def move_item(request, item_id):
+    """
+    Moves an item to another place in its workspace. Only the moved item is
+    written to.
+    """
+    item = resolve_item(request, item_id)
+
+    if item is None:
+        return Response({"error": "Item does not exist"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    if not item.can_modify:
+        return Response({"error": "You do not have permission to edit this "
+                         "workspace"}, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = MoveItemSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        siblings = Item.objects.filter(workspace=item.workspace_id) \
+                               .exclude(id=item.id)
+        key, rebalanced = key_for(siblings, **serializer.validated_data)
+
+        if key is None:
+            return Response({"error": "The item to place it next to is not in "
+                             "this workspace."},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+        Item.objects.filter(id=item.id).update(position=key,
+                                               version=F("version") + 1)
+        touch_workspace(item.workspace, [
+            (Change.ITEM, item_id, False)
+            for item_id in [item.id, *rebalanced]
+        ])
+
+    item.position = key
+    item.version += 1
+    return Response(ItemSerializer(item).data, status=status.HTTP_200_OK,
+                    headers={"ETag": version_etag(item)})
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_all_subitems(request, item_id):
     """
     Lets the user list all subitems of an item, given the item's ID.
     """
-    user = request.user.id
+    item = resolve_item(request, item_id)
 
-    if not item_exists(item_id):
+    if item is None:
         return Response({"error": "Item does not exist or you do not have "
                             "permissions to edit this workspace."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-    item = Item.objects.get(id=item_id)
-
-    if not workspace_exists(item.workspace.id):
-        return Response({"error": "Workspace does not exist or you do not "
-                            "have permissions to edit this workspace."},
-                            status=status.HTTP_400_BAD_REQUEST)
-    workspace = Workspace.objects.get(id=item.workspace.id)
-    if not user_can_modify(group_id=workspace.group.id, user_id=user):
+    if not item.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                            "workspace."}, status=status.HTTP_401_UNAUTHORIZED)
-    
+                            "workspace."}, status=status.HTTP_403_FORBIDDEN)
+
     subitems = Subitem.objects.filter(item=item_id)
-    serializer = SubitemSerializer(subitems, many=True)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return paginated_response(request, subitems, SubitemSerializer,
+                              ("position", "id"))
 
 
 @api_view(["POST"])
@@ -305,76 +337,104 @@ def create_subitem(request, item_id):
     """
     Lets the user create a subitem under an item, given the item's ID.
     """
-    user = request.user.id
+    item = resolve_item(request, item_id)
 
-    if not item_exists(item_id):
+    if item is None:
         return Response({"error": "Item does not exist or you do not have "
                             "permissions to edit this workspace."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-    item = Item.objects.get(id=item_id)
-
-    if not workspace_exists(item.workspace.id):
-        return Response({"error": "Workspace does not exist or you do not "
-                            "have permissions to edit this workspace."},
-                            status=status.HTTP_400_BAD_REQUEST)
-    
-    workspace = Workspace.objects.get(id=item.workspace.id)
-    if not user_can_modify(group_id=workspace.group.id, user_id=user):
+    if not item.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                            "workspace."}, status=status.HTTP_401_UNAUTHORIZED)
-    
+                            "workspace."}, status=status.HTTP_403_FORBIDDEN)
 
     copy = request.data
     copy["item"] = item_id
     serializer = CreateSubitemSerializer(data=copy)
 
     if serializer.is_valid():
-        serializer.save()
+        with transaction.atomic():
+            # New subitems go to the end of the item
+            key, rebalanced = key_for(Subitem.objects.filter(item=item))
+            subitem = serializer.save(position=key)
+            subitem_added(subitem, item.workspace, [
+                (Change.SUBITEM, subitem_id, False) for subitem_id in rebalanced
+            ])
+
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(["PATCH"])
+@api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def modify_subitem(request, subitem_id):
+def batch_subitems(request, workspace_id):
     """
-    Allows the user to modify the subitems in the list. 
+    Creates, updates and deletes many subitems of a workspace in one request.
+    The permissions are checked once and the whole batch is validated and app-
+    lied in one transaction, or not at all if any of the operations is invalid.
+    Responds with 412 if a subitem is not at the version an operation names.
     """
-    user = request.user.id
+    workspace = resolve_workspace(request, workspace_id)
+
+    if workspace is None:
+        return Response({"error": "Workspace not found or you do not have "
+                         "permissions to edit this workspace"},
+                         status=status.HTTP_400_BAD_REQUEST)
+
+    if not workspace.can_modify:
+        return Response({"error": "You do not have permission to edit this "
+                         "workspace."}, status=status.HTTP_403_FORBIDDEN)
+
+    batch = SubitemBatch(workspace, request.data)
 
     try:
-        subitem = Subitem.objects.get(id=subitem_id)
-    except Subitem.DoesNotExist:
-        return Response({"error": "Subitem does not exist or you do not have "
-                            "permissions to edit this workspace."},
-                            status=status.HTTP_400_BAD_REQUEST)
+        # What the batch is validated against can't change before it's written
+        with transaction.atomic():
+            if not batch.is_valid():
+                return Response(batch.errors,
+                                status=status.HTTP_400_BAD_REQUEST)
 
-    item_id = subitem.item.id
-    if not item_exists(item_id):
-        return Response({"error": "Item does not exist or you do not have "
-                            "permissions to edit this workspace."},
-                            status=status.HTTP_400_BAD_REQUEST)
+            return Response(batch.save(), status=status.HTTP_200_OK)
+    except VersionConflict:
+        return Response(batch.errors,
+                        status=status.HTTP_412_PRECONDITION_FAILED)
 
-    item = Item.objects.get(id=item_id)
+@api_view(["PATCH"])
+@permission_classes([IsAuthenticated])
+def modify_subitem(request, subitem_id):
+    """
+    Allows the user to modify the subitems in the list. Responds with 412 if
+    it changed in the meantime.
+    """
+    subitem = resolve_subitem(request, subitem_id)
 
-    if not workspace_exists(item.workspace.id):
-        return Response({"error": "Workspace does not exist or you do not "
-                            "have permissions to edit this workspace."},
+    if subitem is None:
+        return Response({"error": "Subitem does not exist or you do not have "
+                            "permissions to edit this workspace."},
                             status=status.HTTP_400_BAD_REQUEST)
-    
-    workspace = Workspace.objects.get(id=item.workspace.id)
 
-    if not user_can_modify(group_id=workspace.group.id, user_id=user):
+    if not subitem.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                            "workspace."}, status=status.HTTP_401_UNAUTHORIZED)
-    
+                            "workspace."}, status=status.HTTP_403_FORBIDDEN)
+
     serializer = SubitemSerializer(subitem, data=request.data, partial=True)
-    
+
     if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    
+        try:
+            with transaction.atomic():
+                lock_for_edit(request, subitem)
+                # Remember what the subitem counted for before it gets changed
+                old_weight = subitem.weight
+                old_status = subitem.completion_status
+                serializer.save()
+                subitem_changed(subitem, subitem.item.workspace, old_weight,
+                                old_status)
+        except VersionConflict:
+            return precondition_failed(SubitemSerializer, subitem)
+
+        return Response(serializer.data, status=status.HTTP_200_OK,
+                        headers={"ETag": version_etag(subitem)})
+
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(["DELETE"])
@@ -382,59 +442,297 @@ def modify_subitem(request, subitem_id):
 def delete_subitem(request, subitem_id):
     """
     Allows the user to delete a subitem, if they are authorized and the subitem
-    exists, that is. 
+    exists, that is.
     """
-    user = request.user.id
+    subitem = resolve_subitem(request, subitem_id)
+
+    if subitem is None:
+        return Response({"error": "Subitem does not exist or you do not have "
+                            "permissions to edit this workspace."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    if not subitem.can_modify:
+        return Response({"error": "You do not have permission to edit this "
+                            "workspace."}, status=status.HTTP_403_FORBIDDEN)
 
     try:
-        subitem = Subitem.objects.get(id=subitem_id)
-    except Subitem.DoesNotExist:
+        with transaction.atomic():
+            lock_for_edit(request, subitem)
+
+            # The counters are only moved for the row that really went away,
+            # by what it counted for then
+            deleted, _ = Subitem.objects.filter(
+                id=subitem.id, version=subitem.version).delete()
+
+            if deleted != 1:
+                raise VersionConflict()
+
+            subitem_removed(subitem, subitem.item.workspace)
+    except VersionConflict:
+        return precondition_failed(SubitemSerializer, subitem)
+
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+def workspace_etag(workspace, fieldset=None):
+    """
+    Gives the strong entity tag for the current revision of a workspace, or of
+    the fields of it in the fieldset.
+    """
+    if fieldset is None:
+        return quote_etag(f"{workspace.id}.{workspace.revision}")
+
+    return quote_etag(f"{workspace.id}.{workspace.revision}."
+                      f"{fieldset.digest()}")
+
+def not_modified(request, etag):
+    """
+    Tells whether the client already has the version with the entity tag, as
+    given by `If-None-Match`. Compressed responses carry the weak form of the
+    tag, which matches too.
+    """
+    known = parse_etags(request.headers.get("If-None-Match", ""))
+
+    return "*" in known or etag in {tag.removeprefix("W/") for tag in known}
+
+def aggregate_serializer(workspace, fieldset=None):
+    """
+    Gives the serializer of the workspace's aggregate, trimmed down to the
+    fieldset, and the prefetches it needs. These only read the columns of the
+    fields kept and are left out along with the items or the subitems.
+    """
+    serializer = prune(AggregatedWorkspaceSerializer(workspace), fieldset)
+    items = nested(serializer, "item_set")
+    subitems = None if items is None else nested(items, "subitem_set")
+    lookups = []
+
+    # The keys of the parents are needed to match the rows with them
+    if items is not None:
+        lookups.append(Prefetch(
+            'item_set', Item.objects.order_by('position', 'id')
+                .only('workspace', *columns(items))))
+
+    if subitems is not None:
+        lookups.append(Prefetch(
+            'item_set__subitem_set', Subitem.objects.order_by('position', 'id')
+                .only('item', *columns(subitems))))
+
+    return serializer, lookups
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def move_subitem(request, subitem_id):
+    """
+    Moves a subitem to another place in its item or under another item. Only
+    the moved subitem is written to, besides the progress counters.
+    """
+    subitem = resolve_subitem(request, subitem_id)
+
+    if subitem is None:
         return Response({"error": "Subitem does not exist or you do not have "
                             "permissions to edit this workspace."},
                             status=status.HTTP_400_BAD_REQUEST)
-    item_id = subitem.item.id
-    if not item_exists(item_id):
+
+    if not subitem.can_modify:
+        return Response({"error": "You do not have permission to edit this "
+                            "workspace."}, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = MoveSubitemSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # The subitem stays under the same item unless told otherwise
+    source = subitem.item
+    target_id = serializer.validated_data.pop("item", source.id)
+    target = source if target_id == source.id else \
+        resolve_item(request, target_id)
+
+    if target is None:
         return Response({"error": "Item does not exist or you do not have "
                             "permissions to edit this workspace."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-    item = Item.objects.get(id=item_id)
+    if target is not source and not target.can_modify:
+        return Response({"error": "You do not have permission to edit this "
+                            "workspace."}, status=status.HTTP_403_FORBIDDEN)
+
+    with transaction.atomic():
+        siblings = Subitem.objects.filter(item=target.id).exclude(id=subitem.id)
+        key, rebalanced = key_for(siblings, **serializer.validated_data)
 
-    if not workspace_exists(item.workspace.id):
-        return Response({"error": "Workspace does not exist or you do not "
-                            "have permissions to edit this workspace."},
+        if key is None:
+            return Response({"error": "The subitem to place it next to is not "
+                             "under that item."},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+        Subitem.objects.filter(id=subitem.id).update(
+            item=target.id, position=key, version=F("version") + 1)
+        subitem_moved(subitem, source, target, [
+            (Change.SUBITEM, subitem_id, False) for subitem_id in rebalanced
+        ])
+
+    subitem.item = target
+    subitem.position = key
+    subitem.version += 1
+    return Response(SubitemSerializer(subitem).data, status=status.HTTP_200_OK,
+                    headers={"ETag": version_etag(subitem)})
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_workspace_aggr_content(request, workspace_id):
+    """
+    Gets all the items and subitems in a workspace. Responds with 304 if the
+    client already has the current revision as given by `If-None-Match`. With
+    `?stream=1` the JSON is written out while it is read from the database (see
+    streaming.py), which is the same output for workspaces too large to hold.
+    Other formats than JSON are never streamed. `?fields=` and `?exclude=` trim
+    the aggregate down (see kronathens/fieldsets.py).
+    """
+    workspace = resolve_workspace(request, workspace_id)
+
+    if workspace is None:
+        return Response({"error": "Workspace not found or you do not have "
+                            "permission to edit it."},
                             status=status.HTTP_400_BAD_REQUEST)
-    
-    workspace = Workspace.objects.get(id=item.workspace.id)
-    if not user_can_modify(group_id=workspace.group.id, user_id=user):
+
+    if not workspace.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                            "workspace."}, status=status.HTTP_401_UNAUTHORIZED)
-    
-    subitem.delete()
+                            "workspace"}, status=status.HTTP_403_FORBIDDEN)
 
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    try:
+        fieldset = requested_fieldset(request)
+        serializer, lookups = aggregate_serializer(workspace, fieldset)
+    except FieldsetError as error:
+        return Response({"error": str(error)},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Nothing has changed since the client last fetched it
+    etag = workspace_etag(workspace, fieldset)
+
+    if not_modified(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": etag})
+
+    data = get_aggregate(workspace, fieldset)
+
+    if data is None and request.query_params.get("stream") == "1" and \
+            request.accepted_renderer.format == "json" and \
+            streamable(fieldset):
+        # Not cached either as that would hold the whole aggregate after all
+        return StreamingHttpResponse(stream_aggregate(workspace, fieldset),
+                                     content_type="application/json",
+                                     headers={"ETag": etag})
+
+    if data is None:
+        # Only load the tree once we know the user may see it (avoids N + 1
+        # queries)
+        prefetch_related_objects([workspace], *lookups)
+        data = serializer.data
+        set_aggregate(workspace, data, fieldset)
+
+    return Response(data, status=status.HTTP_200_OK, headers={"ETag": etag})
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def get_workspace_aggr_content(request, workspace_id):
+def get_workspace_changes(request, workspace_id):
     """
-    Gets all the items and subitems in a workspace. 
+    Gets what changed in a workspace since the revision given by `?since=`.
+    Each changed item or subitem is listed once with its current state, or as
+    deleted. Responds with 410 if the changes have been compacted away, in
+    which case the client has to fetch the whole workspace again.
     """
-    user = request.user.id
+    workspace = resolve_workspace(request, workspace_id)
 
-    if not workspace_exists(workspace_id):
+    if workspace is None:
         return Response({"error": "Workspace not found or you do not have "
                             "permission to edit it."},
                             status=status.HTTP_400_BAD_REQUEST)
-    
-    workspace = Workspace.objects.prefetch_related(
-        'item_set__subitem_set'  # to avoid N + 1 query problems
-    ).get(id=workspace_id)
 
-    if not user_can_modify(group_id=workspace.group.id, user_id=user):
+    if not workspace.can_modify:
         return Response({"error": "You do not have permission to edit this "
-                            "workspace"}, status=status.HTTP_401_UNAUTHORIZED)
+                            "workspace"}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        since = int(request.query_params.get("since", ""))
+    except ValueError:
+        return Response({"error": "A valid revision is required for `since`."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    if since < workspace.compacted_revision:
+        return Response({"error": "Changes since this revision are no longer "
+                         "available. Fetch the whole workspace instead.",
+                         "revision": workspace.revision},
+                         status=status.HTTP_410_GONE)
+
+    # Only the latest change of each object matters
+    latest = {}
+    for kind, object_id, deleted, sequence in Change.objects.filter(
+            workspace=workspace, sequence__gt=since,
+            sequence__lte=workspace.revision,
+    ).order_by("sequence", "id").values_list("kind", "object_id", "deleted",
+                                             "sequence"):
+        latest[kind, object_id] = (deleted, sequence)
+
+    return Response({
+        "revision": workspace.revision,
+        "workspace": WorkspaceSerializer(workspace).data,
+        "changes": describe(workspace, latest),
+    }, status=status.HTTP_200_OK, headers={"ETag": workspace_etag(workspace)})
 
-    serializer = AggregatedWorkspaceSerializer(workspace)
+@api_view(["GET"])
+@permission_classes([IsSuperuser])
+def get_aggregate_cache_stats(request):
+    """
+    Reports the hits and misses of the aggregate cache in this process so that
+    the cache can be sized from real traffic. Only for superusers.
+    """
+    return Response(stats.as_dict(), status=status.HTTP_200_OK)
 
-    return Response(serializer.data, status=status.HTTP_200_OK) 
\ No newline at end of file
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_checklists(request):
+    """
+    Searches the workspaces, items and subitems of every group the user cont-
+    ributes to for `?q=`. Hits come best first, `?page_size=` at a time, with
+    links to the next and previous pages, which hold a `?cursor=`.
+    """
+    try:
+        page_size = min(max(int(request.query_params.get(
+            "page_size", SEARCH_PAGE_SIZE)), 1), MAX_SEARCH_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "`page_size` must be a number."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        cursor = request.query_params.get("cursor")
+        key, backwards = (None, False) if cursor is None \
+            else decode_cursor(cursor)
+    except ValueError:
+        return Response({"error": "`cursor` is not valid."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # One extra hit tells whether there is another page that way
+        hits = search(request.user, request.query_params.get("q", ""),
+                      page_size + 1, key, backwards)
+    except SearchUnavailable:
+        return Response({"error": "Search is not available on this database."},
+                        status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    more = len(hits) > page_size
+    hits = hits[1:] if backwards and more else hits[:page_size]
+
+    # Coming from a page means that there is one the other way
+    has_next = more if not backwards else key is not None
+    has_previous = more if backwards else key is not None
+    url = request.build_absolute_uri()
+
+    return Response({
+        "next": replace_query_param(url, "cursor",
+                                    encode_cursor(hits[-1][0]))
+                if has_next and hits else None,
+        "previous": replace_query_param(url, "cursor",
+                                        encode_cursor(hits[0][0], True))
+                    if has_previous and hits else None,
+        "results": [hit for _, hit in hits],
+    }, status=status.HTTP_200_OK)
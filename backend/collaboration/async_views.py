@@ -0,0 +1,29 @@
+"""
+Async versions of the hottest collaboration views (see kronathens/asyncapi.py).
+They behave exactly like their counterparts in views.py.
+"""
+
+from rest_framework import status
+
+from kronathens.asyncapi import async_api_view, api_response
+from kronathens.fieldsets import FieldsetError
+from kronathens.pagination import apaginated_data
+
+from . import views
+from .models import Group
+from .serializers import GroupSerializer
+
+@async_api_view(views.get_all_groups)
+async def get_all_groups(request):
+    """
+    Getting the current user and listing out their group items.
+    """
+    groups = Group.objects.filter(creator=request.user.id)
+
+    try:
+        data = await apaginated_data(request, groups, GroupSerializer)
+    except FieldsetError as error:
+        return api_response({"error": str(error)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    return api_response(data)
@@ -1,3 +1,170 @@
-from django.test import TestCase
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from checklists.caching import _key
+from checklists.models import Workspace
+from kronathens.compiled import CompiledSerializer
+from kronathens.testing import (AsyncViewParityTestCase, QueryBudgetTestCase,
+                                build_fixture)
+
+from . import async_views, urls, views
+from .models import Group
+from .serializers import GroupSerializer
+
+class QueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every collaboration route runs a fixed number of queries, no matter how
+    many groups, contributors and workspaces there are.
+    """
+    def test_every_route_has_a_budget(self):
+        self.assertBudgetsCover(urls.urlpatterns, urls.app_name)
+
+    def test_get_all_groups(self):
+        self.assertQueryBudget("collaboration:group-all", lambda client, f:
+            client.get(reverse("collaboration:group-all")))
+
+    def test_get_group_from_id(self):
+        self.assertQueryBudget("collaboration:group-get", lambda client, f:
+            client.get(reverse("collaboration:group-get", args=[f.group])))
+
+    def test_create_group(self):
+        self.assertQueryBudget("collaboration:group-create", lambda client, f:
+            client.post(reverse("collaboration:group-create"),
+                        {"name": "New"}, format="json"))
+
+    def test_modify_group_details(self):
+        self.assertQueryBudget("collaboration:group-update", lambda client, f:
+            client.patch(reverse("collaboration:group-update", args=[f.group]),
+                         {"description": "Changed"}, format="json"))
+
+    def test_delete_group(self):
+        self.assertQueryBudget("collaboration:group-delete", lambda client, f:
+            client.delete(reverse("collaboration:group-delete",
+                                  args=[f.group])))
+
+    def test_toggle_join_group(self):
+        # Leaves the group, which closes the sockets on all of its workspaces
+        self.assertQueryBudget("collaboration:group-join-toggle",
+            lambda client, f: client.post(
+                reverse("collaboration:group-join-toggle", args=[f.group]),
+                {}, format="json"))
+
+class CompiledSerializerTests(APITestCase):
+    """
+    The compiled group serializer gives the same data as the DRF one.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        build_fixture("compiled", 3)
+
+    def test_groups(self):
+        compiled = CompiledSerializer(GroupSerializer)
+        groups = Group.objects.order_by("id")
+
+        self.assertGreater(len(groups), 0)
+        self.assertEqual(compiled.represent(compiled.values(groups)),
+                         GroupSerializer(groups, many=True).data)
+
+class FieldsetTests(APITestCase):
+    """
+    `?fields=` and `?exclude=` trim the groups down.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("fieldset", 2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.fixture.user)
+
+    def test_get_group_from_id(self):
+        url = reverse("collaboration:group-get", args=[self.fixture.group])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"exclude": "description"})
+
+        self.assertEqual(response.json(), {
+            "id": self.fixture.group,
+            "creator": self.fixture.user.id,
+            "name": Group.objects.get(id=self.fixture.group).name,
+        })
+        self.assertNotIn('"description"', queries[0]["sql"])
+
+    def test_get_all_groups(self):
+        response = self.client.get(reverse("collaboration:group-all"),
+                                   {"fields": "name"})
+
+        self.assertEqual({tuple(group) for group in response.json()["results"]},
+                         {("name",)})
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse("collaboration:group-all"),
+                                   {"fields": "nope"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Unknown field `nope`."})
+
+class DeleteGroupTests(APITestCase):
+    """
+    Deleting a group drops the cached aggregates of its workspaces.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("delete", 2)
+
+    def setUp(self):
+        # The IDs and revisions are given out again by the next tests
+        caches["aggregates"].clear()
+        self.addCleanup(caches["aggregates"].clear)
+        self.client.force_authenticate(self.fixture.user)
+
+    def test_cached_aggregates(self):
+        workspaces = Workspace.objects.filter(group=self.fixture.group)
+        revisions = dict(workspaces.values_list("id", "revision"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for workspace_id in revisions:
+                self.client.get(reverse("checklists:aggregate",
+                                        args=[workspace_id]))
+
+        cached = [caches["aggregates"].get(_key(workspace_id),
+                                           version=revision)
+                  for workspace_id, revision in revisions.items()]
+        self.assertNotIn(None, cached)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("collaboration:group-delete",
+                                                  args=[self.fixture.group]))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(workspaces.exists())
+
+        for workspace_id, revision in revisions.items():
+            self.assertIsNone(caches["aggregates"].get(_key(workspace_id),
+                                                       version=revision))
+
+class AsyncViewParityTests(AsyncViewParityTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = build_fixture("parity", 3)
+
+    def test_get_all_groups(self):
+        same = partial(self.assertSameResponses, views.get_all_groups,
+                       async_views.get_all_groups,
+                       reverse("collaboration:group-all"))
+        user = self.fixture.user
+
+        response = same(user=user, data={"page_size": 2})
+        query = parse_qs(urlsplit(response.data["next"]).query)
+        same(user=user, data={"page_size": 2, "cursor": query["cursor"][0]})
+        same(user=user, data={"paginate": "false", "fields": "name"})
+        self.assertEqual(same(user=user, data={"fields": "nope"})
+                         .status_code, 400)
+        self.assertEqual(same().status_code, 401)
+        self.assertEqual(same(method="delete", user=user).status_code, 405)
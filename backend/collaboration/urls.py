@@ -1,11 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# The hot read endpoints can be served by async views under ASGI
+hot = async_views if settings.ASYNC_VIEWS else views
+
+app_name = 'collaboration'
 
 urlpatterns = [
-    path('groups/all/', views.get_all_groups),
-    path('groups/get/<int:group_id>/', views.get_group_from_id),
-    path('groups/create/', views.create_group),
-    path('groups/update/<int:group_id>/', views.modify_group_details),
-    path('groups/delete/<int:group_id>/', views.delete_group),
-    path('groups/join/toggle/<int:group_id>/', views.toggle_join_group)
+    path('groups/all/', hot.get_all_groups, name='group-all'),
+    path('groups/get/<int:group_id>/', views.get_group_from_id, name='group-get'),
+    path('groups/create/', views.create_group, name='group-create'),
+    path('groups/update/<int:group_id>/', views.modify_group_details, name='group-update'),
+    path('groups/delete/<int:group_id>/', views.delete_group, name='group-delete'),
+    path('groups/join/toggle/<int:group_id>/', views.toggle_join_group, name='group-join-toggle')
 ]
\ No newline at end of file
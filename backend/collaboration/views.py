@@ -1,13 +1,32 @@
+from django.db import transaction
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
 from accounts.models import User
+from accounts.tokens import access_token_for
+from checklists.caching import invalidate
+from checklists.events import workspaces_deleted, access_revoked
+from checklists.models import Workspace
+from kronathens.fieldsets import FieldsetError, requested_fieldset, prune, \
+                                 columns
+from kronathens.pagination import paginated_response
 
 from .models import *
 from .serializers import *
 
+def with_fresh_token(response, user):
+    """
+    Sends a new access token along with the response when the user's groups
+    have changed, so that the groups it claims are correct again.
+    """
+    token = access_token_for(user)
+
+    if token is not None:
+        response["X-Access-Token"] = str(token)
+
+    return response
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -19,20 +38,26 @@ def get_all_groups(request):
     user = request.user.id
 
     groups = Group.objects.filter(creator=user)
-    serializer = GroupSerializer(groups, many=True)
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return paginated_response(request, groups, GroupSerializer)
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_group_from_id(request, group_id):
     """
     Getting the group/collection information based on the ID of the group. 
+    `?fields=` and `?exclude=` trim it down (see kronathens/fieldsets.py).
     """
     user = request.user.id
 
-    group = Group.objects.get(creator=user, id=group_id)
-    serializer = GroupSerializer(group)
+    try:
+        serializer = prune(GroupSerializer(), requested_fieldset(request))
+    except FieldsetError as error:
+        return Response({"error": str(error)},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    serializer.instance = Group.objects.only(*columns(serializer)) \
+        .get(creator=user, id=group_id)
 
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -55,7 +80,9 @@ def create_group(request):
         
         # Add the creator as a contributor as we create a group
         Contributor.objects.create(user_id=request.user.id, group_id=group.id)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return with_fresh_token(Response(serializer.data,
+                                         status=status.HTTP_201_CREATED),
+                                request.user)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -88,7 +115,15 @@ def delete_group(request, group_id):
     
     try:
         group = Group.objects.get(creator=user, id=group_id)
-        group.delete()
+
+        # The workspaces go with the group so their aggregates have to as well
+        with transaction.atomic():
+            workspaces = list(Workspace.objects.filter(group=group)
+                                               .values_list("id", "revision"))
+            invalidate(workspaces)
+            workspaces_deleted(workspace_id for workspace_id, _ in workspaces)
+            group.delete()
+
         return Response(status=status.HTTP_204_NO_CONTENT)
     except:
         return Response({"error": "Group not found or you don't have permission."},
@@ -110,7 +145,13 @@ def toggle_join_group(request, group_id):
             # Delete if found
             contributor = Contributor.objects.get(group_id=group_id, user_id=user)
             contributor.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+
+            # Close any sockets the user still has open on the group's work-
+            # spaces
+            access_revoked(Workspace.objects.filter(group_id=group_id)
+                                            .values_list("id", flat=True), user)
+            return with_fresh_token(Response(status=status.HTTP_204_NO_CONTENT),
+                                    request.user)
         
         except Contributor.DoesNotExist:
             # Create if not found
@@ -120,7 +161,9 @@ def toggle_join_group(request, group_id):
             serializer = ContributorSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
+                return with_fresh_token(Response(
+                    serializer.data, status=status.HTTP_201_CREATED),
+                    request.user)
 
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
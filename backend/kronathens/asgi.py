@@ -2,6 +2,8 @@
 ASGI config for kronathens project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django as usual and WebSockets go to the consumers listed in the
+apps' routing modules.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kronathens.settings')
 
-application = get_asgi_application()
+# Django has to be set up before anything importing models is imported
+django_asgi_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import OriginValidator
+from django.conf import settings
+
+from accounts.middleware import JWTAuthMiddleware
+from checklists.routing import websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_application,
+    # Browsers may open sockets from the same origins they may call the API
+    'websocket': OriginValidator(
+        JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+        settings.CORS_ALLOWED_ORIGINS,
+    ),
+})
@@ -0,0 +1,122 @@
+"""
+Async views for the hot read endpoints. DRF only runs views synchronously, so
+under ASGI each request to a DRF view holds a thread of the pool for as long
+as it runs. These views run on the event loop instead and only hand the work
+that has to be synchronous, i.e. the database, over to a thread.
+
+Each one stands in for a DRF view. Only what a GET needs is done here, with
+DRF's own pieces: its content negotiation, renderers, responses and error
+messages. Anything else, e.g. OPTIONS or a method the view doesn't answer, is
+handed to the DRF view, so clients cannot tell the two apart (see AsyncView-
+ParityTests). They are routed in place of the DRF views when `ASYNC_VIEWS` is
+set, which only pays off under `asgi.py`.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (AuthenticationFailed, NotAcceptable,
+                                       NotAuthenticated)
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from accounts.authentication import CachedJWTAuthentication, aauthenticate
+
+def api_response(data=None, status=status.HTTP_200_OK, headers=None):
+    """
+    Responds with the data in the format `async_api_view` negotiated with the
+    client.
+    """
+    return Response(data, status=status, headers=headers)
+
+def _renderers():
+    # The browsable API needs a DRF view so it's left out
+    return [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+            if renderer.format != "api"]
+
+def _forced(request):
+    # Set on the requests of a batch, which was authenticated already (see
+    # batch.py), and by DRF's test client
+    user = getattr(request, "_force_auth_user", None)
+
+    if user is None:
+        return None
+
+    return user, getattr(request, "_force_auth_token", None)
+
+def _unauthorized(request, detail):
+    return api_response(
+        detail if isinstance(detail, (list, dict)) else {"detail": detail},
+        status=status.HTTP_401_UNAUTHORIZED,
+        headers={"WWW-Authenticate":
+                 CachedJWTAuthentication().authenticate_header(request)})
+
+def async_api_view(drf_view):
+    """
+    Turns an async function into a view standing in for a DRF function view
+    that only lets authenticated users in. It answers the same methods but for
+    OPTIONS, which is left to the DRF view, and only to authenticated users.
+    """
+    allowed = drf_view.cls().allowed_methods
+    methods = [method for method in allowed if method != "OPTIONS"]
+    headers = {"Allow": ", ".join(allowed)}
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return await sync_to_async(drf_view)(request, *args,
+                                                     **kwargs)
+
+            # Picked first like DRF does, so that errors come in the format
+            # asked for too
+            renderers = _renderers()
+
+            try:
+                renderer, media_type = DefaultContentNegotiation() \
+                    .select_renderer(Request(request), renderers)
+            except NotAcceptable as error:
+                renderer, media_type = renderers[0], renderers[0].media_type
+                response = api_response({"detail": error.detail},
+                                        status=error.status_code)
+            else:
+                request.accepted_renderer = renderer
+                response = await respond(request, *args, **kwargs)
+
+            if isinstance(response, Response):
+                response.accepted_renderer = renderer
+                response.accepted_media_type = media_type
+                response.renderer_context = {"request": request}
+                response.render()
+
+            for name, value in headers.items():
+                response.setdefault(name, value)
+
+            if len(renderers) > 1:
+                patch_vary_headers(response, ["Accept"])
+
+            return response
+
+        async def respond(request, *args, **kwargs):
+            try:
+                authenticated = _forced(request) or \
+                    await aauthenticate(request)
+            except AuthenticationFailed as error:
+                return _unauthorized(request, error.detail)
+
+            if authenticated is None:
+                return _unauthorized(request, NotAuthenticated.default_detail)
+
+            request.user, request.auth = authenticated
+
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
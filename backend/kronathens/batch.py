@@ -0,0 +1,202 @@
+"""
+Runs several API requests in one, e.g. everything a screen of the frontend
+needs to render. The batch is authenticated once and its requests are handed
+to the views of their routes in-process, one after the other, so they skip
+the round-trip, the middleware and the token of their own. A request looks
+like
+
+    {"method": "GET", "path": "/api/checklists/workspace/all/1/"}
+
+with an optional JSON `body` and `headers`, e.g. `If-None-Match`. Each one is
+answered with its status, headers and body, in the order they were sent.
+
+With `"atomic": true` the requests share one transaction. The batch stops at
+the first request that fails and everything written before it is rolled back.
+The requests after it are not run and are answered with 424.
+"""
+
+import json
+import logging
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Headers of the batch that are not passed on, as each request has its own
+_OWN_HEADERS = ("CONTENT_TYPE", "CONTENT_LENGTH", "HTTP_ACCEPT",
+                "HTTP_ACCEPT_ENCODING", "HTTP_IF_")
+
+# Headers that describe the response as it would have been sent on its own
+_SENT_HEADERS = {"content-type", "content-length", "vary"}
+
+class BatchRequestSerializer(serializers.Serializer):
+    """
+    One of the requests of a batch.
+    """
+    method = serializers.ChoiceField(["GET", "POST", "PUT", "PATCH",
+                                      "DELETE"])
+    path = serializers.RegexField(r"^/api/", max_length=2000)
+    body = serializers.JSONField(required=False, allow_null=True)
+    headers = serializers.DictField(child=serializers.CharField(),
+                                    required=False)
+
+    def validate_path(self, value):
+        # Resolved the way it will be run, so that no spelling of the path
+        # gets around this
+        try:
+            match = resolve(_path_info(value))
+        except Resolver404:
+            return value
+
+        if match.func is batch:
+            raise serializers.ValidationError("Batches can't be nested.")
+
+        return value
+
+class BatchSerializer(serializers.Serializer):
+    """
+    The requests of a batch and whether they run in one transaction.
+    """
+    requests = serializers.ListField(child=BatchRequestSerializer(),
+                                     allow_empty=False)
+    atomic = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f"A batch has at most {settings.BATCH_MAX_REQUESTS} requests.")
+
+        return value
+
+def _path_info(path):
+    # Decoded the way WSGI servers give it
+    return unquote_to_bytes(urlsplit(path).path).decode("iso-8859-1")
+
+def _subrequest(request, method, path, body, headers):
+    """
+    Builds the request for one request of the batch. It is already authenti-
+    cated as the user of the batch.
+    """
+    url = urlsplit(path)
+    content = b"" if body is None else json.dumps(body).encode()
+    environ = {key: value for key, value in request.META.items()
+               if not key.startswith(_OWN_HEADERS)}
+
+    environ.update({
+        "REQUEST_METHOD": method,
+        "PATH_INFO": _path_info(path),
+        "QUERY_STRING": url.query,
+        # The responses are put together as JSON
+        "HTTP_ACCEPT": "application/json",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(content)),
+        "wsgi.input": BytesIO(content),
+    })
+
+    for name, value in headers.items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+    subrequest = WSGIRequest(environ)
+    # Taken in place of the token by DRF's views and by the async ones (see
+    # asyncapi.py)
+    subrequest._force_auth_user = request.user
+    subrequest._force_auth_token = request.auth
+
+    return subrequest
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+def _body(response):
+    # DRF's and the async views' responses still hold their data
+    if hasattr(response, "data"):
+        return response.data
+
+    if not response.streaming:
+        content = response.content
+    elif response.is_async:
+        content = b"".join(async_to_sync(_collect)(response.streaming_content))
+    else:
+        content = b"".join(response.streaming_content)
+
+    return json.loads(content) if content else None
+
+def _dispatch(request, method, path, body=None, headers=None):
+    """
+    Runs one request of the batch and gives back its response.
+    """
+    subrequest = _subrequest(request, method, path, body, headers or {})
+
+    try:
+        match = resolve(subrequest.path_info)
+    except Resolver404:
+        return {"status": status.HTTP_404_NOT_FOUND, "headers": {},
+                "body": {"error": f"No route for {path}."}}
+
+    subrequest.resolver_match = match
+    view = async_to_sync(match.func) if iscoroutinefunction(match.func) \
+        else match.func
+
+    try:
+        response = view(subrequest, *match.args, **match.kwargs)
+        data = _body(response)
+    except Exception:
+        # Would have been a 500 on its own, the other requests still count
+        logger.exception("Batched %s %s failed", method, path)
+        return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "headers": {}, "body": {"error": "Server error."}}
+
+    return {
+        "status": response.status_code,
+        "headers": {name: value for name, value in response.items()
+                    if name.lower() not in _SENT_HEADERS},
+        "body": data,
+    }
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    """
+    Runs the requests of the batch and responds with all of their responses.
+    Must be authenticated, which the requests are then too.
+    """
+    serializer = BatchSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    requests = serializer.validated_data["requests"]
+
+    if not serializer.validated_data["atomic"]:
+        return Response({"responses": [
+            _dispatch(request, **subrequest) for subrequest in requests
+        ]}, status=status.HTTP_200_OK)
+
+    responses = []
+
+    with transaction.atomic():
+        for subrequest in requests:
+            responses.append(_dispatch(request, **subrequest))
+
+            if responses[-1]["status"] >= 400:
+                transaction.set_rollback(True)
+                break
+
+    committed = responses[-1]["status"] < 400
+    responses += [{"status": status.HTTP_424_FAILED_DEPENDENCY, "headers": {},
+                   "body": {"error": "Not run as an earlier request of the "
+                            "batch failed."}}
+                  for _ in requests[len(responses):]]
+
+    return Response({"responses": responses, "committed": committed},
+                    status=status.HTTP_200_OK)
@@ -0,0 +1,127 @@
+"""
+Compiled versions of the model serializers of the list endpoints. A DRF seria-
+lizer with `many=True` loads a model instance per row and then goes through
+every field of it, which on long lists takes far more time than the query.
+Since the lists are read-only, a compiled serializer works out once per class
+which column each field is read from, lets the database hand back only those
+columns as tuples through `.values_list()` and turns each row into the same
+dict the serializer would have given.
+
+Only fields that read a column of the model itself can be compiled, which is
+all the list serializers have. Anything else, e.g. a nested serializer or a
+`SerializerMethodField`, is refused rather than represented differently.
+"""
+
+from functools import lru_cache
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import fields, relations, serializers
+
+from .fieldsets import prune
+from .instrumentation import timed
+
+# Fields that represent the values the database gives back as they are
+_PLAIN = (fields.IntegerField, fields.CharField, fields.BooleanField)
+
+class CompiledSerializer:
+    """
+    Reads the fields of `serializer_class` from named rows of `.values_list()`,
+    only those of the fieldset if one is given (see fieldsets.py). The rows
+    always have the primary key and the columns in `keys`, for the pagination
+    to find its place by.
+    """
+    def __init__(self, serializer_class, fieldset=None, keys=()):
+        serializer = prune(serializer_class(), fieldset)
+        model = getattr(getattr(serializer, "Meta", None), "model", None)
+
+        if model is None:
+            raise ImproperlyConfigured(f"{serializer_class.__name__} is not a "
+                                       "model serializer.")
+
+        self.names = []
+        self.columns = []
+        # The fields whose values have to be converted, by name
+        self.converters = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            self.names.append(name)
+            self.columns.append(self._column(serializer_class, model, name,
+                                             field))
+
+            if isinstance(field, relations.PrimaryKeyRelatedField):
+                if field.pk_field is not None:
+                    self.converters.append((name, field.pk_field))
+            elif not isinstance(field, _PLAIN):
+                self.converters.append((name, field))
+
+        self.selected = list(dict.fromkeys(self.columns + list(keys)
+                                           + [model._meta.pk.attname]))
+        self.read = None
+
+        # Rows are zipped with the names as they are if the columns come in the
+        # same order, which they do unless two fields read the same one. The
+        # keys and the primary key at the end are left out by zip.
+        if self.selected[:len(self.columns)] != self.columns:
+            indices = [self.selected.index(column) for column in self.columns]
+            # itemgetter only gives back a tuple for more than one index
+            self.read = itemgetter(*indices, *indices[:1])
+
+    def _column(self, serializer_class, model, name, field):
+        unsupported = ImproperlyConfigured(
+            f"{serializer_class.__name__}.{name} can't be compiled as it "
+            "doesn't read a column of the model.")
+
+        if field.source == "*" or len(field.source_attrs) != 1 or \
+                isinstance(field, (serializers.BaseSerializer,
+                                   relations.ManyRelatedField)) or \
+                isinstance(field, relations.RelatedField) and \
+                not isinstance(field, relations.PrimaryKeyRelatedField):
+            raise unsupported
+
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise unsupported
+
+        if not model_field.concrete or model_field.many_to_many:
+            raise unsupported
+
+        return field.source
+
+    def values(self, queryset):
+        """
+        Narrows the queryset down to the rows this serializer reads.
+        """
+        return queryset.values_list(*self.selected, named=True)
+
+    def represent(self, rows):
+        """
+        Gives the representation of each row, like `.data` of the serializer
+        with `many=True` would.
+        """
+        names = self.names
+
+        with timed("serialize"):
+            if self.read is None:
+                data = [dict(zip(names, row)) for row in rows]
+            else:
+                data = [dict(zip(names, self.read(row))) for row in rows]
+
+            for name, field in self.converters:
+                for item in data:
+                    if item[name] is not None:
+                        item[name] = field.to_representation(item[name])
+
+        return data
+
+@lru_cache(maxsize=256)
+def compile_serializer(serializer_class, fieldset=None, keys=()):
+    """
+    The compiled version of a serializer class, made once per class, fieldset
+    and keys. Fieldsets come from the clients so only so many are kept.
+    """
+    return CompiledSerializer(serializer_class, fieldset, keys)
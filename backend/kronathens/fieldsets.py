@@ -0,0 +1,162 @@
+"""
+Sparse fieldsets for the read endpoints. A client names the fields it wants
+with `?fields=` or the ones it doesn't with `?exclude=`, both comma separated.
+Fields of nested serializers are named by their path, e.g.
+
+    ?fields=id,name,item_set.id,item_set.subitem_set.id
+    ?exclude=description,item_set.subitem_set.content
+
+Naming a nested field in `fields` keeps the serializer it is nested in, with
+only the fields named under it, and leaving all of them out keeps every one.
+
+The fields left out are taken out of the serializer and the columns they read
+can be left out of the query, see `columns`.
+"""
+
+import hashlib
+
+from rest_framework.serializers import BaseSerializer
+
+class FieldsetError(ValueError):
+    """
+    Raised for fields that the serializer doesn't have.
+    """
+
+class Fieldset:
+    """
+    The fields to keep at one level of a serializer, along with the fieldsets
+    of the serializers nested in it.
+    """
+    def __init__(self):
+        # None keeps every field that isn't excluded
+        self.include = None
+        self.exclude = set()
+        self.nested = {}
+
+    @classmethod
+    def parse(cls, fields="", exclude=""):
+        root = cls()
+
+        for path in _paths(fields):
+            fieldset = root
+
+            for name in path[:-1]:
+                fieldset.keep(name)
+                fieldset = fieldset.child(name)
+
+            fieldset.keep(path[-1])
+
+        for path in _paths(exclude):
+            fieldset = root
+
+            for name in path[:-1]:
+                fieldset = fieldset.child(name)
+
+            fieldset.exclude.add(path[-1])
+
+        return root
+
+    def keep(self, name):
+        if self.include is None:
+            self.include = set()
+
+        self.include.add(name)
+
+    def child(self, name):
+        return self.nested.setdefault(name, Fieldset())
+
+    def keeps(self, name):
+        return (self.include is None or name in self.include) and \
+            name not in self.exclude
+
+    def __str__(self):
+        # The same for every way of writing the same fieldset
+        parts = [",".join(sorted(self.include)) if self.include is not None
+                 else "*"]
+        parts += [f"-{name}" for name in sorted(self.exclude)]
+        parts += [f"{name}({nested})" for name, nested
+                  in sorted(self.nested.items())]
+
+        return ";".join(parts)
+
+    def digest(self):
+        """
+        A short name for the fieldset, e.g. for cache keys and entity tags.
+        """
+        return hashlib.sha1(str(self).encode()).hexdigest()[:16]
+
+    def __eq__(self, other):
+        return isinstance(other, Fieldset) and str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+def _paths(value):
+    return [path.split(".") for path in
+            (part.strip() for part in value.split(","))
+            if path and "" not in path.split(".")]
+
+def requested_fieldset(request):
+    """
+    Gives the fieldset the request asks for, or None if it wants every field.
+    Works on DRF and plain Django requests alike.
+    """
+    fields = request.GET.get("fields", "")
+    exclude = request.GET.get("exclude", "")
+
+    if not fields and not exclude:
+        return None
+
+    return Fieldset.parse(fields, exclude)
+
+def prune(serializer, fieldset, prefix=""):
+    """
+    Takes the fields that the fieldset leaves out out of the serializer and
+    out of the serializers nested in it. Returns the serializer.
+    """
+    if fieldset is None:
+        return serializer
+
+    named = (fieldset.include or set()) | fieldset.exclude | \
+        set(fieldset.nested)
+    unknown = sorted(named - set(serializer.fields))
+
+    if unknown:
+        raise FieldsetError(f"Unknown field `{prefix}{unknown[0]}`.")
+
+    for name in list(serializer.fields):
+        if not fieldset.keeps(name):
+            del serializer.fields[name]
+            continue
+
+        if name not in fieldset.nested:
+            continue
+
+        field = serializer.fields[name]
+        nested = getattr(field, "child", field)
+
+        if not isinstance(nested, BaseSerializer):
+            raise FieldsetError(f"`{prefix}{name}` has no fields of its own.")
+
+        prune(nested, fieldset.nested[name], f"{prefix}{name}.")
+
+    return serializer
+
+def nested(serializer, name):
+    """
+    The serializer nested in `serializer` as `name`, or None if it was pruned.
+    """
+    field = serializer.fields.get(name)
+
+    return None if field is None else getattr(field, "child", field)
+
+def columns(serializer):
+    """
+    The names of the model fields that the fields of a model serializer read,
+    for `.only()`. Nested serializers don't read a column of their own.
+    """
+    model = serializer.Meta.model
+    concrete = {field.name for field in model._meta.concrete_fields}
+
+    return [field.source for field in serializer.fields.values()
+            if field.source in concrete]
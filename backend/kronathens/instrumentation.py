@@ -0,0 +1,219 @@
+"""
+Measures where the time of a request goes: the SQL queries, authentication,
+serialization and the request as a whole. Serialization is the rendering of
+the response (see renderers.py) and the compiled serializers (see compiled.-
+py), which are timed with `timed("serialize")`. The timings are sent back in a
+`Server-Timing` header, which browsers show in their developer tools, and are
+logged at DEBUG level as one JSON line per request.
+
+Only a sample of the requests is measured in detail, as set by `INSTRUMENTA-
+TION_SAMPLE_RATE`, so it can stay on in production. The others only count their
+queries and total time for the Prometheus metrics (see metrics.py).
+
+Requests that run the same query over and over with different parameters are
+logged as warnings with their view, since they are usually N + 1 queries.
+"""
+
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Timings of the request being handled, or None outside of requests. Context
+# variables follow the request into the threads that async views use for the
+# database, which a per-connection wrapper alone would not.
+_timings = ContextVar("request_timings", default=None)
+
+# Literals are replaced to tell which queries only differ in their parameters
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\((?:\s*\?\s*,)*\s*\?\s*\)")
+_SAVEPOINTS = re.compile(r'(SAVEPOINT) "[^"]*"')
+
+def query_shape(sql):
+    """
+    Reduces a query to its shape by dropping its literal values.
+    """
+    sql = _SAVEPOINTS.sub(r"\1 ?", sql)
+    return _LISTS.sub("(...)", _LITERALS.sub("?", sql))
+
+class RequestTimings:
+    """
+    What was measured during one request. Durations are in seconds. Only the
+    number of queries is kept unless the request was sampled.
+    """
+    def __init__(self, sampled=True):
+        self.sampled = sampled
+        self.queries = 0
+        self.sql = 0.0
+        self.auth = 0.0
+        self.serialize = 0.0
+        self.shapes = Counter()
+
+    def repeated_queries(self):
+        """
+        Gets the shapes of queries that ran at least `INSTRUMENTATION_REPEAT_-
+        THRESHOLD` times, with how often they ran.
+        """
+        threshold = settings.INSTRUMENTATION_REPEAT_THRESHOLD
+
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count >= threshold]
+
+    def server_timing(self, total):
+        return ", ".join([
+            f'db;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+            f"auth;dur={self.auth * 1000:.1f}",
+            f"serialize;dur={self.serialize * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+@contextmanager
+def timed(name):
+    """
+    Adds the time spent in the block to a timing of the current request, if
+    it is being measured.
+    """
+    timings = _timings.get()
+
+    if timings is None or not timings.sampled:
+        yield
+        return
+
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        setattr(timings, name,
+                getattr(timings, name) + time.perf_counter() - started)
+
+def _execute(execute, sql, params, many, context):
+    timings = _timings.get()
+
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    if not timings.sampled:
+        timings.queries += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql += time.perf_counter() - started
+        timings.queries += 1
+        timings.shapes[query_shape(sql)] += 1
+
+def _add_wrapper(sender, connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+def install():
+    """
+    Hooks into every database connection. Only needed once per process and
+    safe to call again.
+    """
+    connection_created.connect(_add_wrapper,
+                               dispatch_uid="kronathens.instrumentation")
+
+    for connection in connections.all(initialized_only=True):
+        _add_wrapper(None, connection)
+
+class InstrumentationMiddleware:
+    """
+    Measures a sample of the requests and records every one of them in the
+    metrics. Should come first in `MIDDLEWARE` so that the total covers
+    everything else.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        install()
+
+    def _sampled(self):
+        rate = settings.INSTRUMENTATION_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings(self._sampled())
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+
+        return self._report(request, response, timings,
+                            time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings(self._sampled())
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+
+        return self._report(request, response, timings,
+                            time.perf_counter() - started)
+
+    def _report(self, request, response, timings, total):
+        metrics.observe_request(request, response, timings.queries, total)
+
+        if not timings.sampled:
+            return response
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else None
+
+        response["Server-Timing"] = timings.server_timing(total)
+
+        logger.debug(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "queries": timings.queries,
+            "db_ms": round(timings.sql * 1000, 1),
+            "auth_ms": round(timings.auth * 1000, 1),
+            "serialize_ms": round(timings.serialize * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+        }))
+
+        for shape, count in timings.repeated_queries():
+            logger.warning(json.dumps({
+                "event": "repeated_query",
+                "view": view,
+                "path": request.path,
+                "count": count,
+                "query": shape,
+            }))
+
+        return response
@@ -0,0 +1,114 @@
+"""
+Prometheus metrics of the API, served at `/metrics`. Every request is counted
+by the name of its URL pattern, e.g. `checklists:aggregate`, rather than its
+path so that the number of series doesn't grow with the number of workspaces.
+
+With several worker processes each one only sees its own requests. Setting the
+`PROMETHEUS_MULTIPROC_DIR` environment variable to an empty directory before
+the workers start makes them write their metrics there and `/metrics` adds
+them up, whichever worker is scraped. The directory should be emptied when the
+server restarts and dead workers should be marked as such, e.g. in gunicorn's
+`child_exit` hook:
+
+    from prometheus_client import multiprocess
+
+    def child_exit(server, worker):
+        multiprocess.mark_process_dead(worker.pid)
+
+Cache hit ratios are left to the queries, e.g.
+
+    sum(rate(kronathens_cache_lookups_total{result="hit"}[5m])) by (cache)
+      / sum(rate(kronathens_cache_lookups_total[5m])) by (cache)
+"""
+
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Histogram, generate_latest)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Label of the requests that didn't match any URL pattern
+UNMATCHED = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "kronathens_request_duration_seconds",
+    "Time taken to respond to a request.",
+    ["route", "method"],
+)
+
+REQUESTS = Counter(
+    "kronathens_requests_total",
+    "Requests responded to, by status code.",
+    ["route", "method", "status"],
+)
+
+REQUEST_QUERIES = Histogram(
+    "kronathens_request_queries",
+    "Database queries run to respond to a request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, 128, float("inf")),
+)
+
+CACHE_LOOKUPS = Counter(
+    "kronathens_cache_lookups_total",
+    "Lookups in the application caches.",
+    ["cache", "result"],
+)
+
+def route(request):
+    """
+    Gets the name of the URL pattern that the request matched.
+    """
+    match = request.resolver_match
+
+    if match is None or not match.url_name:
+        return UNMATCHED
+
+    return match.view_name
+
+def observe_request(request, response, queries, duration):
+    """
+    Records a request that was responded to.
+    """
+    name = route(request)
+
+    REQUEST_LATENCY.labels(name, request.method).observe(duration)
+    REQUESTS.labels(name, request.method, response.status_code).inc()
+    REQUEST_QUERIES.labels(name).observe(queries)
+
+def observe_cache(cache, hit):
+    """
+    Records a lookup in one of the application caches.
+    """
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+def _registry():
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+
+    return registry
+
+def metrics(request):
+    """
+    Exposes the metrics in the Prometheus text format. Requires `Authorizati-
+    on: Bearer <METRICS_TOKEN>`. Without a `METRICS_TOKEN` they aren't
+    served at all.
+    """
+    token = settings.METRICS_TOKEN
+
+    if not token:
+        return HttpResponse(status=403)
+
+    given = request.headers.get("Authorization", "")
+
+    if not hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+
+    return HttpResponse(generate_latest(_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,65 @@
+"""
+Pagination shared by the list endpoints of every application.
+"""
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .compiled import compile_serializer
+from .fieldsets import FieldsetError, requested_fieldset
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on the primary key, or on another ordering that ends with
+    it. The cursor holds the last key of the page so the next page is a `WHERE
+    id > ? ORDER BY id LIMIT ?` no matter how deep into the list the client is.
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+def paginated_data(request, queryset, serializer_class, ordering=("id",)):
+    """
+    Serializes a page of the queryset along with the links to the pages next
+    to it, in the order of the `ordering` fields. Clients that still expect the
+    whole list as a plain array can ask for it with `?paginate=false`. The rows
+    are read and serialized by the compiled version of the serializer (see
+    compiled.py), which only reads the columns of the fields asked for (see
+    fieldsets.py) and the ones the rows are ordered by.
+    """
+    compiled = compile_serializer(serializer_class, requested_fieldset(request),
+                                  tuple(ordering))
+    queryset = compiled.values(queryset)
+
+    if request.query_params.get("paginate") == "false":
+        return compiled.represent(queryset.order_by(*ordering))
+
+    paginator = KeysetPagination()
+    paginator.ordering = tuple(ordering)
+    page = paginator.paginate_queryset(queryset, request)
+
+    return paginator.get_paginated_response(compiled.represent(page)).data
+
+def paginated_response(request, queryset, serializer_class, ordering=("id",)):
+    """
+    Responds with a page of the queryset, see `paginated_data`.
+    """
+    try:
+        data = paginated_data(request, queryset, serializer_class, ordering)
+    except FieldsetError as error:
+        return Response({"error": str(error)},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(data, status=status.HTTP_200_OK)
+
+async def apaginated_data(request, queryset, serializer_class,
+                          ordering=("id",)):
+    """
+    Same as `paginated_data` for the async views, which get a plain Django
+    request. The paginator is synchronous so it runs in a thread.
+    """
+    return await sync_to_async(paginated_data)(Request(request), queryset,
+                                               serializer_class, ordering)
@@ -0,0 +1,78 @@
+"""
+Binary formats the API speaks besides JSON, picked by the `Accept` header of a
+request or the `Content-Type` of its body. MessagePack and CBOR carry the same
+data as the JSON, only smaller and faster to encode and decode. JSON stays the
+default for clients that don't ask for anything else.
+
+Values the JSON encoder knows how to turn into JSON, e.g. dates and decimals,
+are given the same way in the binary formats so that all of them carry the
+same data.
+
+The renderers count their time as serialization of the request, see instru-
+mentation.py.
+"""
+
+import cbor2
+import msgpack
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .instrumentation import timed
+
+_json = JSONEncoder()
+
+def _cbor_default(encoder, value):
+    encoder.encode(_json.default(value))
+
+class JSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("serialize"):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        with timed("serialize"):
+            return msgpack.packb(data, default=_json.default)
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as error:
+            raise ParseError(f"MessagePack parse error - {error}")
+
+class CBORRenderer(BaseRenderer):
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        with timed("serialize"):
+            return cbor2.dumps(data, default=_cbor_default)
+
+class CBORParser(BaseParser):
+    media_type = "application/cbor"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as error:
+            raise ParseError(f"CBOR parse error - {error}")
@@ -54,7 +54,25 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+    ],
+    # Pagination of the list endpoints (see kronathens/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'kronathens.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('PAGE_SIZE', 100)),
+    # JSON unless the client asks for a binary format (see kronathens/rende-
+    # rers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'kronathens.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'kronathens.renderers.MessagePackRenderer',
+        'kronathens.renderers.CBORRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'kronathens.renderers.MessagePackParser',
+        'kronathens.renderers.CBORParser',
     ],
 }
 
@@ -63,10 +81,28 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
-    'BLACKLIST_AFTER_ROTATION': True
+    'BLACKLIST_AFTER_ROTATION': True,
+    # Issue tokens that can claim the user's groups (see accounts/tokens.py)
+    'TOKEN_OBTAIN_SERIALIZER':
+        'accounts.tokens.MembershipTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER':
+        'accounts.tokens.MembershipTokenRefreshSerializer',
 }
 
+# Seconds a refresh token is remembered as not blacklisted, or 0 to check the
+# blacklist on every refresh (see accounts/tokens.py)
+TOKEN_BLACKLIST_CACHE_TIMEOUT = int(
+    os.environ.get('TOKEN_BLACKLIST_CACHE_TIMEOUT', 30))
+
+# Whether access tokens claim the groups of their user so that permission che-
+# cks can skip the database. Claims may be out of date for the lifetime of an
+# access token, see accounts/tokens.py.
+MEMBERSHIP_CLAIMS = os.environ.get('MEMBERSHIP_CLAIMS', 'false').lower() \
+    in ('1', 'true', 'yes')
+
 MIDDLEWARE = [
+    'kronathens.instrumentation.InstrumentationMiddleware',
+    'kronathens.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -77,6 +113,44 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Fraction of the requests whose timings are measured and sent back in Server-
+# Timing headers, and how often a query has to repeat within one request to be
+# logged as a likely N + 1 (see kronathens/instrumentation.py). Set the rate to
+# 1 to measure every request while developing.
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.01))
+INSTRUMENTATION_REPEAT_THRESHOLD = int(
+    os.environ.get('INSTRUMENTATION_REPEAT_THRESHOLD', 5))
+
+# Responses smaller than this many bytes are sent uncompressed (see kronathens/
+# compression.py)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Most requests one call to `/api/batch/` may carry (see kronathens/batch.py)
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 50))
+
+# Bearer token that Prometheus has to send to scrape `/metrics`. If unset the
+# metrics aren't served, whether or not DEBUG is on. For several worker proces-
+# ses see kronathens/metrics.py.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # The timings of each request are logged at DEBUG, likely N + 1 queries
+        # at WARNING
+        'kronathens.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -86,6 +160,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# Lets the frontend read the fresh tokens sent when group membership changes
+CORS_EXPOSE_HEADERS = ['X-Access-Token']
 CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
@@ -124,15 +200,70 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'kronathens.wsgi.application'
+ASGI_APPLICATION = 'kronathens.asgi.application'
+
+# Serve the hot read endpoints with async views (see kronathens/asyncapi.py).
+# Only worth it when deployed through ASGI_APPLICATION.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'false').lower() \
+    in ('1', 'true', 'yes')
 
 # Database
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Writes read the rows they depend on first, e.g. the positions of the
+        # siblings (see checklists/ordering.py). Taking the write lock when the
+        # transaction begins makes concurrent writers wait for it rather than
+        # fail with "database is locked" when they upgrade their read lock.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # A file rather than memory so that the tests lock the database the
+        # same way as it is locked when serving
+        'TEST': {'NAME': BASE_DIR / 'test-db.sqlite3'},
     }
 }
 
+# Caches. The aggregates cache holds serialized workspaces (see checklists/cac-
+# hing.py). Local memory evicts the least recently used entry once it's full;
+# it can be swapped for 'django.core.cache.backends.filebased.FileBasedCache'
+# with a LOCATION directory to share the entries between worker processes.
+AGGREGATE_CACHE_ENTRIES = int(os.environ.get('AGGREGATE_CACHE_ENTRIES', 1000))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'aggregates': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'workspace-aggregates',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': AGGREGATE_CACHE_ENTRIES,
+            # Cull a single entry at a time instead of a third of the cache
+            'CULL_FREQUENCY': AGGREGATE_CACHE_ENTRIES,
+        },
+    },
+}
+
+# Seconds an authenticated user is cached for under its token, or 0 to load the
+# user from the database on every request (see accounts/authentication.py)
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60))
+
+# Channel layer carrying the WebSocket events (see checklists/events.py). The
+# in-memory layer only reaches sockets served by the same process, so use
+# channels_redis' RedisChannelLayer when running several ASGI workers.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# Retention of the workspace change logs. Older changes are dropped by the
+# compact_changes management command, which should be run periodically.
+CHANGE_LOG_MAX_AGE = timedelta(
+    days=int(os.environ.get('CHANGE_LOG_MAX_AGE_DAYS', 30)))
+CHANGE_LOG_MAX_ENTRIES = int(os.environ.get('CHANGE_LOG_MAX_ENTRIES', 10000))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,36 @@
+"""
+Statistics shared by the caches of every application.
+"""
+
+import threading
+
+from .metrics import observe_cache
+
+class CacheStats:
+    """
+    Counts the hits and misses of a cache in this process. They are also expo-
+    rted to Prometheus under the cache's name, see metrics.py.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        observe_cache(self.name, hit)
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
@@ -0,0 +1,279 @@
+"""
+Query budgets of the API, checked by the tests of every application. Each
+route is called on a small and on a large dataset and has to run the same
+queries on both, so that the number of queries doesn't grow with the data, and
+exactly as many as its budget below.
+
+When a change adds queries the test fails with a diff of the queries between
+the two datasets, or with the queries that were run if they're still the same
+on both. A change that saves queries should lower the budget.
+"""
+
+import difflib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import (APIClient, APIRequestFactory, APITestCase,
+                                 force_authenticate)
+
+from accounts.loader import BulkLoader
+from accounts.models import User
+from checklists.models import Subitem
+from checklists.search import suspended_index
+
+from .instrumentation import query_shape
+
+# Queries per request by the name of the route. Authentication is left out as
+# the tests authenticate the client directly. The tests run in a transaction,
+# so an atomic block costs a SAVEPOINT and a RELEASE on top of its queries.
+QUERY_BUDGETS = {
+    "register": 3,
+    "login": 2,
+    "refresh": 2,
+    "logout": 7,
+    "user-detail": 0,
+    "auth-cache-stats": 0,
+
+    "collaboration:group-all": 1,
+    "collaboration:group-get": 1,
+    "collaboration:group-create": 3,
+    "collaboration:group-update": 2,
+    "collaboration:group-delete": 12,
+    "collaboration:group-join-toggle": 4,
+
+    "checklists:workspace-all": 2,
+    "checklists:workspace-create": 3,
+    "checklists:workspace-update": 7,
+    "checklists:workspace-delete": 8,
+    "checklists:item-all": 2,
+    "checklists:item-create": 9,
+    "checklists:item-update": 8,
+    "checklists:item-delete": 8,
+    "checklists:item-move": 8,
+    "checklists:subitem-all": 2,
+    "checklists:subitem-create": 10,
+    "checklists:subitem-update": 9,
+    "checklists:subitem-delete": 9,
+    "checklists:subitem-batch": 14,
+    "checklists:subitem-move": 9,
+    "checklists:aggregate": 3,
+    "checklists:aggregate?stream=1": 2,
+    "checklists:changes": 4,
+    "checklists:aggregate-cache-stats": 0,
+    "checklists:search": 2,
+}
+
+# How much the large dataset grows over the small one
+SMALL, LARGE = 1, 32
+
+class Fixture:
+    """
+    A dataset of `build_fixture`. The first group, workspace and item are the
+    ones that grow with the size.
+    """
+    def __init__(self, loader, password):
+        ids = loader.ids
+        self.password = password
+        self.user = User.objects.get(id=ids["user"][0])
+        self.group = ids["group"][0]
+        self.groups = [ids["group"][number] for number in sorted(ids["group"])]
+        self.workspace = ids["workspace"][0]
+        self.workspaces = [ids["workspace"][number]
+                           for number in sorted(ids["workspace"])]
+        self.item = ids["item"][0]
+        self.items = [ids["item"][number] for number in sorted(ids["item"])]
+        self.subitems = list(Subitem.objects.filter(item_id=self.item)
+                                            .order_by("id")
+                                            .values_list("id", flat=True))
+
+def build_fixture(prefix, size, password="password"):
+    """
+    Loads a dataset that grows with `size`. The superuser `<prefix>0` created
+    `size` groups. The first one has `size` + 1 contributors and `size` work-
+    spaces, the first workspace has `size` items and each of those has 10 *
+    `size` subitems.
+    """
+    records = [
+        {"model": "user", "id": number, "username": f"{prefix}{number}",
+         "email": f"{prefix}{number}@example.com", "is_superuser": number == 0}
+        for number in range(size + 1)
+    ]
+
+    for group in range(size):
+        records.append({"model": "group", "id": group, "creator": 0,
+                        "name": f"Group {group}"})
+        records += [{"model": "contributor", "group": group, "user": user}
+                    for user in (range(size + 1) if group == 0 else [0])]
+
+    records += [{"model": "workspace", "id": workspace, "group": 0,
+                 "name": f"Workspace {workspace}"}
+                for workspace in range(size)]
+
+    for item in range(size):
+        records.append({"model": "item", "id": item, "workspace": 0,
+                        "heading": f"Item {item}"})
+        records += [{"model": "subitem", "item": item,
+                     "content": f"Subitem {number}", "weight": number % 3 + 1,
+                     "completion_status": number % 2 == 0}
+                    for number in range(10 * size)]
+
+    with suspended_index():
+        loader = BulkLoader(password)
+
+        for record in records:
+            loader.add(record)
+
+        loader.finish()
+
+    return Fixture(loader, password)
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Loads a small and a large dataset for the tests to call the routes on.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = build_fixture("small", SMALL)
+        cls.large = build_fixture("large", LARGE)
+
+    def setUp(self):
+        # Nothing cached by an earlier test should save queries
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def client_for(self, fixture):
+        client = APIClient()
+        client.force_authenticate(fixture.user)
+        return client
+
+    def assertQueryBudget(self, name, call, prepare=None):
+        """
+        Calls `call(client, fixture)` on both datasets, which has to send the
+        request to the route, and checks the queries it ran. `prepare` is cal-
+        led the same way beforehand and its queries don't count.
+        """
+        captured = []
+
+        for fixture in (self.small, self.large):
+            client = self.client_for(fixture)
+
+            if prepare is not None:
+                prepare(client, fixture)
+
+            with CaptureQueriesContext(connection) as context:
+                response = call(client, fixture)
+                # A streamed response only runs its queries as it's read
+                content = b"".join(response.streaming_content) \
+                    if response.streaming else response.content
+
+            self.assertLess(response.status_code, 400,
+                            f"{name} failed: {content[:500]!r}")
+            captured.append([query_shape(query["sql"])
+                             for query in context.captured_queries])
+
+        small, large = captured
+
+        if small != large:
+            self.fail(f"{name} ran {len(small)} queries on the small dataset "
+                      f"and {len(large)} on the large one:\n"
+                      + "\n".join(difflib.unified_diff(
+                          small, large, "small", "large", lineterm="")))
+
+        budget = QUERY_BUDGETS[name]
+
+        if len(large) != budget:
+            self.fail(f"{name} ran {len(large)} queries instead of its budget "
+                      f"of {budget} in kronathens/testing.py:\n"
+                      + "\n".join(f"{number}. {query}" for number, query
+                                  in enumerate(large, start=1)))
+
+    def assertBudgetsCover(self, urlpatterns, namespace=None):
+        """
+        Checks that every route of an application has a budget.
+        """
+        names = {f"{namespace}:{pattern.name}" if namespace else pattern.name
+                 for pattern in urlpatterns}
+
+        self.assertEqual(names - QUERY_BUDGETS.keys(), set())
+
+class ConcurrencyTestCase(TransactionTestCase):
+    """
+    Sends requests from several threads at once, each with a connection of
+    its own, for the writes to contend for the database like they do when
+    served.
+    """
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+        self.fixture = build_fixture("concurrency", 2)
+
+    def concurrently(self, call, threads=4, times=20):
+        """
+        Calls `call(client, number)` `times` times on each thread and counts
+        the statuses of the responses.
+        """
+        def run(thread):
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(self.fixture.user)
+
+            try:
+                return [call(client, thread * times + number).status_code
+                        for number in range(times)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(threads) as pool:
+            return Counter(status for statuses in pool.map(run, range(threads))
+                           for status in statuses)
+
+class AsyncViewParityTestCase(APITestCase):
+    """
+    Checks that the async views (see asyncapi.py) answer exactly like the DRF
+    views they stand in for.
+    """
+    # Headers that the two have to agree on besides the status and the body
+    HEADERS = ["Content-Type", "ETag", "Allow", "Vary", "WWW-Authenticate"]
+
+    def setUp(self):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def assertSameResponses(self, drf_view, async_view, path, args=(),
+                            method="get", user=None, **extra):
+        """
+        Sends the same request to both views and compares what they answer.
+        Returns the response of the DRF view.
+        """
+        responses = []
+
+        for view in [drf_view, async_view]:
+            request = getattr(APIRequestFactory(), method)(path, **extra)
+
+            if user is not None:
+                force_authenticate(request, user)
+
+            response = async_to_sync(view)(request, *args) \
+                if iscoroutinefunction(view) else view(request, *args)
+
+            # As the handler does with DRF's responses
+            if hasattr(response, "render"):
+                response.render()
+
+            responses.append(response)
+
+        drf, shim = responses
+
+        self.assertEqual(shim.status_code, drf.status_code)
+        self.assertEqual(shim.content, drf.content)
+
+        for header in self.HEADERS:
+            self.assertEqual(shim.get(header), drf.get(header), header)
+
+        return drf
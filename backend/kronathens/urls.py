@@ -18,11 +18,16 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from .batch import batch
+from .metrics import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/users/', include('accounts.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token-obtain-pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('api/batch/', batch, name='batch'),
 
     path('api/collaboration/', include('collaboration.urls')),
     path('api/checklists/', include('checklists.urls'))
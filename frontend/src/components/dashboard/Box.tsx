@@ -42,7 +42,7 @@ const Box: React.FC = () => {
 
             try {
                 /* GET method */
-                const response = await axios.get(`${process.env.REACT_APP_API_URL}/collaboration/groups/all/`);
+                const response = await axios.get(`${process.env.REACT_APP_API_URL}/collaboration/groups/all/?paginate=false`);
 
                 const data = response.data;
 
@@ -218,14 +218,14 @@ const Box: React.FC = () => {
 
         if (isLoggedIn) {
             try {
-                const response = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/all/${selectedGroup.id}`);
+                const response = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/all/${selectedGroup.id}/?paginate=false`);
 
                 /* Map API response to CardInformation interface and calculate progress */
                 const mappedCards: CardInformation[] = await Promise.all(
                     (response.data || []).map(async (apiCard: any) => {
                         try {
                             /* Fetch tasks for this workspace */
-                            const tasksResponse = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/item/all/${apiCard.id}/`);
+                            const tasksResponse = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/item/all/${apiCard.id}/?paginate=false`);
                             
                             /* Fetch subtasks for each task and calculate progress */
                             let totalWeight = 0;
@@ -235,7 +235,7 @@ const Box: React.FC = () => {
                             const tasksWithSubtasks = await Promise.all(
                                 tasksResponse.data.map(async (task: any) => {
                                     try {
-                                        const subtasksResponse = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/subitem/all/${task.id}/`);
+                                        const subtasksResponse = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/subitem/all/${task.id}/?paginate=false`);
                                         
                                         /* Calculate progress for this task */
                                         subtasksResponse.data.forEach((subtask: any) => {
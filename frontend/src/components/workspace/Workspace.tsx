@@ -59,13 +59,13 @@ const Workspace = ({ isOpen, onClose, card, onUpdateCard }: WorkspaceProps) => {
 
         setIsLoading(true);
         try {
-            const response = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/item/all/${card.id}/`);
+            const response = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/item/all/${card.id}/?paginate=false`);
             
             /* Fetch subtasks for each task */
             const tasksWithSubtasks = await Promise.all(
                 response.data.map(async (task: any) => {
                     try {
-                        const subtasksResponse = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/subitem/all/${task.id}/`);
+                        const subtasksResponse = await axios.get(`${process.env.REACT_APP_API_URL}/checklists/workspace/subitem/all/${task.id}/?paginate=false`);
                         return {
                             id: task.id.toString(),
                             name: task.heading || 'Untitled Task',